@@ -1,7 +1,6 @@
 import pandas as pd
 import streamlit as st
 from snowflake.snowpark import Session
-from snowflake.cortex import complete
 import snowflake.snowpark.functions as F
 from datetime import datetime
 import json
@@ -21,6 +20,20 @@ from helping_functions.session_tracker import *
 from helping_functions.skills_builder import *
 from helping_functions.tts_utils import *
 from helping_functions.stt_utils import *
+from helping_functions.perf_tracker import *
+from helping_functions.chat_memory import *
+from helping_functions.response_parser import *
+from helping_functions.cortex_scheduler import *
+from helping_functions.fact_index import *
+from helping_functions.asset_pipeline import *
+from helping_functions.prompt_templates import *
+from helping_functions.retrieval import *
+from helping_functions.vector_snapshot import *
+from helping_functions.follow_ups import *
+from helping_functions.single_flight import *
+from helping_functions.model_router import *
+from helping_functions.token_accounting import *
+from helping_functions.jd_matching import *
 
 env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'chatbot_secrets.env')
 load_dotenv(dotenv_path=env_path)
@@ -33,49 +46,112 @@ load_dotenv(dotenv_path=env_path)
 
 # os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = key_path
 
-gcp_key = {
-    "type": os.getenv("GCP_TYPE"),
-    "project_id": os.getenv("GCP_PROJECT_ID"),
-    "private_key_id": os.getenv("GCP_PRIVATE_KEY_ID"),
-    # Replace literal \n with actual newlines in private_key
-    "private_key": os.getenv("GCP_PRIVATE_KEY").replace("\\n", "\n"),
-    "client_email": os.getenv("GCP_CLIENT_EMAIL"),
-    "client_id": os.getenv("GCP_CLIENT_ID"),
-    "auth_uri": os.getenv("GCP_AUTH_URI"),
-    "token_uri": os.getenv("GCP_TOKEN_URI"),
-    "auth_provider_x509_cert_url": os.getenv("GCP_AUTH_PROVIDER_CERT_URL"),
-    "client_x509_cert_url": os.getenv("GCP_CLIENT_CERT_URL"),
-    "universe_domain": os.getenv("GCP_UNIVERSE_DOMAIN"),
-}
+# Setup below only has to run once per process, not on every rerun.
+@st.cache_resource(show_spinner=False)
+def write_gcp_credentials():
+    gcp_key = {
+        "type": os.getenv("GCP_TYPE"),
+        "project_id": os.getenv("GCP_PROJECT_ID"),
+        "private_key_id": os.getenv("GCP_PRIVATE_KEY_ID"),
+        # Replace literal \n with actual newlines in private_key
+        "private_key": os.getenv("GCP_PRIVATE_KEY").replace("\\n", "\n"),
+        "client_email": os.getenv("GCP_CLIENT_EMAIL"),
+        "client_id": os.getenv("GCP_CLIENT_ID"),
+        "auth_uri": os.getenv("GCP_AUTH_URI"),
+        "token_uri": os.getenv("GCP_TOKEN_URI"),
+        "auth_provider_x509_cert_url": os.getenv("GCP_AUTH_PROVIDER_CERT_URL"),
+        "client_x509_cert_url": os.getenv("GCP_CLIENT_CERT_URL"),
+        "universe_domain": os.getenv("GCP_UNIVERSE_DOMAIN"),
+    }
 
-key_path = "/tmp/gcp_tts_key.json"
+    key_path = "/tmp/gcp_tts_key.json"
 
-with open(key_path, "w") as f:
-    json.dump(gcp_key, f)
+    with open(key_path, "w") as f:
+        json.dump(gcp_key, f)
+    return key_path
 
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = key_path
 
+@st.cache_data(show_spinner=False)
+def load_skills_summary():
+    with open("docs/skills.json", "r") as f:
+        skills_data = json.load(f)
+    return get_compact_skill_summary(skills_data)
 
-with open("docs/skills.json", "r") as f:
-    skills_data = json.load(f)
-skills_summary_text = get_compact_skill_summary(skills_data)
 
+@st.cache_resource(show_spinner=False)
+def load_fact_index():
+    with open("docs/skills.json", "r") as f:
+        skills_data = json.load(f)
+    with open("docs/timeline.json", "r") as f:
+        timeline_data = json.load(f)
+    return FactIndex(skills_data, timeline_data)
 
-def get_previous_chat_context(n=2):
-    # Take the last n messages from chat history, format them nicely
-    messages = st.session_state.messages[-n:]
-    lines = []
-    for msg in messages:
-        role = "User" if msg["role"] == "user" else "Assistant"
-        content = msg["content"]
-        if isinstance(content, dict):  # if assistant content is a dict (full text)
-            content = content.get("full", "")
-        content = content.replace("\n", " ")  # flatten new lines for prompt
-        lines.append(f"{role}: {content}")
-    return "\n".join(lines)
+
+os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = write_gcp_credentials()
+skills_summary_text = load_skills_summary()
+
+
+def summarize_conversation(previous_summary, new_lines, session_id):
+    # Runs on a background thread (see ChatMemory), so no st.* calls in here
+    prompt = f"""
+You maintain a running summary of a chat between a recruiter and Alexandros Chionidis' virtual clone.
+
+Current summary:
+{previous_summary or "(empty)"}
+
+New messages:
+{chr(10).join(new_lines)}
+
+Update the summary with the new messages. Keep the topics, companies, skills and open questions that matter for follow-up questions.
+Return only the updated summary, at most 80 words.
+"""
+    response = scheduled_complete(
+        route("summary", session_id=session_id), prompt, session_id=session_id, call_type="summary", priority=BACKGROUND, session=session
+    )
+    return "".join(response).strip()
+
+
+def get_chat_memory():
+    if "chat_memory" not in st.session_state:
+        session_id = st.session_state["session_id"]
+        st.session_state.chat_memory = ChatMemory(
+            lambda summary, lines: summarize_conversation(summary, lines, session_id)
+        )
+    return st.session_state.chat_memory
+
+
+def get_history_messages():
+    # The latest user message is passed to the prompts separately
+    messages = st.session_state.messages
+    if messages and messages[-1]["role"] == "user":
+        messages = messages[:-1]
+    return messages
+
+
+def update_chat_memory():
+    # No history in the prompts, so no summary to keep up to date (and no background LLM calls)
+    if not st.session_state.get("include_history", True):
+        return
+    window = int(st.session_state.get("context_message_count", 4))
+    get_chat_memory().update(get_history_messages(), window)
+
+
+def get_previous_chat_context():
+    """Rolling summary of older turns plus the last `context_message_count` messages."""
+    if not st.session_state.get("include_history", True):
+        return ""
+    window = int(st.session_state.get("context_message_count", 4))
+    messages = get_history_messages()
+    memory = get_chat_memory()
+    memory.update(messages, window)
+    return memory.render(messages, window)
 
 # --- Reset Chat ---
 def reset_conversation():
+    st.session_state.pop("chat_memory", None)
+    st.session_state.pop("suggestions", None)
+    if "follow_up_prefetcher" in st.session_state:
+        st.session_state.follow_up_prefetcher.discard()
     st.session_state.messages = [
         {
             "role": "assistant",
@@ -95,9 +171,9 @@ def simulate_typing(response: str,tts_response, typing_speed: float = 0.017, vol
         if isinstance(tts_response, dict):
             tts_response = tts_response.get("full", "")
         # speak_text(response)
-        audio = generate_google_tts_audio(tts_response, selected_voice)
-        autoplay_audio(audio,volume=volume)
-        st.audio(audio, format="audio/mp3")
+        audio_encoding = st.session_state.get("audio_encoding", "MP3")
+        audio = generate_google_tts_audio(tts_response, selected_voice, audio_encoding=audio_encoding)
+        play_audio(audio, audio_encoding=audio_encoding, volume=volume)
         typing_speed *= 2.2
 
     placeholder = st.empty()
@@ -111,6 +187,7 @@ def simulate_typing(response: str,tts_response, typing_speed: float = 0.017, vol
 
 
 # --- Page Setup ---
+app_rerun_started = time.perf_counter()
 st.set_page_config(
     page_title="Chat with Alexandros",
     page_icon="🤖",
@@ -124,7 +201,7 @@ if "session_id" not in st.session_state:
 col1, col2 = st.columns([1, 6])
 
 with col1:
-    st.image("docs/avatar.png", width=560)
+    st.image(avatar_image("header"), use_container_width=True)
 
 with col2:
     st.title("Hi, I'm Alexandros Chionidis' Virtual Clone!")
@@ -138,12 +215,18 @@ with col2:
         st.switch_page("pages/2_Timeline_and_Skills.py")
 
 
-speak_enabled = st.toggle(
-    "🔊 Let me speak my answers aloud!",
-    value=st.session_state.get("speak_responses", False),
-    help="Hear me talk! 🔊 Just a heads-up: browsers and devices all handle sound a little differently."
-)
-st.session_state["speak_responses"] = speak_enabled
+@st.fragment
+def render_speech_toggle():
+    # Fragment: flipping the toggle only reruns this widget, not the whole chat
+    speak_enabled = st.toggle(
+        "🔊 Let me speak my answers aloud!",
+        value=st.session_state.get("speak_responses", False),
+        help="Hear me talk! 🔊 Just a heads-up: browsers and devices all handle sound a little differently."
+    )
+    st.session_state["speak_responses"] = speak_enabled
+
+
+render_speech_toggle()
 
 # voice_mode = st.toggle("🎤 Speak to me!", help="Speak instead of typing")
 voice_mode = False
@@ -239,10 +322,12 @@ if "speak_responses" not in st.session_state:
 
 # --- Constants ---
 DOC_TABLE = "app.vector_store"
+MAX_QUESTION_CHARS = 2000
+MAX_JOB_DESCRIPTION_CHARS = 6000
 
 
 if "model" not in st.session_state:
-    st.session_state.model = "mistral-large"  # default model
+    st.session_state.model = AUTO_MODEL  # routed per intent and call type (see model_router)
 
 if "embedding_size" not in st.session_state:
     st.session_state.embedding_size = "1024"  # default
@@ -253,6 +338,9 @@ if "include_history" not in st.session_state:
 if "context_message_count" not in st.session_state:
     st.session_state.context_message_count = 4
 
+if "tts_source" not in st.session_state:
+    st.session_state.tts_source = "local"  # derive the spoken version locally
+
 if "chatbot_error" not in st.session_state:
     st.session_state.chatbot_error = False
 
@@ -276,100 +364,184 @@ def get_latest_user_message():
 
 
 # --- RAG Helpers ---
-def create_rag_search_query(user_message, intent, chat_history=None):
-    history_text = "\n".join(chat_history) if chat_history else ""
-    prompt = f"""
+REWRITE_PROMPT = PromptTemplate("rewrite", """
 You are a helpful assistant creating a precise search query for a data engineer CV chatbot's document retrieval system.
 The user's intent is: {intent}
 User's latest question: "{user_message}"
 
-{f'Chat history: {history_text}' if history_text else ''}
+{history_block}
 
 Rewrite or expand the question into a clear, specific search query that would best retrieve relevant information from a CV, skills, projects, and experience database.
 Return only the rewritten search query (1-2 sentences), no extra text.
-"""
-    model = st.session_state.get("model", "mistral-large")
-    model = "mistral-7b"
+""")
+
+
+def rewrite_search_query(user_message, intent, chat_history, session_id, priority=INTERACTIVE):
+    # No st.* calls: also runs on the follow-up prefetch threads
+    history_text = "\n".join(chat_history) if chat_history else ""
+    prompt = REWRITE_PROMPT.render(
+        intent=intent,
+        user_message=user_message,
+        history_block=f"Chat history: {history_text}" if history_text else "",
+    )
+    model = route("rewrite", intent, session_id=session_id)
+    response = scheduled_complete(model, prompt, session_id=session_id, call_type="rewrite", priority=priority)
+    return "".join(response).strip()
+
+
+def create_rag_search_query(user_message, intent, chat_history=None):
     try:
-        response = complete(model, prompt)
-        search_query = "".join(response).strip()
-        return search_query
+        return rewrite_search_query(user_message, intent, chat_history, st.session_state["session_id"])
     # except Exception as e:
     #     st.error("Failed to create improved search query.")
     #     st.exception(e)
     #     return user_message  # fallback
 
+    except SchedulerBusy:
+        raise
     except Exception as e:
         response = handle_error(
             e,
-            "⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly."
+            "⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly.",
+            session=session,
+            intent=intent,
         )
 
 
 
-def find_similar_doc(text, DOC_TABLE, intent_mapped):
-    safe_text = text.replace("'", "''")
-    embedding_size = st.session_state.get("embedding_size", "1024")
-    if embedding_size == "768":
-        embedding_column = "chunk_embedding"
-        embedding_func = f"SNOWFLAKE.CORTEX.EMBED_TEXT_768('snowflake-arctic-embed-m-v1.5', '{safe_text}')"
-    elif embedding_size == "1024":
-        embedding_column = "chunk_embedding_1024"
-        embedding_func = f"SNOWFLAKE.CORTEX.EMBED_TEXT_1024('snowflake-arctic-embed-l-v2.0', '{safe_text}')"
-    else:
+def find_similar_doc(texts, DOC_TABLE, intent_mapped, embedding_size=None):
+    """
+    Context for one query text or a batch of them. A batch is embedded and
+    searched in one round trip with a top-k per query; the hits are merged,
+    de-duplicated and cut to the same DEFAULT_K chunks a single query gets
+    (see merge_hits).
+    """
+    embedding_size = embedding_size or st.session_state.get("embedding_size", "1024")
+    if embedding_size not in EMBEDDING_CONFIGS:
         st.error("Unsupported embedding size selected.")
         return ""
+    texts = [texts] if isinstance(texts, str) else list(dict.fromkeys(texts))
 
-    docs = (
-        session.sql(
-            f"""
-        SELECT input_text,
-               source_desc,
-               VECTOR_COSINE_SIMILARITY({embedding_column}, {embedding_func})
-                * (
-                    CASE WHEN source_desc = 'Language Fluency' THEN 0.3
-                        WHEN source = '{intent_mapped}' THEN 1.5 
-                    ELSE 1 END
-                )  AS dist
-        FROM {DOC_TABLE}
-        ORDER BY dist DESC
-        LIMIT 3
+    # Rank against the local snapshot when one is exported; only the query embeddings hit Cortex
+    snapshot = load_current_snapshot()
+    if snapshot is not None and snapshot.has(embedding_size):
+        if len(texts) == 1:
+            vectors = [embed_query(session, texts[0], embedding_size)]
+        else:
+            vectors = embed_batch(session, texts, embedding_size)
+        hits = [
+            (snapshot.texts[i], score)
+            for top, scores in snapshot.search_batch(vectors, embedding_size, intent_mapped)
+            for i, score in zip(top, scores)
+        ]
+        return "\n\n".join(merge_hits(hits, DEFAULT_K))
+
+    def search():
+        if len(texts) == 1:
+            # Constant statement text with the question and intent bound; embedded in the same statement
+            rows = session.sql(
+                similarity_query(DOC_TABLE, embedding_size), params=similarity_params(texts[0], intent_mapped)
+            ).collect()
+            return [row["INPUT_TEXT"] for row in rows]
+        rows = session.sql(
+            batch_similarity_query(len(texts), DOC_TABLE, embedding_size),
+            params=batch_query_params(texts, intent_mapped),
+        ).collect()
+        return merge_hits([(row["INPUT_TEXT"], float(row["DIST"])) for row in rows], DEFAULT_K)
+
+    # Concurrent identical searches (same queries, intent and embedding) share one warehouse query
+    key = flight_key("retrieve", embedding_size, "\n".join(texts), {"intent": intent_mapped, "table": DOC_TABLE})
+    return "\n\n".join(single_flight.do(key, search))
+
+
+def search_queries(latest_user_message, improved_query, intent):
     """
-        )
-        .to_pandas()
-    )
+    The rewritten query, plus the user's own wording when it brings terms the
+    rewrite dropped. Follow-ups only make sense with the chat history, so
+    their raw text is never searched.
+    """
+    if intent == "follow_up" or not differs_materially(latest_user_message, improved_query):
+        return [improved_query]
+    return [improved_query, latest_user_message]
 
-    return "\n\n".join(docs["INPUT_TEXT"].tolist())
+
+def get_job_description_context(job_description):
+    """Requirement-by-requirement coverage plus evidence chunks, from one batched retrieval."""
+    embedding_size = st.session_state.get("embedding_size", "1024")
+    match = match_job_description(
+        job_description, session, embedding_size, load_fact_index(), snapshot=load_current_snapshot()
+    )
+    if not match["requirements"]:
+        return get_context(job_description, DOC_TABLE, "job_description")
+    return format_coverage_summary(match)
 
 
 def get_context(latest_user_message, DOC_TABLE, intent):
     intent_mapped = intent
-    if intent_mapped == "follow_up":
-        chat_history_messages = 4
-    else:
-        chat_history_messages = 2
-    chat_history = get_previous_chat_context(chat_history_messages).split("\n")
+    chat_history = get_previous_chat_context().split("\n")
     improved_query = create_rag_search_query(latest_user_message, intent_mapped, chat_history)
-    return find_similar_doc(improved_query, DOC_TABLE, intent_mapped)
+    return find_similar_doc(search_queries(latest_user_message, improved_query, intent_mapped), DOC_TABLE, intent_mapped)
+
+# Intents whose spoken version is derived locally (to_spoken_text) instead of generated
+LOCAL_TTS_INTENTS = {
+    "general_background",
+    "skills_or_tools",
+    "certifications",
+    "experience",
+    "follow_up",
+    "job_description",
+    "cv_irrelevant_discuss_with_alex",
+    "casual_greeting",
+    "unknown",
+}
 
-def get_prompt(latest_user_message, context, intent):
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    
-    # Include previous chat context if enabled
-    if st.session_state.get("include_history", True):
-        if intent == "follow_up":
-            chat_history_messages = 4
-        else:
-            chat_history_messages = 2
-        # history_context = get_previous_chat_context(
-        #     min(st.session_state.get("context_message_count", 4), 4)
-        # )
-        history_context = get_previous_chat_context(chat_history_messages)
+
+def use_local_tts(intent):
+    return st.session_state.get("tts_source", "local") == "local" and intent in LOCAL_TTS_INTENTS
+
+
+def response_format_instructions(intent):
+    if use_local_tts(intent):
+        return """Respond strictly in this JSON format:
+
+    {
+    "text": "Full detailed answer here"
+    }"""
+    return """- Then, generate a second version of the answer formatted for natural, friendly text-to-speech. Use short sentences, clear punctuation, and commas or ellipses to mark pauses. Avoid overly long clauses
+
+    Respond strictly in this JSON format:
+
+    {
+    "text": "Full detailed answer here",
+    "tts": "Natural, friendly spoken version here"
+    }"""
+
+
+def generate_answer(model, prompt, intent, options=None, prefetched_response=None):
+    """Run the answer completion and return (text, tts), timing it for the local/model TTS A/B."""
+    tts_source = "local" if use_local_tts(intent) else "model"
+    started = time.perf_counter()
+    if prefetched_response is not None:
+        response_json = prefetched_response
+    elif options:
+        response_json = scheduled_complete(
+            model, prompt, session_id=st.session_state["session_id"], call_type="answer", options=options
+        )
     else:
-        history_context = ""
+        response_json = scheduled_complete(
+            model, prompt, session_id=st.session_state["session_id"], call_type="answer"
+        )
+    if prefetched_response is None:
+        record_latency("generation", started, tts_source=tts_source, intent=intent)
+    parsed = parse_response_envelope(response_json)
+    if tts_source == "local":
+        return parsed["text"], to_spoken_text(parsed["text"])
+    return parsed["text"], parsed["tts"]
 
-    # Construct prompt with optional history
-    return f"""
+
+# Templates are plain str.format strings so the chat logger can store each one
+# once and keep only the variables per turn (see prompt_templates.py).
+ANSWER_PROMPT = """
     Current date: {current_date}
     You are Alexandros Chionidis' virtual clone — a professional, friendly, and clear data engineer. Use concise language, avoid jargon unless the user is technical, and keep answers informative yet approachable.
     Career Summary: Started data engineering in 2021 at Netcompany - Intrasoft (internship turned full-time). Currently working at Waymore since 2023. Prior work in retail (2015–2019) unrelated to tech and data engineering. Academic background in Department of Informatics and Telecommunications, University of Athens.
@@ -395,6 +567,7 @@ def get_prompt(latest_user_message, context, intent):
     Instructions:
     - Use the intent provided ("{intent}") to guide your tone and focus. If the intent doesn't match the question well, rely on your best judgment to respond appropriately.
     - If the intent is "follow_up", assume the user’s message depends on prior chat context. Use chat relevant chat history to fill in gaps.
+    - If the intent is "job_description", use the requirement coverage list: highlight the covered requirements with concrete evidence, be honest about the ones without evidence, and end with an overall fit statement (this may take up to 8 sentences).
     - Answer concisely (under 4 sentences), focusing primarily on the user’s question and the relevant document information.
     - If the question is vague, ambiguous or unclear, politely ask for clarification.
     - If question is outside the scope of your CV or background, say: "That question is outside my professional scope; I’d be happy to discuss it in person."
@@ -403,20 +576,35 @@ def get_prompt(latest_user_message, context, intent):
     - If the user input is about asking you a poem, song, or joke, be more creative and playful in your response while keeping it friendly.
     - Provide a full, detailed text answer as if writing to a recruiter — do NOT shorten or omit details.
 
-    - Then, generate a second version of the answer formatted for natural, friendly text-to-speech. Use short sentences, clear punctuation, and commas or ellipses to mark pauses. Avoid overly long clauses
+    {response_format}
+    """
 
-    Respond strictly in this JSON format:
 
-    {{
-    "text": "Full detailed answer here",
-    "tts": "Natural, friendly spoken version here"
-    }}
-    """
+def get_prompt(latest_user_message, context, intent, history_context=None, response_format=None):
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    
+    # Summary of older turns + recent messages (empty if history is disabled)
+    if history_context is None:
+        history_context = get_previous_chat_context()
+
+    # Construct prompt with optional history
+    template = PromptTemplate(
+        "answer",
+        ANSWER_PROMPT,
+        skills_summary_text=skills_summary_text,
+        response_format=response_format if response_format is not None else response_format_instructions(intent),
+    )
+    return template.render(
+        current_date=current_date,
+        context=context,
+        latest_user_message=latest_user_message,
+        history_context=history_context,
+        intent=intent,
+    )
 
 
 # --- Intent Classifier ---
-def classify_intent(user_input: str) -> str:
-    classification_prompt = f"""
+CLASSIFY_PROMPT = PromptTemplate("classify", """
 You are classifying user questions asked to Alexandros Chionidis' virtual clone. 
 Context:
 - The user is assumed to be a recruiter, hiring manager, or interviewer.
@@ -439,14 +627,19 @@ Question:
 \"\"\"{user_input}\"\"\"
 
 Return only the category name.
-"""
-    model = st.session_state.get("model", "mistral-large")
-    model = "mistral-7b"
+""")
+
+
+def classify_intent(user_input: str) -> str:
+    classification_prompt = CLASSIFY_PROMPT.render(user_input=user_input)
+    model = route("classify", session_id=st.session_state["session_id"])
     # response = complete(model, classification_prompt)
     # intent = "".join(response).strip().lower()
     # return intent
     try:
-        response = complete(model, classification_prompt)
+        response = scheduled_complete(
+            model, classification_prompt, session_id=st.session_state["session_id"], call_type="classify"
+        )
         intent = "".join(response).strip().lower()
         return intent
     # except Exception as e:
@@ -454,123 +647,73 @@ Return only the category name.
     #     # Optional: Log exception for debugging
     #     st.exception(e)
     #     return "unknown"
+    except SchedulerBusy:
+        raise
     except Exception as e:
         response = handle_error(
             e,
-            "⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly."
+            "⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly.",
+            session=session,
         )
 
 
 
 
-latest_user_message = ""
+# --- Answer Generation ---
+GREETING_PROMPT = """
+            You are Alexandros Chionidis, a friendly and professional data engineer.
 
-if not st.session_state.get("chatbot_error", False):
-    if st.button("🔄 Reset Chat"):
-        reset_conversation()
+            The user said: "{latest_user_message}"
 
+            Respond with:
 
-# --- Chat Loop ---
-# Only show input if no chatbot error
-chat_input = None
-transcript = None  
-
-if st.session_state["chatbot_error"] == False:
-    # chat_input = st.chat_input(placeholder="Ask me anything about my background, skills, or experience…")
-    if voice_mode:
-        # Only allow recording if chatbot is online
-        audio_bytes = st_audiorec()  # Returns audio bytes, usually WebM or WAV format
-        if audio_bytes:
-            transcript = transcribe_audio(audio_bytes)
-            if transcript:
-                st.success(f"✅ You said: {transcript}")
-    else:
-        chat_input = st.chat_input(placeholder="Ask me anything about my background, skills, or experience…")
- 
-else:
-    # st.error("⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly.")
-    st.error("⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance.")
+            - A warm, natural-sounding greeting in the first person, acknowledging the user's greeting and gently encouraging them to ask about your experience, projects, or skills.
+            Keep it friendly, and avoid sounding robotic or overly formal.
 
-    with st.container():
-        st.markdown("### 😔 I'm currently offline ")
-        st.markdown(
-            """
-            The chatbot isn't available at the moment.  
-            But feel free to check out my skills and experience while you're here!
-            """
-        )
-        col1, col2 = st.columns([1, 6])
-        with col1:
-            st.markdown("### 👉")
-        with col2:
-            if st.button("📊 Explore my Skills and Professional Timeline"):
-                st.switch_page("pages/2_Timeline_and_Skills.py")
-    chat_input = None
-
-user_message = None
-if "ready_prompt" in st.session_state and st.session_state["chatbot_error"] == False:
-    user_message = st.session_state.ready_prompt
-    del st.session_state.ready_prompt
-elif voice_mode and transcript is not None:
-    user_message = transcript
-elif chat_input:
-    user_message = chat_input
-
-# Proceed if user_message was set
-if user_message:
-    user_message = user_message[:2000]
-    st.session_state.messages.append({"role": "user", "content": user_message})
-    intent = classify_intent(user_message)
-    log_message_to_snowflake(
-        session=session,
-        session_id=st.session_state["session_id"],
-        role="user",
-        message=user_message,
-        intent=intent,
-        message_type="input"
-    )
-else:
-    intent = None
+    {response_format}
+    """
 
-# --- Display chat messages (Full response only) ---
-if st.session_state.chatbot_error == True:
-    x=1
-else: 
-    for message in st.session_state.messages:
-            avatar = "docs/avatar.png" if message["role"] == "assistant" else None
-            with st.chat_message(message["role"], avatar=avatar):
-                content = message["content"]
-                if message["role"] == "assistant" and isinstance(content, dict):
-                    st.markdown(content["full"])
-                else:
-                    st.markdown(content)
+UNKNOWN_PROMPT = """
+            The user said: "{latest_user_message}"
 
+            As Alexandros Chionidis, 
+            Respond with:
+            - Politely say you didn’t fully understand and ask them to rephrase or ask about your background, skills, or experience.
 
-    if st.session_state.messages[-1]["role"] != "assistant":
-        latest_user_message = get_latest_user_message() or ""
+    {response_format}
+    """
 
 
-if intent not in ["casual_greeting", "unknown", "farewell"] and latest_user_message:
+def answer_with_context(latest_user_message, intent, from_suggestion=False):
     try:
         status_placeholder = st.empty()
         status_placeholder.status("🔍 Searching relevant information…", expanded=True)
         
-        context = get_context(latest_user_message, DOC_TABLE, intent)
+        # Clicked suggestion: use what was prefetched while the user was reading
+        prefetched = (get_follow_up_prefetcher().take(latest_user_message) if from_suggestion else None) or {}
+        model_setting = st.session_state.get("model", AUTO_MODEL)
+        if "context" in prefetched:
+            context = prefetched["context"]
+        elif intent == "job_description":
+            context = get_job_description_context(latest_user_message)
+        else:
+            context = get_context(latest_user_message, DOC_TABLE, intent)
         
         status_placeholder.status("💬 Thinking…")
-        prompt = get_prompt(latest_user_message, context, intent)
-        model = st.session_state.get("model", "mistral-large")
+        # A prefetched answer is only used if it was generated under the current model setting
+        prefetched_response = prefetched.get("response") if prefetched.get("model_setting") == model_setting else None
+        model = prefetched["model"] if prefetched_response is not None else route("answer", intent, model_setting, st.session_state["session_id"])
+        prompt = prefetched["prompt"] if prefetched_response is not None else get_prompt(latest_user_message, context, intent)
         temperature = 0.0
         if intent == "cv_irrelevant_discuss_with_alex":
             temperature = 0.7
-        response_json = complete(model, prompt, options={"temperature": temperature})
-        parsed = json.loads(response_json)
-        response = parsed["text"]
-        tts_response = parsed["tts"]
+        response, tts_response = generate_answer(
+            model, prompt, intent, options={"temperature": temperature}, prefetched_response=prefetched_response
+        )
         status_placeholder.empty()  # remove status completely
         st.session_state.messages.append({"role": "assistant", "content": response})
 
-        with st.chat_message("assistant", avatar="docs/avatar.png"):
+        with st.chat_message("assistant", avatar=avatar_image("chat")):
             simulate_typing(response = response,tts_response = tts_response, volume=volume)
 
         log_message_to_snowflake(
@@ -583,44 +726,30 @@ if intent not in ["casual_greeting", "unknown", "farewell"] and latest_user_mess
             embedding_size=st.session_state.get("embedding_size"),
             context_snippet=context,
             prompt=prompt,
+            token_usage=token_ledger.report(st.session_state["session_id"]),
             message_type="response"
         )
+    except SchedulerBusy:
+        status_placeholder.empty()
+        raise
     except Exception as e:
         response = handle_error(
             e,
-            "⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly."
+            "⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly.",
+            session=session,
+            intent=intent,
         )
 
 
- 
-
-elif intent == "casual_greeting":
+def answer_casual_greeting(latest_user_message, intent):
     try:
-        prompt = f"""
-            You are Alexandros Chionidis, a friendly and professional data engineer.
-
-            The user said: "{latest_user_message}"
-
-            Respond with:
-
-            - A warm, natural-sounding greeting in the first person, acknowledging the user's greeting and gently encouraging them to ask about your experience, projects, or skills.
-            Keep it friendly, and avoid sounding robotic or overly formal.
-
-            - Then, generate a second version of the answer formatted for natural, friendly text-to-speech. Use short sentences, clear punctuation, and commas or ellipses to mark pauses. Avoid overly long clauses
-
-    Respond strictly in this JSON format:
-
-    {{
-    "text": "Full detailed answer here",
-    "tts": "Natural, friendly spoken version here"
-    }}
-    """
+        template = PromptTemplate(
+            "casual_greeting", GREETING_PROMPT, response_format=response_format_instructions(intent)
+        )
+        prompt = template.render(latest_user_message=latest_user_message)
 
-        model = st.session_state.get("model", "mistral-large")
-        response_json = complete(model, prompt)
-        parsed = json.loads(response_json)
-        response = parsed["text"]
-        tts_response = parsed["tts"]
+        model = route("answer", intent, st.session_state.get("model", AUTO_MODEL), st.session_state["session_id"])
+        response, tts_response = generate_answer(model, prompt, intent)
         st.session_state.messages.append({"role": "assistant", "content": response})
         log_message_to_snowflake(
             session=session,
@@ -632,41 +761,31 @@ elif intent == "casual_greeting":
             embedding_size=st.session_state.get("embedding_size"),
             context_snippet=None,
             prompt=prompt,
+            token_usage=token_ledger.report(st.session_state["session_id"]),
             message_type="response"
         )
-        with st.chat_message("assistant", avatar="docs/avatar.png"):
+        with st.chat_message("assistant", avatar=avatar_image("chat")):
             simulate_typing(response = response,tts_response = tts_response, volume=volume)
 
+    except SchedulerBusy:
+        raise
     except Exception as e:
         response = handle_error(
             e,
-            "⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly."
+            "⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly.",
+            session=session,
+            intent=intent,
         )
 
 
-
-elif intent == "unknown":
+def answer_unknown(latest_user_message, intent):
     try:
-        prompt = f"""
-            The user said: "{latest_user_message}"
-
-            As Alexandros Chionidis, 
-            Respond with:
-            1. politely say you didn’t fully understand and ask them to rephrase or ask about your background, skills, or experience.
-            2.Then, generate a second version of the answer formatted for natural, friendly text-to-speech. Use short sentences, clear punctuation, and commas or ellipses to mark pauses. Avoid overly long clauses
-
-    Respond strictly in this JSON format:
-
-    {{
-    "text": "Full detailed answer here",
-    "tts": "Natural, friendly spoken version here"
-    }}
-    """
-        model = st.session_state.get("model", "mistral-large")
-        response_json = complete(model, prompt)
-        parsed = json.loads(response_json)
-        response = parsed["text"]
-        tts_response = parsed["tts"]
+        template = PromptTemplate(
+            "unknown", UNKNOWN_PROMPT, response_format=response_format_instructions(intent)
+        )
+        prompt = template.render(latest_user_message=latest_user_message)
+        model = route("answer", intent, st.session_state.get("model", AUTO_MODEL), st.session_state["session_id"])
+        response, tts_response = generate_answer(model, prompt, intent)
         st.session_state.messages.append({"role": "assistant", "content": response})
         log_message_to_snowflake(
             session=session,
@@ -678,20 +797,44 @@ elif intent == "unknown":
             embedding_size=st.session_state.get("embedding_size"),
             context_snippet=None,
             prompt=prompt,
+            token_usage=token_ledger.report(st.session_state["session_id"]),
             message_type="response"
         )
-        with st.chat_message("assistant", avatar="docs/avatar.png"):
+        with st.chat_message("assistant", avatar=avatar_image("chat")):
             simulate_typing(response = response,tts_response = tts_response, volume=volume)
 
+    except SchedulerBusy:
+        raise
     except Exception as e:
         response = handle_error(
             e,
-            "⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly."
+            "⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly.",
+            session=session,
+            intent=intent,
         )
 
 
+def answer_structured_fact(latest_user_message, intent, fact_match):
+    response = fact_match["text"]
+    st.session_state.messages.append({"role": "assistant", "content": response})
+    log_message_to_snowflake(
+        session=session,
+        session_id=st.session_state["session_id"],
+        role="assistant",
+        message=response,
+        intent=intent,
+        model_used=None,
+        embedding_size=None,
+        context_snippet=json.dumps(fact_match["facts"]),
+        prompt=None,
+        token_usage=token_ledger.report(st.session_state["session_id"]),
+        message_type="response"
+    )
+    with st.chat_message("assistant", avatar=avatar_image("chat")):
+        simulate_typing(response = response,tts_response = to_spoken_text(response), volume=volume)
+
 
-elif intent == "farewell":
+def answer_farewell(latest_user_message, intent):
     response = (
         "Thank you for your time! I'm wrapping up the session now. "
         "If you have more questions about my background or skills later, feel free to return anytime."
@@ -712,11 +855,247 @@ elif intent == "farewell":
         embedding_size=st.session_state.get("embedding_size"),
         context_snippet=None,
         prompt=None,
+        token_usage=token_ledger.report(st.session_state["session_id"]),
         message_type="response"
     )
-    with st.chat_message("assistant", avatar="docs/avatar.png"):
+    with st.chat_message("assistant", avatar=avatar_image("chat")):
         simulate_typing(response = response,tts_response = tts_response, volume=volume)
 
     st.info("Thanks for chatting! You can download the chat history anytime, and I’d appreciate any feedback you share in the sidebar. 😊")
 
 
+def render_offline_notice():
+    # st.error("⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance. Please try again shortly.")
+    st.error("⚠️ The chatbot is temporarily unavailable due to high traffic or maintenance.")
+
+    with st.container():
+        st.markdown("### 😔 I'm currently offline ")
+        st.markdown(
+            """
+            The chatbot isn't available at the moment.  
+            But feel free to check out my skills and experience while you're here!
+            """
+        )
+        col1, col2 = st.columns([1, 6])
+        with col1:
+            st.markdown("### 👉")
+        with col2:
+            if st.button("📊 Explore my Skills and Professional Timeline"):
+                st.switch_page("pages/2_Timeline_and_Skills.py")
+
+
+def render_busy_notice():
+    # Drop the unanswered question so it can simply be asked again
+    if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
+        st.session_state.messages.pop()
+    st.warning("🚦 I'm chatting with a lot of visitors right now. Please ask again in a few seconds!")
+
+
+def render_chat_history():
+    # Streamlit has no way to cache rendered elements across reruns: every
+    # chat fragment rerun redraws all finished messages. The fragment keeps
+    # that to the chat only; the markdown itself is cheap next to the answer.
+    for message in st.session_state.messages:
+        avatar = avatar_image("chat") if message["role"] == "assistant" else None
+        with st.chat_message(message["role"], avatar=avatar):
+            content = message["content"]
+            if message["role"] == "assistant" and isinstance(content, dict):
+                st.markdown(content["full"])
+            else:
+                st.markdown(content)
+
+
+# --- Suggested Follow-ups ---
+def get_follow_up_prefetcher():
+    if "follow_up_prefetcher" not in st.session_state:
+        st.session_state.follow_up_prefetcher = FollowUpPrefetcher()
+    return st.session_state.follow_up_prefetcher
+
+
+def prefetch_follow_up(question, intent, history_context, session_id, embedding_size, model_setting, response_format):
+    """Retrieval context (and optionally the answer) for a suggestion; runs on a background thread."""
+    search_query = rewrite_search_query(question, intent, history_context.split("\n"), session_id, priority=BACKGROUND)
+    result = {"context": find_similar_doc(
+        search_queries(question, search_query, intent), DOC_TABLE, intent, embedding_size=embedding_size
+    )}
+    if response_format is not None:
+        prompt = get_prompt(question, result["context"], intent, history_context, response_format)
+        model = route("answer", intent, model_setting, session_id)
+        result["response"] = scheduled_complete(
+            model, prompt, session_id=session_id, call_type="answer", priority=BACKGROUND,
+            options={"temperature": 0.0},
+        )
+        result.update(prompt=prompt, model=model, model_setting=model_setting)
+    return result
+
+
+def start_follow_up_prefetch(intent):
+    """Offer follow-ups for the answer just given and start preparing them while the user reads."""
+    asked = [m["content"] for m in st.session_state.messages if m["role"] == "user"]
+    suggestions = dict(suggest_follow_ups(intent, asked))
+    st.session_state.suggestions = suggestions
+    if not suggestions:
+        return
+    # Everything the jobs need from session state is read here, on the script thread
+    history_context = get_previous_chat_context()
+    session_id = st.session_state["session_id"]
+    embedding_size = st.session_state.get("embedding_size", "1024")
+    model_setting = st.session_state.get("model", AUTO_MODEL)
+    prefetch_answers = st.session_state.get("prefetch_answers", False)
+    jobs = {}
+    for question, follow_up_intent in suggestions.items():
+        response_format = response_format_instructions(follow_up_intent) if prefetch_answers else None
+        jobs[question] = (
+            lambda q=question, i=follow_up_intent, f=response_format:
+            prefetch_follow_up(q, i, history_context, session_id, embedding_size, model_setting, f)
+        )
+    get_follow_up_prefetcher().start(jobs)
+
+
+def choose_suggestion(question):
+    st.session_state.ready_prompt = question
+
+
+def render_suggestions():
+    suggestions = st.session_state.get("suggestions")
+    if not suggestions or st.session_state.messages[-1]["role"] != "assistant":
+        return
+    columns = st.columns(len(suggestions))
+    for column, question in zip(columns, suggestions):
+        column.button(
+            f"💡 {question}", key=f"suggestion_{question}", on_click=choose_suggestion, args=(question,),
+            use_container_width=True,
+        )
+
+
+# --- Chat Loop ---
+# Runs as a fragment: chat input submissions and the reset button only rerun
+# this part of the page; sidebar and header widgets never re-render the history.
+@st.fragment
+def chat_fragment():
+    with track_rerun("chat"):
+        latest_user_message = ""
+
+        if not st.session_state.get("chatbot_error", False):
+            if st.button("🔄 Reset Chat"):
+                reset_conversation()
+
+        # Only show input if no chatbot error
+        chat_input = None
+        transcript = None  
+
+        if st.session_state["chatbot_error"] == False:
+            # chat_input = st.chat_input(placeholder="Ask me anything about my background, skills, or experience…")
+            if voice_mode:
+                # Only allow recording if chatbot is online
+                audio_bytes = st_audiorec()  # Returns audio bytes, usually WebM or WAV format
+                if audio_bytes:
+                    transcript = transcribe_audio(audio_bytes)
+                    if transcript:
+                        st.success(f"✅ You said: {transcript}")
+            else:
+                chat_input = st.chat_input(placeholder="Ask me anything about my background, skills, or experience…")
+        else:
+            render_offline_notice()
+            chat_input = None
+
+        user_message = None
+        if "ready_prompt" in st.session_state and st.session_state["chatbot_error"] == False:
+            user_message = st.session_state.ready_prompt
+            del st.session_state.ready_prompt
+        elif voice_mode and transcript is not None:
+            user_message = transcript
+        elif chat_input:
+            user_message = chat_input
+
+        # Proceed if user_message was set
+        from_suggestion = False
+        fact_match = None
+        if user_message:
+            # Job descriptions may be longer than questions; trimmed below once the intent is known
+            user_message = user_message[:MAX_JOB_DESCRIPTION_CHARS]
+            token_ledger.begin_turn(st.session_state["session_id"])
+            st.session_state.messages.append({"role": "user", "content": user_message})
+            suggested_intent = (st.session_state.pop("suggestions", None) or {}).get(user_message)
+            # Checked first, so a clicked suggestion gets the same fact answer as a typed one
+            fact_match = load_fact_index().match(user_message)
+            if fact_match:
+                # Answerable straight from skills.json / timeline.json: no LLM, no retrieval
+                get_follow_up_prefetcher().discard()
+                intent = "structured_fact"
+            elif suggested_intent:
+                # Clicked suggestion: intent is known and its context is (being) prefetched
+                intent = suggested_intent
+                from_suggestion = True
+            else:
+                get_follow_up_prefetcher().discard()
+                try:
+                    intent = classify_intent(user_message[:MAX_QUESTION_CHARS])
+                except SchedulerBusy:
+                    # Logged so the analytics rollups can count turned-away questions
+                    log_message_to_snowflake(
+                        session=session,
+                        session_id=st.session_state["session_id"],
+                        role="user",
+                        message=user_message,
+                        message_type="busy"
+                    )
+                    render_chat_history()
+                    render_busy_notice()
+                    return
+            if intent != "job_description":
+                user_message = user_message[:MAX_QUESTION_CHARS]
+                st.session_state.messages[-1]["content"] = user_message
+            log_message_to_snowflake(
+                session=session,
+                session_id=st.session_state["session_id"],
+                role="user",
+                message=user_message,
+                intent=intent,
+                message_type="input"
+            )
+        else:
+            intent = None
+
+        # --- Display chat messages (Full response only) ---
+        if st.session_state.chatbot_error == False:
+            render_chat_history()
+
+            if st.session_state.messages[-1]["role"] != "assistant":
+                latest_user_message = get_latest_user_message() or ""
+
+        try:
+            if intent not in ["casual_greeting", "unknown", "farewell", "structured_fact"] and latest_user_message:
+                answer_with_context(latest_user_message, intent, from_suggestion)
+                start_follow_up_prefetch(intent)
+            elif intent == "structured_fact":
+                answer_structured_fact(latest_user_message, intent, fact_match)
+            elif intent == "casual_greeting":
+                answer_casual_greeting(latest_user_message, intent)
+            elif intent == "unknown":
+                answer_unknown(latest_user_message, intent)
+            elif intent == "farewell":
+                answer_farewell(latest_user_message, intent)
+        except SchedulerBusy:
+            # Question was classified and logged, but no slot was free for the answer
+            log_message_to_snowflake(
+                session=session,
+                session_id=st.session_state["session_id"],
+                role="assistant",
+                message=None,
+                intent=intent,
+                message_type="busy"
+            )
+            render_busy_notice()
+            return
+
+        if intent:
+            # Fold messages that left the verbatim window into the summary while the user reads
+            update_chat_memory()
+
+        if st.session_state.chatbot_error == False:
+            render_suggestions()
+
+
+chat_fragment()
+record_timing("app", app_rerun_started)
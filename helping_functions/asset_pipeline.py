@@ -0,0 +1,135 @@
+# asset_pipeline.py
+"""
+Resized / compressed variants of the page images.
+
+The avatar is served as small WebP variants (header and chat thumbnail)
+instead of the full-size PNG, and the sidebar contact icons are inlined as
+data URIs instead of being hot-linked from the CDN on every page view.
+
+Build the variants (and fetch the icons once) with:
+
+    python -m helping_functions.asset_pipeline
+
+Without a build, avatar variants are generated in memory on first use and
+icons fall back to their CDN URLs.
+"""
+import base64
+import io
+import json
+import os
+import urllib.request
+
+import streamlit as st
+
+ASSET_DIR = "static/assets"
+MANIFEST_PATH = os.path.join(ASSET_DIR, "manifest.json")
+AVATAR_SOURCE = "docs/avatar.png"
+# Rendered widths in px (about 2x the on-screen size for sharp high-DPI displays)
+AVATAR_VARIANTS = {"header": 320, "chat": 96}
+ICON_SIZE = 40  # shown at 20px
+CONTACT_ICONS = {
+    "phone": "https://cdn-icons-png.flaticon.com/512/724/724664.png",
+    "email": "https://cdn-icons-png.flaticon.com/512/732/732200.png",
+    "linkedin": "https://cdn-icons-png.flaticon.com/512/174/174857.png",
+    "github": "https://cdn-icons-png.flaticon.com/512/733/733553.png",
+    "cv": "https://cdn-icons-png.flaticon.com/512/337/337946.png",
+}
+
+
+def _resize(image_bytes, size, fmt="WEBP", quality=80):
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img = img.convert("RGBA")
+        img.thumbnail((size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        if fmt == "WEBP":
+            img.save(out, format=fmt, quality=quality, method=6)
+        else:
+            img.save(out, format=fmt, optimize=True)
+        return out.getvalue()
+
+
+def _avatar_path(variant):
+    return os.path.join(ASSET_DIR, f"avatar_{variant}.webp")
+
+
+def _icon_path(name):
+    return os.path.join(ASSET_DIR, "icons", f"{name}.png")
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def build_assets():
+    """Write the avatar variants, the resized contact icons and a manifest to ASSET_DIR."""
+    os.makedirs(os.path.join(ASSET_DIR, "icons"), exist_ok=True)
+    with open(AVATAR_SOURCE, "rb") as f:
+        source = f.read()
+    sizes = {}
+    for variant, size in AVATAR_VARIANTS.items():
+        data = _resize(source, size)
+        with open(_avatar_path(variant), "wb") as f:
+            f.write(data)
+        sizes[f"avatar_{variant}.webp"] = len(data)
+    for name, url in CONTACT_ICONS.items():
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                data = _resize(response.read(), ICON_SIZE, fmt="PNG")
+        except OSError as e:
+            print(f"Could not fetch icon {name!r} ({e}); the sidebar keeps using its CDN URL.")
+            continue
+        with open(_icon_path(name), "wb") as f:
+            f.write(data)
+        sizes[f"icons/{name}.png"] = len(data)
+    # Written last: its mtime tells running apps that new files are in place
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(sizes, f, indent=2)
+    return sizes
+
+
+def avatar_image(variant="chat"):
+    """Avatar variant as bytes: the built file, else resized in memory, else the original PNG."""
+    # Keyed on the manifest time, so a build is picked up without a restart
+    return _avatar_image(variant, _mtime(MANIFEST_PATH))
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _avatar_image(variant, manifest_mtime):
+    try:
+        with open(_avatar_path(variant), "rb") as f:
+            return f.read()
+    except OSError:
+        pass
+    with open(AVATAR_SOURCE, "rb") as f:
+        source = f.read()
+    try:
+        return _resize(source, AVATAR_VARIANTS[variant])
+    except Exception:
+        return source
+
+
+def icon_src(name):
+    """Contact icon as an inline data URI when built locally, else its CDN URL."""
+    return _icon_src(name, _mtime(MANIFEST_PATH))
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _icon_src(name, manifest_mtime):
+    try:
+        with open(_icon_path(name), "rb") as f:
+            return "data:image/png;base64," + base64.b64encode(f.read()).decode()
+    except OSError:
+        return CONTACT_ICONS[name]
+
+
+if __name__ == "__main__":
+    with open(AVATAR_SOURCE, "rb") as f:
+        original = len(f.read())
+    print(f"{AVATAR_SOURCE}: {original / 1024:.1f} KB")
+    for path, size in build_assets().items():
+        print(f"{ASSET_DIR}/{path}: {size / 1024:.1f} KB")
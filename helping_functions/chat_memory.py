@@ -0,0 +1,78 @@
+# chat_memory.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by all sessions; summaries are small, short-lived background jobs
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-memory")
+
+
+def format_message_line(msg, max_chars=None):
+    role = "User" if msg["role"] == "user" else "Assistant"
+    content = msg["content"]
+    if isinstance(content, dict):  # if assistant content is a dict (full text)
+        content = content.get("full", "")
+    content = content.replace("\n", " ")  # flatten new lines for prompt
+    if max_chars and len(content) > max_chars:
+        content = content[:max_chars].rstrip() + "…"
+    return f"{role}: {content}"
+
+
+class ChatMemory:
+    """
+    Rolling conversation memory: a compact summary of older turns plus a
+    bounded verbatim window of the most recent messages.
+
+    Messages that slide out of the window are folded into the summary by
+    ``summarize_fn(previous_summary, new_lines) -> str`` on a background
+    thread, so the chat turn never waits for it. Until a summary job finishes
+    the previous summary is used, which keeps the prompt size flat.
+    """
+
+    def __init__(self, summarize_fn, max_message_chars=600, max_summary_chars=1200):
+        self.summarize_fn = summarize_fn
+        self.max_message_chars = max_message_chars
+        self.max_summary_chars = max_summary_chars
+        self.summary = ""
+        self.summarized_upto = 0  # messages[:summarized_upto] are in the summary
+        self.last_error = None
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def update(self, messages, window):
+        """Schedule summarisation of messages that fell out of the verbatim window."""
+        cutoff = max(len(messages) - window, 0)
+        with self._lock:
+            if cutoff <= self.summarized_upto:
+                return
+            if self._pending is not None and not self._pending.done():
+                return  # picked up on the next turn
+            new_lines = [
+                format_message_line(m, self.max_message_chars)
+                for m in messages[self.summarized_upto:cutoff]
+            ]
+            self._pending = _summary_executor.submit(
+                self._summarize, self.summary, new_lines, cutoff
+            )
+
+    def _summarize(self, previous_summary, new_lines, cutoff):
+        try:
+            summary = self.summarize_fn(previous_summary, new_lines) or ""
+        except Exception as e:
+            # Keep the old summary; the same messages are retried next turn
+            self.last_error = e
+            return
+        with self._lock:
+            self.summary = summary.strip()[:self.max_summary_chars]
+            self.summarized_upto = cutoff
+            self.last_error = None
+
+    def render(self, messages, window):
+        """Summary of older turns followed by the last ``window`` messages verbatim."""
+        recent = messages[-window:] if window > 0 else []
+        lines = []
+        with self._lock:
+            summary = self.summary
+        if summary:
+            lines.append(f"Summary of earlier conversation: {summary}")
+        lines.extend(format_message_line(m, self.max_message_chars) for m in recent)
+        return "\n".join(lines)
@@ -0,0 +1,432 @@
+# chat_rollups.py
+"""
+Incrementally maintained rollups over CHAT_LOGS.
+
+``refresh_rollups()`` reads only the CHAT_LOGS rows logged since the last
+watermark, aggregates them, and adds them to the rollup tables. The rollup
+upserts and the new watermark are written in one transaction, and the
+watermark only moves if nobody else moved it since it was read, so
+concurrent refreshers (every dashboard process runs one) never add the same
+slice twice. Rows are only picked up once they are ``lag`` old, so late
+inserts with an earlier timestamp are not skipped.
+
+The same code runs against Snowflake (through a Snowpark session) and a
+local SQLite or DuckDB stand-in. Run the self-check with:
+
+    python -m helping_functions.chat_rollups
+"""
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from helping_functions.prompt_templates import content_hash
+
+SOURCE_TABLE = "CHAT_LOGS"
+WATERMARK_TABLE = "CHAT_ROLLUP_WATERMARK"
+WATERMARK_NAME = "chat_logs"
+DEFAULT_LAG = timedelta(minutes=2)
+EPOCH = datetime(1970, 1, 1)
+MAX_QUESTION_CHARS = 300
+
+# table -> key columns and value columns with (type, how a new delta merges into the stored value)
+ROLLUP_TABLES = {
+    "CHAT_ROLLUP_HOURLY_INTENTS": {
+        "keys": {"hour": "TIMESTAMP", "intent": "STRING"},
+        "values": {
+            "inputs": ("NUMBER", "add"),
+            "responses": ("NUMBER", "add"),
+            "busy": ("NUMBER", "add"),          # turned away before classification
+            "answer_busy": ("NUMBER", "add"),   # classified, but no slot for the answer
+            "errors": ("NUMBER", "add"),
+        },
+    },
+    "CHAT_ROLLUP_HOURLY_MODELS": {
+        "keys": {"hour": "TIMESTAMP", "model_used": "STRING"},
+        "values": {"responses": ("NUMBER", "add")},
+    },
+    "CHAT_ROLLUP_SESSIONS": {
+        "keys": {"session_id": "STRING"},
+        "values": {
+            "first_seen": ("TIMESTAMP", "min"),
+            "last_seen": ("TIMESTAMP", "max"),
+            "inputs": ("NUMBER", "add"),
+            "responses": ("NUMBER", "add"),
+        },
+    },
+    "CHAT_ROLLUP_QUESTIONS": {
+        "keys": {"question_key": "STRING"},
+        "values": {
+            "question": ("STRING", "keep"),
+            "intent": ("STRING", "keep"),
+            "asks": ("NUMBER", "add"),
+            "last_asked": ("TIMESTAMP", "max"),
+        },
+    },
+}
+
+_TYPES = {
+    "snowflake": {"TIMESTAMP": "TIMESTAMP_NTZ", "STRING": "STRING", "NUMBER": "NUMBER"},
+    "sqlite": {"TIMESTAMP": "TEXT", "STRING": "TEXT", "NUMBER": "INTEGER"},
+    "duckdb": {"TIMESTAMP": "TIMESTAMP", "STRING": "VARCHAR", "NUMBER": "BIGINT"},
+}
+
+
+class SnowparkBackend:
+    dialect = "snowflake"
+
+    def __init__(self, session):
+        self.session = session
+
+    def query(self, sql, params=()):
+        rows = self.session.sql(sql, params=list(params) or None).collect()
+        return [{key.lower(): value for key, value in row.as_dict().items()} for row in rows]
+
+    def execute(self, sql, params=()):
+        self.session.sql(sql, params=list(params) or None).collect()
+
+    def update(self, sql, params=()):
+        """Run an UPDATE; returns the number of rows it updated."""
+        rows = self.session.sql(sql, params=list(params) or None).collect()
+        return int(rows[0][0]) if rows else 0
+
+
+class DBAPIBackend:
+    """sqlite3 or duckdb connection, used as a local stand-in for Snowflake."""
+
+    def __init__(self, conn, dialect="sqlite"):
+        self.conn = conn
+        self.dialect = dialect
+
+    def query(self, sql, params=()):
+        cursor = self.conn.execute(sql, list(params))
+        columns = [d[0].lower() for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def execute(self, sql, params=()):
+        self.conn.execute(sql, list(params))
+
+    def update(self, sql, params=()):
+        cursor = self.conn.execute(sql, list(params))
+        if cursor.rowcount >= 0:
+            return cursor.rowcount
+        return cursor.fetchone()[0]  # duckdb reports the count as a result row
+
+
+def _as_datetime(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.fromisoformat(str(value).replace(" ", "T"))
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace, so rephrasings of the same question group together."""
+    text = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def ensure_rollup_tables(backend):
+    types = _TYPES[backend.dialect]
+    for table, spec in ROLLUP_TABLES.items():
+        columns = [f"{name} {types[kind]}" for name, kind in spec["keys"].items()]
+        columns += [f"{name} {types[kind]}" for name, (kind, _) in spec["values"].items()]
+        backend.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)}, PRIMARY KEY ({', '.join(spec['keys'])}))"
+        )
+    backend.execute(
+        f"CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} "
+        f"(name {types['STRING']} PRIMARY KEY, last_timestamp {types['TIMESTAMP']}, refreshed_at {types['TIMESTAMP']})"
+    )
+    # The watermark row always exists, so moving it is a conditional UPDATE
+    backend.execute(
+        f"INSERT INTO {WATERMARK_TABLE} (name, last_timestamp, refreshed_at) "
+        f"SELECT ?, ?, NULL WHERE NOT EXISTS (SELECT 1 FROM {WATERMARK_TABLE} WHERE name = ?)",
+        [WATERMARK_NAME, _iso(EPOCH), WATERMARK_NAME],
+    )
+
+
+def _merge_expr(how, stored, incoming):
+    if how == "add":
+        return f"{stored} + {incoming}"
+    if how == "min":
+        return f"CASE WHEN {incoming} < {stored} THEN {incoming} ELSE {stored} END"
+    if how == "max":
+        return f"CASE WHEN {incoming} > {stored} THEN {incoming} ELSE {stored} END"
+    return stored  # keep
+
+
+def _upsert(backend, table, rows):
+    """Merge ``rows`` (dicts with every key and value column) into ``table``."""
+    if not rows:
+        return
+    spec = ROLLUP_TABLES[table]
+    keys, values = list(spec["keys"]), list(spec["values"])
+    columns = keys + values
+    params = [row[c] for row in rows for c in columns]
+    placeholders = ", ".join(["(" + ", ".join(["?"] * len(columns)) + ")"] * len(rows))
+
+    if backend.dialect == "snowflake":
+        kinds = {**spec["keys"], **{name: kind for name, (kind, _) in spec["values"].items()}}
+        types = _TYPES["snowflake"]
+        select = ", ".join(f"column{i + 1}::{types[kinds[c]]} AS {c}" for i, c in enumerate(columns))
+        updates = ", ".join(f"{c} = {_merge_expr(spec['values'][c][1], f't.{c}', f's.{c}')}" for c in values)
+        backend.execute(
+            f"""
+            MERGE INTO {table} t
+            USING (SELECT {select} FROM VALUES {placeholders}) s
+            ON {' AND '.join(f't.{k} = s.{k}' for k in keys)}
+            WHEN MATCHED THEN UPDATE SET {updates}
+            WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({', '.join(f's.{c}' for c in columns)})
+            """,
+            params,
+        )
+    else:
+        updates = ", ".join(f"{c} = {_merge_expr(spec['values'][c][1], c, f'excluded.{c}')}" for c in values)
+        backend.execute(
+            f"""
+            INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders}
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}
+            """,
+            params,
+        )
+
+
+def get_watermark(backend):
+    rows = backend.query(f"SELECT last_timestamp FROM {WATERMARK_TABLE} WHERE name = ?", [WATERMARK_NAME])
+    return _as_datetime(rows[0]["last_timestamp"]) if rows and rows[0]["last_timestamp"] else EPOCH
+
+
+def aggregate_rows(rows):
+    """Turn a slice of CHAT_LOGS rows into rollup deltas, keyed by table name."""
+    intents = defaultdict(Counter)
+    models = Counter()
+    sessions = {}
+    questions = {}
+    for row in rows:
+        ts = _as_datetime(row["timestamp"])
+        hour = _iso(ts.replace(minute=0, second=0, microsecond=0))
+        intent = row.get("intent") or "none"
+        message_type = row.get("message_type")
+        is_input = row["role"] == "user" and message_type == "input"
+        is_response = row["role"] == "assistant" and message_type == "response"
+
+        if is_input:
+            intents[(hour, intent)]["inputs"] += 1
+        elif is_response:
+            intents[(hour, intent)]["responses"] += 1
+            models[(hour, row.get("model_used") or "none")] += 1
+        elif message_type == "busy":
+            intents[(hour, intent)]["busy" if row["role"] == "user" else "answer_busy"] += 1
+        elif message_type == "error":
+            intents[(hour, intent)]["errors"] += 1
+
+        s = sessions.setdefault(
+            row["session_id"], {"session_id": row["session_id"], "first_seen": ts, "last_seen": ts, "inputs": 0, "responses": 0}
+        )
+        s["first_seen"], s["last_seen"] = min(s["first_seen"], ts), max(s["last_seen"], ts)
+        s["inputs"] += is_input
+        s["responses"] += is_response
+
+        if is_input:
+            normalized = normalize_question(row.get("message"))
+            if normalized:
+                key = content_hash(normalized)
+                q = questions.setdefault(key, {
+                    "question_key": key,
+                    "question": (row.get("message") or "")[:MAX_QUESTION_CHARS],
+                    "intent": intent,
+                    "asks": 0,
+                    "last_asked": ts,
+                })
+                q["asks"] += 1
+                q["last_asked"] = max(q["last_asked"], ts)
+
+    return {
+        "CHAT_ROLLUP_HOURLY_INTENTS": [
+            {
+                "hour": hour, "intent": intent, "inputs": c["inputs"], "responses": c["responses"],
+                "busy": c["busy"], "answer_busy": c["answer_busy"], "errors": c["errors"],
+            }
+            for (hour, intent), c in intents.items()
+        ],
+        "CHAT_ROLLUP_HOURLY_MODELS": [
+            {"hour": hour, "model_used": model, "responses": n} for (hour, model), n in models.items()
+        ],
+        "CHAT_ROLLUP_SESSIONS": [
+            {**s, "first_seen": _iso(s["first_seen"]), "last_seen": _iso(s["last_seen"])} for s in sessions.values()
+        ],
+        "CHAT_ROLLUP_QUESTIONS": [{**q, "last_asked": _iso(q["last_asked"])} for q in questions.values()],
+    }
+
+
+def refresh_rollups(backend, now=None, lag=DEFAULT_LAG, source_table=SOURCE_TABLE):
+    """
+    Add the CHAT_LOGS rows in (watermark, now - lag] to the rollups and move
+    the watermark. Returns the number of log rows processed, 0 when another
+    refresher moved the watermark first (its slice is already counted).
+    """
+    ensure_rollup_tables(backend)
+    now = now or datetime.utcnow()
+    watermark = get_watermark(backend)
+    upper = now - lag
+    if upper <= watermark:
+        return 0
+
+    rows = backend.query(
+        f"""
+        SELECT session_id, timestamp, role, intent, model_used, message_type, message
+        FROM {source_table}
+        WHERE timestamp > ? AND timestamp <= ?
+        """,
+        [_iso(watermark), _iso(upper)],
+    )
+    if not _commit_slice(backend, aggregate_rows(rows), watermark, upper, now):
+        return 0
+    return len(rows)
+
+
+def _commit_slice(backend, deltas, watermark, upper, now):
+    """
+    Upsert ``deltas`` and move the watermark from ``watermark`` to ``upper``
+    in one transaction. The watermark is moved first and only if it still
+    holds the value this slice was read at; otherwise nothing is written
+    and False is returned.
+    """
+    backend.execute("BEGIN")
+    try:
+        moved = backend.update(
+            f"UPDATE {WATERMARK_TABLE} SET last_timestamp = ?, refreshed_at = ? WHERE name = ? AND last_timestamp = ?",
+            [_iso(upper), _iso(now), WATERMARK_NAME, _iso(watermark)],
+        )
+        if not moved:
+            backend.execute("ROLLBACK")
+            return False
+        for table, table_rows in deltas.items():
+            _upsert(backend, table, table_rows)
+        backend.execute("COMMIT")
+    except Exception:
+        backend.execute("ROLLBACK")
+        raise
+    return True
+
+
+def rebuild_rollups(backend, now=None, lag=DEFAULT_LAG, source_table=SOURCE_TABLE):
+    """Drop all rollup data and the watermark, then aggregate CHAT_LOGS from scratch."""
+    ensure_rollup_tables(backend)
+    for table in [*ROLLUP_TABLES, WATERMARK_TABLE]:
+        backend.execute(f"DELETE FROM {table}")
+    return refresh_rollups(backend, now=now, lag=lag, source_table=source_table)
+
+
+def load_rollups(backend, since):
+    """Everything the dashboard needs, read from the rollup tables only."""
+    since = _iso(since)
+    return {
+        "intents": backend.query(
+            "SELECT hour, intent, inputs, responses, busy, answer_busy, errors FROM CHAT_ROLLUP_HOURLY_INTENTS "
+            "WHERE hour >= ? ORDER BY hour",
+            [since],
+        ),
+        "models": backend.query(
+            "SELECT hour, model_used, responses FROM CHAT_ROLLUP_HOURLY_MODELS WHERE hour >= ? ORDER BY hour",
+            [since],
+        ),
+        "sessions": backend.query(
+            "SELECT session_id, first_seen, last_seen, inputs, responses FROM CHAT_ROLLUP_SESSIONS WHERE last_seen >= ?",
+            [since],
+        ),
+        "questions": backend.query(
+            "SELECT question, intent, asks, last_asked FROM CHAT_ROLLUP_QUESTIONS WHERE last_asked >= ? "
+            "ORDER BY asks DESC LIMIT 25",
+            [since],
+        ),
+        "watermark": get_watermark(backend),
+    }
+
+
+if __name__ == "__main__":
+    # Self-check against SQLite (and DuckDB when installed): several incremental
+    # refreshes, with a late-arriving row, must equal one full rebuild.
+    import random
+    import sqlite3
+
+    def make_logs(backend):
+        backend.execute(
+            f"CREATE TABLE {SOURCE_TABLE} (session_id TEXT, timestamp {_TYPES[backend.dialect]['TIMESTAMP']}, "
+            "role TEXT, message TEXT, intent TEXT, model_used TEXT, message_type TEXT)"
+        )
+
+    def insert_log(backend, session_id, ts, role, message, intent, model, message_type):
+        backend.execute(
+            f"INSERT INTO {SOURCE_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [session_id, ts.isoformat(), role, message, intent, model, message_type],
+        )
+
+    def snapshot(backend):
+        return {
+            table: sorted(
+                tuple(str(v) for v in row.values())
+                for row in backend.query(f"SELECT * FROM {table}")
+            )
+            for table in ROLLUP_TABLES
+        }
+
+    def run(backend):
+        random.seed(7)
+        make_logs(backend)
+        start = datetime(2026, 10, 1, 8, 0)
+        questions = ["How many years of Spark?", "how many years of spark", "Tell me about Waymore", "Hi!"]
+        clock = start
+        for step in range(6):
+            for _ in range(40):
+                clock += timedelta(seconds=random.randint(5, 300))
+                sid = f"s{random.randint(1, 12)}"
+                intent = random.choice(["experience", "skills_or_tools", "casual_greeting"])
+                if random.random() < 0.05:
+                    insert_log(backend, sid, clock, "user", random.choice(questions), None, None, "busy")
+                    continue
+                insert_log(backend, sid, clock, "user", random.choice(questions), intent, None, "input")
+                outcome = random.random()
+                if outcome < 0.9:
+                    insert_log(backend, sid, clock + timedelta(seconds=3), "assistant", "…", intent, "mistral-large", "response")
+                elif outcome < 0.95:
+                    insert_log(backend, sid, clock + timedelta(seconds=3), "assistant", None, intent, None, "busy")
+                else:
+                    insert_log(backend, sid, clock + timedelta(seconds=3), "assistant", "ValueError: …", intent, None, "error")
+            # A row logged late, with a timestamp just inside the lag window
+            insert_log(backend, "late", clock - timedelta(seconds=30), "user", "Hi!", "casual_greeting", None, "input")
+            refresh_rollups(backend, now=clock + timedelta(minutes=1))
+        refresh_rollups(backend, now=clock + timedelta(hours=1))
+        incremental = snapshot(backend)
+        rebuild_rollups(backend, now=clock + timedelta(hours=1))
+        assert snapshot(backend) == incremental, "incremental rollups differ from a full rebuild"
+
+        # A second refresher that read the same watermark must not add its slice again
+        insert_log(backend, "racer", clock + timedelta(hours=2), "user", "Hi!", "casual_greeting", None, "input")
+        stale = get_watermark(backend)
+        assert refresh_rollups(backend, now=clock + timedelta(hours=3)) == 1
+        counted = snapshot(backend)
+        slice_deltas = aggregate_rows([{
+            "session_id": "racer", "timestamp": clock + timedelta(hours=2), "role": "user",
+            "intent": "casual_greeting", "message_type": "input", "message": "Hi!",
+        }])
+        assert not _commit_slice(backend, slice_deltas, stale, clock + timedelta(hours=3), clock)
+        assert snapshot(backend) == counted, "a stale refresher added its slice twice"
+        loaded = load_rollups(backend, start)
+        hot = loaded["questions"][0]
+        errors, answer_busy = (sum(row[c] for row in loaded["intents"]) for c in ("errors", "answer_busy"))
+        print(f"{backend.dialect}: OK, {sum(len(v) for v in incremental.values())} rollup rows, "
+              f"top question {hot['question']!r} x{hot['asks']}, {errors} errors, {answer_busy} busy answers")
+
+    run(DBAPIBackend(sqlite3.connect(":memory:", isolation_level=None)))
+    try:
+        import duckdb
+    except ImportError:
+        print("duckdb not installed, skipped")
+    else:
+        run(DBAPIBackend(duckdb.connect(), dialect="duckdb"))
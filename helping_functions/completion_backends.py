@@ -0,0 +1,169 @@
+# completion_backends.py
+"""
+Completion backends, selected per call type.
+
+Every LLM call names its call type ("classify", "rewrite", "answer",
+"summary"). The backend for each type comes from configuration:
+
+    COMPLETION_BACKEND=cortex                          # default for every type
+    COMPLETION_BACKENDS=classify=local,summary=canned  # per-type overrides
+
+Registered backends:
+
+    cortex  snowflake.cortex.complete
+    canned  deterministic stub for development, CI and load tests
+            (CANNED_LATENCY_MS adds a fixed delay to mimic a real model)
+    local   small GGUF model on the CPU through llama-cpp-python
+            (LOCAL_MODEL_PATH, LOCAL_MODEL_CONTEXT, LOCAL_MODEL_THREADS)
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+CALL_TYPES = ("classify", "rewrite", "answer", "summary")
+DEFAULT_BACKEND = os.getenv("COMPLETION_BACKEND", "cortex")
+
+
+class Completion(str):
+    """Completion text that also carries the backend's token usage, when it reports one."""
+
+    def __new__(cls, text, usage=None):
+        completion = super().__new__(cls, text)
+        completion.usage = usage
+        return completion
+
+
+class CortexBackend:
+    name = "cortex"
+
+    def slot_key(self, model):
+        return model
+
+    def complete(self, model, prompt, call_type, **kwargs):
+        from snowflake.cortex import complete
+
+        return complete(model, prompt, **kwargs)
+
+
+class CannedBackend:
+    """Same prompt, same answer; shaped like what each call type expects."""
+
+    name = "canned"
+
+    def __init__(self, latency_ms=None):
+        self.latency_ms = float(latency_ms if latency_ms is not None else os.getenv("CANNED_LATENCY_MS", "0"))
+
+    def slot_key(self, model):
+        return "canned"
+
+    def complete(self, model, prompt, call_type, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        digest = hashlib.sha256(str(prompt).encode("utf-8")).hexdigest()[:8]
+        if call_type == "classify":
+            return _canned_intent(_quoted_question(prompt))
+        if call_type == "rewrite":
+            return _quoted_question(prompt)
+        if call_type == "summary":
+            return f"Canned summary {digest}."
+        return json.dumps({
+            "text": f"This is a canned answer ({digest}) from the development backend.",
+            "tts": "This is a canned answer from the development backend.",
+        })
+
+
+def _quoted_question(prompt):
+    """The user text the classify / rewrite prompts quote."""
+    match = re.search(r'"""(.*?)"""', prompt, re.S) or re.search(r'question: "(.*?)"\n', prompt, re.S)
+    return match.group(1).strip() if match else prompt.strip().splitlines()[-1]
+
+
+_CANNED_INTENT_KEYWORDS = (
+    ("farewell", r"\b(bye|goodbye|see you)\b"),
+    ("casual_greeting", r"^\s*(hi|hello|hey|thanks|thank you)\b"),
+    ("certifications", r"\bcertif"),
+    ("skills_or_tools", r"\b(skill|tool|spark|kafka|python|sql|scala|airflow|snowflake|gcp|aws|azure)\b"),
+    ("experience", r"\b(work|worked|job|project|company|experience|role)\b"),
+    ("general_background", r"\b(study|studied|university|degree|background|language)\b"),
+)
+
+
+def _canned_intent(question):
+    text = question.lower()
+    for intent, pattern in _CANNED_INTENT_KEYWORDS:
+        if re.search(pattern, text):
+            return intent
+    return "unknown"
+
+
+class LocalBackend:
+    """
+    Small instruction model on the CPU (llama-cpp-python, GGUF file). The
+    model is loaded on first use and calls are serialized, since one llama.cpp
+    context can't run two prompts at once.
+    """
+
+    name = "local"
+
+    def __init__(self, model_path=None, context=None, threads=None):
+        self.model_path = model_path or os.getenv("LOCAL_MODEL_PATH")
+        self.context = int(context or os.getenv("LOCAL_MODEL_CONTEXT", "4096"))
+        self.threads = int(threads or os.getenv("LOCAL_MODEL_THREADS", "0")) or None
+        self._llm = None
+        self._lock = threading.Lock()
+
+    def slot_key(self, model):
+        return f"local:{os.path.basename(self.model_path or '')}"
+
+    def _load(self):
+        if self._llm is None:
+            if not self.model_path:
+                raise RuntimeError("LOCAL_MODEL_PATH is not set for the local completion backend.")
+            from llama_cpp import Llama
+
+            self._llm = Llama(model_path=self.model_path, n_ctx=self.context, n_threads=self.threads, verbose=False)
+        return self._llm
+
+    def complete(self, model, prompt, call_type, options=None, **kwargs):
+        options = options or {}
+        with self._lock:
+            llm = self._load()
+            result = llm.create_chat_completion(
+                messages=[{"role": "user", "content": prompt}],
+                temperature=options.get("temperature", 0.0),
+                max_tokens=options.get("max_tokens", 512),
+            )
+        usage = result.get("usage") or {}
+        return Completion(
+            result["choices"][0]["message"]["content"],
+            usage={"prompt_tokens": usage.get("prompt_tokens"), "completion_tokens": usage.get("completion_tokens")},
+        )
+
+
+BACKENDS = {backend.name: backend for backend in (CortexBackend(), CannedBackend(), LocalBackend())}
+
+
+def _parse_overrides(value):
+    overrides = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        call_type, _, backend = item.partition("=")
+        overrides[call_type.strip()] = backend.strip()
+    return overrides
+
+
+BACKEND_BY_CALL_TYPE = _parse_overrides(os.getenv("COMPLETION_BACKENDS"))
+
+
+def backend_for(call_type):
+    name = BACKEND_BY_CALL_TYPE.get(call_type, DEFAULT_BACKEND)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown completion backend {name!r} for call type {call_type!r}")
+    return BACKENDS[name]
+
+
+def backend_routes():
+    """Call type -> backend name, for the settings tab."""
+    return {call_type: backend_for(call_type).name for call_type in CALL_TYPES}
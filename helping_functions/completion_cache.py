@@ -0,0 +1,187 @@
+# completion_cache.py
+"""
+Disk-backed cache of deterministic completions, kept across restarts and
+redeploys.
+
+Only temperature-0 calls are cached. The key is the backend, model,
+options and a hash of the rendered prompt. Every entry also records the
+prompt template it was rendered from (PromptTemplate name plus bound
+variant, and hash). The template hash is part of the key, so editing a
+template invalidates only that template's entries; after a restart, the
+first store under the new version deletes the old version's rows of the
+same variant. Variants bound with different static values (one response
+format per intent, local vs model speech) live side by side.
+
+    COMPLETION_CACHE=1                       # 0 disables the cache
+    COMPLETION_CACHE_PATH=static/cache/completions.sqlite3
+    COMPLETION_CACHE_TTL_DAYS=30
+    COMPLETION_CACHE_MAX_ENTRIES=50000       # least recently used entries go first
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+CACHE_ENABLED = os.getenv("COMPLETION_CACHE", "1") != "0"
+CACHE_PATH = os.getenv("COMPLETION_CACHE_PATH", "static/cache/completions.sqlite3")
+CACHE_TTL_SECONDS = float(os.getenv("COMPLETION_CACHE_TTL_DAYS", "30")) * 86400
+CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "50000"))
+EVICT_EVERY = 100  # writes between size checks
+
+
+def is_deterministic(options):
+    # Cortex COMPLETE defaults to temperature 0 when no options are given
+    return float((options or {}).get("temperature", 0) or 0) == 0
+
+
+def template_of(prompt):
+    """
+    (template name, template hash) of a RenderedPrompt; (None, None) for a
+    free-form prompt. The name includes the bound variant, so only an edit
+    of the same variant replaces its rows, never a sibling variant.
+    """
+    template = getattr(prompt, "template", None)
+    if template is None:
+        return None, None
+    return f"{template.name}:{template.variant}", template.hash
+
+
+def cache_key(backend, model, prompt, options=None):
+    prompt_hash = hashlib.sha256(str(prompt).encode("utf-8")).hexdigest()
+    _, template_hash = template_of(prompt)
+    payload = json.dumps([backend, model, options or {}, template_hash, prompt_hash], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """SQLite-backed completion cache shared by every session of the process (and other processes on the host)."""
+
+    def __init__(self, path=CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._started_at = time.time()
+        self._seen_templates = set()
+        self._writes = 0
+        self._stats = defaultdict(lambda: {"hits": 0, "misses": 0, "stores": 0, "errors": 0})
+        self.evicted = 0
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    call_type TEXT,
+                    model TEXT,
+                    template_name TEXT,
+                    template_hash TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_template ON completions (template_name, template_hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key, call_type):
+        """Cached response, or None on a miss. A cache that can't be read counts as a miss."""
+        now = time.time()
+        with self._lock:
+            stats = self._stats[call_type]
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT response FROM completions WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl_seconds),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE completions SET last_used_at = ? WHERE key = ?", (now, key))
+                    conn.commit()
+            except (sqlite3.Error, OSError):
+                stats["errors"] += 1
+                row = None
+            if row is None:
+                stats["misses"] += 1
+                return None
+            stats["hits"] += 1
+            return row[0]
+
+    def put(self, key, call_type, model, prompt, response):
+        with self._lock:
+            try:
+                self._put(key, call_type, model, prompt, response)
+            except (sqlite3.Error, OSError):
+                self._stats[call_type]["errors"] += 1
+
+    def _put(self, key, call_type, model, prompt, response):
+        template_name, template_hash = template_of(prompt)
+        now = time.time()
+        conn = self._connection()
+        if template_name is not None and (template_name, template_hash) not in self._seen_templates:
+            # First store of this template version in this process: other versions of the
+            # same template that nothing has used since the process started are from old code
+            cursor = conn.execute(
+                "DELETE FROM completions WHERE template_name = ? AND template_hash != ? AND last_used_at < ?",
+                (template_name, template_hash, self._started_at),
+            )
+            self.evicted += cursor.rowcount
+            self._seen_templates.add((template_name, template_hash))
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO completions
+                (key, call_type, model, template_name, template_hash, response, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (key, call_type, model, template_name, template_hash, str(response), now, now),
+        )
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 1:
+            self._evict(conn, now)
+        conn.commit()
+        self._stats[call_type]["stores"] += 1
+
+    def _evict(self, conn, now):
+        cursor = conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.evicted += cursor.rowcount
+        (count,) = conn.execute("SELECT COUNT(*) FROM completions").fetchone()
+        if count > self.max_entries:
+            cursor = conn.execute(
+                "DELETE FROM completions WHERE key IN "
+                "(SELECT key FROM completions ORDER BY last_used_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            self.evicted += cursor.rowcount
+
+    def entries(self):
+        with self._lock:
+            (count,) = self._connection().execute("SELECT COUNT(*) FROM completions").fetchone()
+            return count
+
+    def metrics(self):
+        """Per call type: hits, misses, hit rate and stores since this process started."""
+        with self._lock:
+            return [
+                {
+                    "call_type": call_type,
+                    **stats,
+                    "hit_rate": round(stats["hits"] / (stats["hits"] + stats["misses"]), 3)
+                    if stats["hits"] + stats["misses"] else 0.0,
+                }
+                for call_type, stats in sorted(self._stats.items())
+            ]
+
+
+# Module-level singleton; None when the cache is disabled
+completion_cache = CompletionCache() if CACHE_ENABLED else None
@@ -0,0 +1,189 @@
+# cortex_scheduler.py
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from helping_functions.completion_backends import backend_for
+from helping_functions.completion_cache import cache_key, completion_cache, is_deterministic
+from helping_functions.model_router import model_health
+from helping_functions.single_flight import flight_key, single_flight
+from helping_functions.token_accounting import call_usage, token_ledger
+
+# Lower value = served first
+INTERACTIVE = 0   # answer generation and everything the user is waiting on
+BACKGROUND = 1    # summaries, prefetch rewrites and other speculative work
+
+MAX_TRACKED_SESSIONS = 5000  # round-robin state kept for the most recently served sessions
+
+
+class SchedulerBusy(Exception):
+    """Raised when a Cortex call can't be admitted (queue full or waited too long)."""
+
+
+class _Ticket:
+    __slots__ = ("priority", "session_id", "seq", "enqueued")
+
+    def __init__(self, priority, session_id, seq):
+        self.priority = priority
+        self.session_id = session_id
+        self.seq = seq
+        self.enqueued = time.monotonic()
+
+
+class CortexScheduler:
+    """
+    Process-wide admission control for Cortex calls.
+
+    Each model has a concurrency limit. Calls beyond it wait in a queue that
+    is served by priority first, then round-robin across ``session_id``s
+    (the session served least recently goes next), so one chatty session
+    can't starve the others. When the queue is full, or a call waits longer
+    than ``max_wait`` seconds, ``SchedulerBusy`` is raised right away so the
+    UI can show a friendly "busy" message instead of piling up more load.
+    Background work may only use half of the queue. Only the most recently
+    served ``max_sessions`` are remembered; a forgotten session counts as
+    never served, so it stays at the front of the rotation.
+    """
+
+    def __init__(self, default_limit=4, model_limits=None, max_queue=20, max_wait=30.0,
+                 max_sessions=MAX_TRACKED_SESSIONS):
+        self.default_limit = default_limit
+        self.model_limits = model_limits or {}
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_sessions = max_sessions
+        self._cond = threading.Condition()
+        self._in_flight = defaultdict(int)
+        self._waiting = defaultdict(list)
+        self._last_served = OrderedDict()
+        self._ticket_seq = itertools.count()
+        self._serve_seq = itertools.count()
+        self._stats = defaultdict(lambda: defaultdict(float))
+
+    def limit_for(self, model):
+        return self.model_limits.get(model, self.default_limit)
+
+    def _next_ticket(self, model):
+        waiting = self._waiting[model]
+        if not waiting:
+            return None
+        return min(
+            waiting,
+            key=lambda t: (t.priority, self._last_served.get(t.session_id, -1), t.seq),
+        )
+
+    def _queue_cap(self, priority):
+        return self.max_queue if priority == INTERACTIVE else self.max_queue // 2
+
+    @contextmanager
+    def slot(self, model, session_id, priority=INTERACTIVE):
+        self._acquire(model, session_id, priority)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight[model] -= 1
+                self._cond.notify_all()
+
+    def _acquire(self, model, session_id, priority):
+        with self._cond:
+            stats = self._stats[model]
+            waiting = self._waiting[model]
+            if len(waiting) >= self._queue_cap(priority):
+                stats["rejected"] += 1
+                raise SchedulerBusy(f"Cortex queue for {model} is full ({len(waiting)} waiting).")
+
+            ticket = _Ticket(priority, session_id, next(self._ticket_seq))
+            waiting.append(ticket)
+            deadline = ticket.enqueued + self.max_wait
+            while not (
+                self._in_flight[model] < self.limit_for(model)
+                and self._next_ticket(model) is ticket
+            ):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    waiting.remove(ticket)
+                    stats["timed_out"] += 1
+                    self._cond.notify_all()
+                    raise SchedulerBusy(f"Timed out waiting for a {model} slot.")
+                self._cond.wait(remaining)
+
+            waiting.remove(ticket)
+            self._in_flight[model] += 1
+            self._last_served[session_id] = next(self._serve_seq)
+            self._last_served.move_to_end(session_id)
+            while len(self._last_served) > self.max_sessions:
+                self._last_served.popitem(last=False)
+            stats["admitted"] += 1
+            stats["wait_ms_total"] += (time.monotonic() - ticket.enqueued) * 1000
+            # Another slot may still be free for the next ticket in line
+            self._cond.notify_all()
+
+    def metrics(self):
+        """Per-model snapshot: limit, in flight, queued, admitted, rejected, timed out, avg wait."""
+        with self._cond:
+            models = set(self._stats) | set(self._in_flight)
+            rows = []
+            for model in sorted(models):
+                stats = self._stats[model]
+                admitted = int(stats["admitted"])
+                rows.append({
+                    "model": model,
+                    "limit": self.limit_for(model),
+                    "in_flight": self._in_flight[model],
+                    "queued": len(self._waiting[model]),
+                    "admitted": admitted,
+                    "rejected": int(stats["rejected"]),
+                    "timed_out": int(stats["timed_out"]),
+                    "avg_wait_ms": round(stats["wait_ms_total"] / admitted, 1) if admitted else 0.0,
+                })
+            return rows
+
+
+# Module-level singleton: Streamlit imports helper modules once per process,
+# so every session shares the same scheduler.
+scheduler = CortexScheduler(
+    default_limit=int(os.getenv("CORTEX_MAX_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("CORTEX_MAX_QUEUE", "20")),
+    max_wait=float(os.getenv("CORTEX_MAX_WAIT_SECONDS", "30")),
+)
+
+
+def scheduled_complete(model, prompt, *, session_id, call_type="answer", priority=INTERACTIVE, **kwargs):
+    """Completion from the backend configured for ``call_type``, behind the shared admission control."""
+    backend = backend_for(call_type)
+    # Captured now: a background call may finish after the session has moved on to its next turn
+    turn_id = token_ledger.current_turn(session_id)
+    # Deterministic calls are answered from the persistent cache: no slot, no tokens
+    key = None
+    if completion_cache is not None and is_deterministic(kwargs.get("options")):
+        key = cache_key(backend.name, model, prompt, kwargs.get("options"))
+        cached = completion_cache.get(key, call_type)
+        if cached is not None:
+            return cached
+
+    def call():
+        with scheduler.slot(backend.slot_key(model), session_id, priority):
+            # Timed without the queue wait: the router judges the model, not the load
+            started = time.perf_counter()
+            try:
+                response = backend.complete(model, prompt, call_type, **kwargs)
+            except Exception:
+                model_health.record(model, (time.perf_counter() - started) * 1000, ok=False)
+                raise
+            model_health.record(model, (time.perf_counter() - started) * 1000)
+            # Charged to the session that made the upstream call, not to coalesced followers
+            token_ledger.record(
+                session_id, call_usage(model, call_type, prompt, response),
+                turn_id=turn_id, background=priority == BACKGROUND,
+            )
+            if key is not None:
+                completion_cache.put(key, call_type, model, prompt, response)
+            return response
+
+    # Identical concurrent calls (e.g. the same sidebar prompt clicked in several
+    # sessions) share one upstream call; only the leader takes a scheduler slot.
+    return single_flight.do(flight_key(call_type, f"{backend.name}:{model}", prompt, kwargs.get("options")), call)
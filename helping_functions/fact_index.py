@@ -0,0 +1,180 @@
+# fact_index.py
+import re
+from datetime import datetime
+
+# Question patterns for the attributes the structured files can answer exactly
+# Only explicit duration phrasing: "experience with X" or "over the years" is an open question
+_YEARS_RE = re.compile(r"\bhow many years\b|\bhow long\b|\byears? of\b")
+_START_RE = re.compile(r"\bwhen\b.*\b(join|joined|start|started|begin|began|enrol|enroll|enrolled)\b|\bsince when\b")
+_END_RE = re.compile(r"\bwhen\b.*\b(leave|left|finish|finished|graduate|graduated|end|ended|complete|completed)\b")
+_CERTS_RE = re.compile(r"\bcertifi(cations?|cates?|ed)\b")
+_NOT_A_LOOKUP_RE = re.compile(r"\b(why|compare|compared|versus|vs|opinion|plan|planning|future|next|soon|describe|explain|tell me about)\b")
+# Several questions in one message: a template would answer only one of them
+_MULTI_CLAUSE_RE = re.compile(r"\sand\s|\?(?=.*\w)")
+
+MAX_FACT_QUESTION_CHARS = 200
+# Words that carry no identity on their own in skill / employer names
+_GENERIC_WORDS = {"ecosystem", "infrastructure", "scripting", "basics", "on", "prem", "core", "&", "and", "—"}
+
+
+def _month_year(d):
+    return datetime(int(d.get("year", 1900)), int(d.get("month", 1)), 1).strftime("%B %Y")
+
+
+def _skill_aliases(name):
+    aliases = {name.lower()}
+    base = re.sub(r"\s*\(.*?\)", "", name).strip().lower()
+    aliases.add(base)
+    for inner in re.findall(r"\((.*?)\)", name):
+        aliases.update(p.strip().lower() for p in re.split(r"[,&]", inner))
+    for part in re.split(r"[/&]", base):
+        aliases.add(part.strip())
+    words = [w for w in base.split() if w not in _GENERIC_WORDS]
+    if len(words) == 1:
+        aliases.add(words[0])
+    return {a for a in aliases if a and a not in _GENERIC_WORDS}
+
+
+def _event_aliases(headline):
+    headline = re.sub(r"[^\w\s&()\-—]", "", headline).strip()  # drop emojis
+    role, _, org = headline.partition("—")
+    org = org or role
+    aliases = set()
+    base = re.sub(r"\s*\(.*?\)", "", org).strip().lower()
+    aliases.add(base)
+    aliases.update(p.strip() for p in re.split(r"[-\s]+", base) if len(p.strip()) > 3)
+    if "-" in base:
+        aliases.add(base.replace("-", " "))
+    for inner in re.findall(r"\((.*?)\)", org):
+        if inner.lower() not in ("present", "in progress"):
+            aliases.add(inner.lower())
+    if "bsc" in headline.lower():
+        aliases.update({"bsc", "degree", "university", "university of athens", "studies"})
+    return {a for a in aliases if a and a not in _GENERIC_WORDS}
+
+
+class FactIndex:
+    """
+    In-memory index over docs/skills.json and docs/timeline.json for questions
+    whose answer is a single structured field ("how many years of Spark?",
+    "when did you join Waymore?", "which certifications do you have?").
+
+    ``match()`` returns a dict with the exact facts and a templated answer
+    when it is confident, otherwise None so the normal RAG pipeline runs.
+    Skill levels are never exposed.
+    """
+
+    def __init__(self, skills_json, timeline_json):
+        self.skills = {}
+        exact, derived = {}, {}
+        for category in skills_json.get("categories", []):
+            for skill in category.get("skills", []):
+                fact = {"name": skill["name"], "experience_years": skill.get("experience_years")}
+                exact.setdefault(skill["name"].lower(), fact)
+                for alias in _skill_aliases(skill["name"]):
+                    derived.setdefault(alias, fact)
+        # Exact skill names win over aliases derived from other skills ("hive" vs "Hadoop Ecosystem (… Hive …)")
+        self.skills = {**derived, **exact}
+
+        self.events = {}
+        self.certifications = []
+        for event in timeline_json.get("events", []):
+            headline = event["text"]["headline"]
+            ongoing = bool(re.search(r"\((present|in progress)\)|in progress", headline, re.I))
+            name = re.sub(r"\s*\((present|in progress)\)|\s*—\s*in progress", "", headline, flags=re.I)
+            name = re.sub(r"^[^\w]+", "", name).strip()  # drop the leading emoji
+            role, _, org = (part.strip() for part in name.partition("—"))
+            fact = {
+                "name": name,
+                "role": role if org else None,
+                "org": org or None,
+                "start": _month_year(event.get("start_date", {})),
+                "end": None if ongoing else _month_year(event.get("end_date", event.get("start_date", {}))),
+                "tags": event.get("tags", []),
+            }
+            if "Certifications" in fact["tags"]:
+                self.certifications.append(fact)
+                continue
+            for alias in _event_aliases(headline):
+                self.events.setdefault(alias, fact)
+
+        self._skill_re = self._alias_regex(self.skills)
+        self._event_re = self._alias_regex(self.events)
+
+    @staticmethod
+    def _alias_regex(aliases):
+        # Longest first so "google cloud platform" beats "google"
+        alternatives = "|".join(re.escape(a) for a in sorted(aliases, key=len, reverse=True) if len(a) > 1)
+        return re.compile(rf"(?<![\w-])({alternatives})(?![\w-])")
+
+    def _find(self, regex, lookup, text):
+        found = {}
+        for m in regex.finditer(text):
+            fact = lookup[m.group(1)]
+            found[fact["name"]] = fact
+        return list(found.values())
+
+    def find_skills(self, text):
+        """Skills named in ``text`` (exact names or aliases), without their levels."""
+        return self._find(self._skill_re, self.skills, text.lower())
+
+    def match(self, question):
+        if not question or len(question) > MAX_FACT_QUESTION_CHARS:
+            return None
+        text = question.lower().strip()
+        if _NOT_A_LOOKUP_RE.search(text) or _MULTI_CLAUSE_RE.search(text):
+            return None
+
+        events = self._find(self._event_re, self.events, text)
+        skills = self._find(self._skill_re, self.skills, text)
+
+        if len(events) == 1 and not skills and (_START_RE.search(text) or _END_RE.search(text)):
+            return self._event_answer(events[0], ending=bool(_END_RE.search(text)))
+        if len(skills) == 1 and not events and _YEARS_RE.search(text):
+            return self._skill_answer(skills[0])
+        if _CERTS_RE.search(text) and not skills and not events:
+            return self._certifications_answer()
+        return None
+
+    def _skill_answer(self, skill):
+        years = skill["experience_years"]
+        if not years:
+            # No (or zero) recorded years: let the RAG answer describe the experience instead
+            return None
+        unit = "year" if years == 1 else "years"
+        return {
+            "attribute": "experience_years",
+            "facts": [skill],
+            "text": f"I have {years} {unit} of hands-on experience with {skill['name']}.",
+        }
+
+    def _event_answer(self, event, ending=False):
+        if event["org"]:
+            what = f"{event['org']} as a {event['role']}"
+            subject = event["org"]
+        else:
+            what = f"my {event['name']}"
+            subject = f"my {event['name']}"
+        if ending:
+            if event["end"] is None:
+                text = f"I haven't left. I've been at {subject} since {event['start']}."
+            else:
+                verb = "left" if event["org"] else "finished"
+                text = f"I {verb} {subject} in {event['end']}, after starting in {event['start']}."
+        else:
+            verb = "joined" if event["org"] else "started"
+            text = f"I {verb} {what} in {event['start']}" + (
+                ", and I'm still there today." if event["end"] is None else f", and stayed until {event['end']}."
+            )
+        return {"attribute": "end_date" if ending else "start_date", "facts": [event], "text": text}
+
+    def _certifications_answer(self):
+        done = [c for c in self.certifications if c["end"] is not None]
+        in_progress = [c for c in self.certifications if c["end"] is None]
+        lines = ["Here are my certifications:"]
+        lines += [f"- {c['name']} ({c['end']})" for c in done]
+        if in_progress:
+            lines.append("")
+            lines.append("Currently in progress:")
+            lines += [f"- {c['name']}" for c in in_progress]
+        return {"attribute": "certifications", "facts": self.certifications, "text": "\n".join(lines)}
@@ -0,0 +1,222 @@
+# feedback_outbox.py
+import html
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+OUTBOX_PATH = os.getenv("FEEDBACK_OUTBOX_PATH", "feedback_outbox.sqlite3")
+MAX_ATTEMPTS = 8
+BASE_BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 30 * 60
+BATCH_SIZE = 20
+CLAIM_SECONDS = 5 * 60  # a worker that dies mid-send releases its rows after this
+
+
+class SendGridTransport:
+    """Sends a batch of feedback items as one email; the client is created once."""
+
+    def __init__(self, api_key=None, from_email=None):
+        from sendgrid import SendGridAPIClient
+
+        self.from_email = from_email or os.getenv("SENDGRID_SENDER_EMAIL")
+        self.client = SendGridAPIClient(api_key or os.getenv("SENDGRID_API_KEY"))
+
+    def send(self, items):
+        from sendgrid.helpers.mail import Mail
+
+        blocks = []
+        for item in items:
+            formatted_feedback = html.escape(item["feedback_text"]).replace("\n", "<br>")
+            sender = html.escape(item["user_email"] or "Anonymous")
+            blocks.append(f'<p>{formatted_feedback}</p><p>From: {sender} • {item["created_at"]} UTC</p>')
+        subject = "New Chatbot Feedback" if len(items) == 1 else f"New Chatbot Feedback ({len(items)} messages)"
+        message = Mail(
+            from_email=self.from_email,
+            to_emails=self.from_email,
+            subject=subject,
+            html_content="<hr>".join(blocks),
+        )
+        response = self.client.send(message)
+        if response.status_code >= 300:
+            raise RuntimeError(f"SendGrid responded with {response.status_code}")
+
+
+class LocalTransport:
+    """Stand-in for tests and local development: appends each batch to a JSONL file."""
+
+    def __init__(self, path="feedback_sent.jsonl"):
+        self.path = path
+        self.sent = []
+
+    def send(self, items):
+        self.sent.append(items)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(items) + "\n")
+
+
+class FeedbackOutbox:
+    """
+    Durable outbox for feedback emails.
+
+    ``enqueue()`` only writes the feedback to SQLite and returns, so the
+    Streamlit rerun never waits on the email provider. A daemon worker sends
+    due items in batches and retries failures with exponential backoff
+    (with jitter) until ``max_attempts``; nothing is lost on a failed send
+    or a restart, since unsent rows stay in the database. Every process that
+    shares the database runs a worker, so a batch is claimed (leased for
+    ``claim_seconds``) before it is sent and only the claimed rows go out.
+    """
+
+    def __init__(self, transport, db_path=OUTBOX_PATH, max_attempts=MAX_ATTEMPTS,
+                 base_backoff=BASE_BACKOFF_SECONDS, batch_size=BATCH_SIZE, claim_seconds=CLAIM_SECONDS,
+                 start_worker=True):
+        self.transport = transport
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.batch_size = batch_size
+        self.claim_seconds = claim_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    feedback_text TEXT NOT NULL,
+                    user_email TEXT,
+                    created_at TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    sent_at TEXT,
+                    last_error TEXT,
+                    claimed_by TEXT,
+                    claimed_until REAL
+                )
+            """)
+            # Outbox files created before claims existed
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(outbox)")}
+            for column, kind in (("claimed_by", "TEXT"), ("claimed_until", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE outbox ADD COLUMN {column} {kind}")
+        self._worker = None
+        if start_worker:
+            self._worker = threading.Thread(target=self._run, name="feedback-outbox", daemon=True)
+            self._worker.start()
+
+    @contextmanager
+    def _connect(self):
+        """Connection that commits (or rolls back) and is closed when the block ends."""
+        with closing(sqlite3.connect(self.db_path, timeout=10)) as conn:
+            conn.row_factory = sqlite3.Row
+            with conn:
+                yield conn
+
+    def _claim(self):
+        """Lease up to one batch of due, unclaimed items to this call; returns the claimed rows."""
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """UPDATE outbox SET claimed_by = ?, claimed_until = ?
+                   WHERE id IN (
+                       SELECT id FROM outbox
+                       WHERE sent_at IS NULL AND attempts < ? AND next_attempt_at <= ?
+                         AND (claimed_until IS NULL OR claimed_until < ?)
+                       ORDER BY id LIMIT ?
+                   )
+                   AND (claimed_until IS NULL OR claimed_until < ?)""",
+                (token, now + self.claim_seconds, self.max_attempts, now, now, self.batch_size, now),
+            )
+            rows = conn.execute(
+                """SELECT id, feedback_text, user_email, created_at, attempts FROM outbox
+                   WHERE claimed_by = ? ORDER BY id""",
+                (token,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def enqueue(self, feedback_text, user_email=None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO outbox (feedback_text, user_email, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                (feedback_text, user_email, datetime.utcnow().isoformat(timespec="seconds"), time.time()),
+            )
+        self._wake.set()
+        return True
+
+    def flush(self):
+        """Send one batch of due items now; returns how many were sent."""
+        items = self._claim()
+        if not items:
+            return 0
+        ids = [(item["id"],) for item in items]
+        try:
+            self.transport.send(items)
+        except Exception as e:
+            with self._connect() as conn:
+                for item in items:
+                    delay = min(self.base_backoff * 2 ** item["attempts"], MAX_BACKOFF_SECONDS)
+                    conn.execute(
+                        """UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?,
+                               claimed_by = NULL, claimed_until = NULL
+                           WHERE id = ?""",
+                        (time.time() + delay * random.uniform(0.8, 1.2), str(e)[:500], item["id"]),
+                    )
+            return 0
+        with self._connect() as conn:
+            sent_at = datetime.utcnow().isoformat(timespec="seconds")
+            conn.executemany(
+                "UPDATE outbox SET sent_at = ?, last_error = NULL, claimed_by = NULL, claimed_until = NULL WHERE id = ?",
+                [(sent_at, item_id) for (item_id,) in ids],
+            )
+        return len(items)
+
+    def stats(self):
+        with self._connect() as conn:
+            row = conn.execute(
+                """SELECT
+                       SUM(sent_at IS NOT NULL) AS sent,
+                       SUM(sent_at IS NULL AND attempts < ?) AS pending,
+                       SUM(sent_at IS NULL AND attempts >= ?) AS failed
+                   FROM outbox""",
+                (self.max_attempts, self.max_attempts),
+            ).fetchone()
+        return {key: int(row[key] or 0) for key in ("sent", "pending", "failed")}
+
+    def _next_due_in(self):
+        with self._connect() as conn:
+            row = conn.execute(
+                # Rows leased by another worker are due again only when their claim runs out
+                "SELECT MIN(MAX(next_attempt_at, COALESCE(claimed_until, 0))) FROM outbox "
+                "WHERE sent_at IS NULL AND attempts < ?",
+                (self.max_attempts,),
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(row[0] - time.time(), 0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.flush():
+                    pass
+                wait = self._next_due_in()
+            except Exception as e:
+                print("Feedback outbox worker error:", e)
+                wait = self.base_backoff
+            self._wake.wait(timeout=wait if wait is not None else 60)
+            self._wake.clear()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+def create_feedback_outbox():
+    transport = LocalTransport() if os.getenv("FEEDBACK_TRANSPORT") == "local" else SendGridTransport()
+    return FeedbackOutbox(transport)
@@ -0,0 +1,94 @@
+# follow_ups.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_SUGGESTIONS = 3
+PREFETCH_WAIT_SECONDS = 10  # how long a click waits for a prefetch that is still running
+
+# Self-contained follow-ups per answered intent, with the intent they will be answered with,
+# so a clicked suggestion needs no classification and no chat history to make sense.
+FOLLOW_UPS = {
+    "experience": [
+        ("What do you work on at Waymore?", "experience"),
+        ("Which technologies do you use day to day?", "skills_or_tools"),
+        ("What did you build at Netcompany-Intrasoft?", "experience"),
+        ("Which certifications do you have?", "certifications"),
+    ],
+    "skills_or_tools": [
+        ("Where have you used Spark and Kafka in production?", "experience"),
+        ("Which cloud platforms have you worked with?", "skills_or_tools"),
+        ("Which certifications do you have?", "certifications"),
+        ("What do you work on at Waymore?", "experience"),
+    ],
+    "certifications": [
+        ("How have you applied that knowledge at work?", "experience"),
+        ("Which cloud platforms have you worked with?", "skills_or_tools"),
+        ("What is your educational background?", "general_background"),
+    ],
+    "general_background": [
+        ("What do you work on at Waymore?", "experience"),
+        ("What are your strongest technical skills?", "skills_or_tools"),
+        ("Which certifications do you have?", "certifications"),
+    ],
+    "job_description": [
+        ("Which of these requirements match your experience best?", "experience"),
+        ("What are your strongest technical skills?", "skills_or_tools"),
+        ("Which certifications do you have?", "certifications"),
+    ],
+}
+FOLLOW_UPS["follow_up"] = FOLLOW_UPS["experience"]
+
+# Shared by all sessions; prefetches are speculative and run at BACKGROUND priority
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="follow-up-prefetch")
+
+
+def suggest_follow_ups(intent, asked, n=MAX_SUGGESTIONS):
+    """Up to ``n`` (question, intent) pairs for an answer of ``intent``, skipping questions already asked."""
+    asked = {a.strip().lower() for a in asked}
+    return [(q, i) for q, i in FOLLOW_UPS.get(intent, []) if q.lower() not in asked][:n]
+
+
+class FollowUpPrefetcher:
+    """
+    Per-session speculative work for the suggested follow-ups.
+
+    ``start()`` submits one job per suggestion. ``take()`` hands over the result
+    for the clicked suggestion (waiting briefly if it is still running) and
+    drops the others; ``discard()`` drops everything when the user asks
+    something else. Jobs that already started finish on their own, but their
+    results are never used.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "used": 0, "missed": 0, "discarded": 0}
+
+    def start(self, jobs):
+        """``jobs`` maps question -> zero-argument callable."""
+        self.discard()
+        with self._lock:
+            for question, job in jobs.items():
+                self._futures[question] = _prefetch_executor.submit(job)
+            self.stats["started"] += len(jobs)
+
+    def take(self, question, timeout=PREFETCH_WAIT_SECONDS):
+        with self._lock:
+            future = self._futures.pop(question, None)
+        self.discard()
+        if future is None:
+            return None
+        try:
+            result = future.result(timeout=timeout)
+        except Exception:
+            self.stats["missed"] += 1
+            return None
+        self.stats["used"] += 1
+        return result
+
+    def discard(self):
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self.stats["discarded"] += len(self._futures)
+            self._futures.clear()
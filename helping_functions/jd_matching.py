@@ -0,0 +1,143 @@
+# jd_matching.py
+"""
+Job-description matching for the ``job_description`` intent.
+
+A pasted JD is split into its individual requirements. All of them are
+matched in one batch: against the skills in docs/skills.json by name or
+alias, and against the vector store with a single retrieval (one Cortex
+embedding statement plus a matrix product over the local snapshot, or one
+SQL statement with a per-requirement top-k). The result is a coverage
+summary per requirement that goes into the answer prompt as its context.
+"""
+import re
+
+from helping_functions.retrieval import (
+    DOC_TABLE,
+    batch_query_params,
+    batch_similarity_query,
+    embed_batch,
+)
+
+MAX_REQUIREMENTS = 20
+MIN_REQUIREMENT_CHARS = 12
+CHUNKS_PER_REQUIREMENT = 2
+MAX_CONTEXT_CHUNKS = 8
+# Boosted cosine similarity of the best chunk; check against the JD cases with retrieval_eval --jd
+STRONG_EVIDENCE = 0.55
+SOME_EVIDENCE = 0.40
+
+_BULLET_RE = re.compile(r"^\s*(?:[-*•●▪◦–]|\d{1,2}[.)])\s*")
+_SENTENCE_RE = re.compile(r"(?<=[.;!?])\s+(?=[A-Z])")
+_HEADER_RE = re.compile(r"^[^.!?]{0,60}:$")
+# Sections that describe the company or the offer rather than ask for something
+_SKIPPED_SECTION_RE = re.compile(
+    r"^(about\b|who we are|what we offer|we offer|benefits|perks|why join|compensation|salary)", re.I
+)
+
+
+def split_requirements(jd_text, max_requirements=MAX_REQUIREMENTS):
+    """
+    Individual requirement statements of a JD. Bullet lines when the JD has
+    bullets (outside "about us" / "what we offer" sections), otherwise its
+    sentences; very short fragments and duplicates are dropped.
+    """
+    lines = [line.strip() for line in jd_text.splitlines() if line.strip()]
+    bullets, skipping = [], False
+    for line in lines:
+        if _BULLET_RE.match(line):
+            if not skipping:
+                bullets.append(_BULLET_RE.sub("", line))
+        elif _HEADER_RE.match(line) or _SKIPPED_SECTION_RE.match(line):
+            skipping = bool(_SKIPPED_SECTION_RE.match(line))
+    candidates = bullets if len(bullets) >= 2 else _SENTENCE_RE.split(" ".join(lines))
+
+    requirements, seen = [], set()
+    for text in candidates:
+        text = text.strip().rstrip(";,")
+        if len(text) < MIN_REQUIREMENT_CHARS or _SKIPPED_SECTION_RE.match(text):
+            continue
+        key = text.lower()
+        if key not in seen:
+            seen.add(key)
+            requirements.append(text)
+    return requirements[:max_requirements]
+
+
+def _coverage(skills, score, strong=STRONG_EVIDENCE, some=SOME_EVIDENCE):
+    # A skill listed with 0 years (e.g. Power BI) is not evidence
+    if any(s.get("experience_years") != 0 for s in skills) or score >= strong:
+        return "covered"
+    if score >= some:
+        return "related"
+    return "no evidence"
+
+
+def _evidence_from_snapshot(session, snapshot, requirements, embedding_size, k):
+    vectors = embed_batch(session, requirements, embedding_size)
+    return [
+        [(snapshot.texts[j], float(score)) for j, score in zip(top, scores)]
+        for top, scores in snapshot.search_batch(vectors, embedding_size, "job_description", k)
+    ]
+
+
+def _evidence_from_sql(session, requirements, embedding_size, k, doc_table):
+    rows = session.sql(
+        batch_similarity_query(len(requirements), doc_table, embedding_size, k),
+        params=batch_query_params(requirements, "job_description"),
+    ).collect()
+    evidence = [[] for _ in requirements]
+    for row in rows:
+        evidence[int(row["QUERY_IDX"])].append((row["INPUT_TEXT"], float(row["DIST"])))
+    return evidence
+
+
+def match_job_description(jd_text, session, embedding_size, fact_index, snapshot=None,
+                          k=CHUNKS_PER_REQUIREMENT, doc_table=DOC_TABLE):
+    """
+    Per-requirement coverage for a JD. Returns ``{"requirements": [...], "chunks": [...]}``
+    where each requirement has its matched skills, best evidence score and
+    coverage label, and ``chunks`` are the de-duplicated evidence texts, best first.
+    """
+    requirements = split_requirements(jd_text)
+    if not requirements:
+        return {"requirements": [], "chunks": []}
+
+    if snapshot is not None and snapshot.has(embedding_size):
+        evidence = _evidence_from_snapshot(session, snapshot, requirements, embedding_size, k)
+    else:
+        evidence = _evidence_from_sql(session, requirements, embedding_size, k, doc_table)
+
+    matches, chunk_scores = [], {}
+    for requirement, hits in zip(requirements, evidence):
+        skills = fact_index.find_skills(requirement)
+        score = max((s for _, s in hits), default=0.0)
+        matches.append({
+            "requirement": requirement,
+            "skills": skills,
+            "score": round(score, 3),
+            "coverage": _coverage(skills, score),
+        })
+        for text, s in hits:
+            chunk_scores[text] = max(s, chunk_scores.get(text, s))
+    chunks = sorted(chunk_scores, key=chunk_scores.get, reverse=True)[:MAX_CONTEXT_CHUNKS]
+    return {"requirements": matches, "chunks": chunks}
+
+
+def format_coverage_summary(match):
+    """Coverage table for the answer prompt, followed by the evidence chunks."""
+    lines = ["Job description requirements and how my background covers them:"]
+    for m in match["requirements"]:
+        skills = ", ".join(
+            s["name"] + (
+                f" ({s['experience_years']} year{'s' if s['experience_years'] != 1 else ''})"
+                if s.get("experience_years") else ""
+            )
+            for s in m["skills"]
+        )
+        lines.append(f"- [{m['coverage']}] {m['requirement']}" + (f" | skills: {skills}" if skills else ""))
+    counts = {label: sum(m["coverage"] == label for m in match["requirements"]) for label in ("covered", "related", "no evidence")}
+    lines.append(
+        f"Summary: {counts['covered']} covered, {counts['related']} related, "
+        f"{counts['no evidence']} without evidence, of {len(match['requirements'])} requirements."
+    )
+    return "\n".join(lines) + "\n\n" + "\n\n".join(match["chunks"])
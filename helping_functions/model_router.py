@@ -0,0 +1,137 @@
+# model_router.py
+"""
+Model choice per call type and intent, driven by measured latency.
+
+Each route lists the candidate models in order of preference (the cheapest
+model that is good enough for the job first, fallbacks after it) and the
+latency target they must meet. ``route()`` returns the first candidate that
+is healthy: over the last few minutes its p90 latency is within the target
+and its error rate is acceptable. Samples age out of the window, so a model
+that was skipped gets tried again once its bad samples expire.
+
+Routes can be overridden without a deploy, e.g.
+
+    MODEL_ROUTES='{"answer:casual_greeting": {"models": ["gemma-7b"], "target_ms": 2000}}'
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from helping_functions.token_accounting import CREDITS_PER_MILLION_TOKENS, token_ledger
+
+AUTO_MODEL = "auto"
+WINDOW_SECONDS = 300
+MIN_SAMPLES = 5        # fewer samples than this and the model counts as healthy
+MAX_ERROR_RATE = 0.25
+MAX_SAMPLES = 200      # per model
+
+# (call type, intent) -> candidates and latency target; intent None is the call type's default
+ROUTES = {
+    ("classify", None): {"models": ["mistral-7b", "mixtral-8x7b"], "target_ms": 1500},
+    ("rewrite", None): {"models": ["mistral-7b", "mixtral-8x7b"], "target_ms": 2000},
+    ("summary", None): {"models": ["mistral-7b", "mixtral-8x7b"], "target_ms": 6000},
+    ("answer", None): {"models": ["mistral-large", "mixtral-8x7b"], "target_ms": 8000},
+    ("answer", "casual_greeting"): {"models": ["mistral-7b", "mixtral-8x7b", "mistral-large"], "target_ms": 3000},
+    ("answer", "unknown"): {"models": ["mistral-7b", "mixtral-8x7b", "mistral-large"], "target_ms": 3000},
+}
+
+
+def _parse_routes(value):
+    routes = {}
+    for key, spec in json.loads(value or "{}").items():
+        call_type, _, intent = key.partition(":")
+        routes[(call_type, intent or None)] = spec
+    return routes
+
+
+ROUTES.update(_parse_routes(os.getenv("MODEL_ROUTES")))
+
+
+class ModelHealth:
+    """Rolling per-model latency and error samples, shared by every session of the process."""
+
+    def __init__(self, window_seconds=WINDOW_SECONDS, max_samples=MAX_SAMPLES):
+        self.window_seconds = window_seconds
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self._lock = threading.Lock()
+
+    def record(self, model, latency_ms, ok=True):
+        with self._lock:
+            self._samples[model].append((time.monotonic(), latency_ms, ok))
+
+    def _recent(self, model):
+        cutoff = time.monotonic() - self.window_seconds
+        return [(latency, ok) for ts, latency, ok in self._samples.get(model, ()) if ts >= cutoff]
+
+    def stats(self, model):
+        """calls, p50/p90 latency of successful calls and error rate within the window."""
+        with self._lock:
+            recent = self._recent(model)
+        latencies = [latency for latency, ok in recent if ok]
+        return {
+            "calls": len(recent),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 1) if latencies else None,
+            "p90_ms": round(float(np.percentile(latencies, 90)), 1) if latencies else None,
+            "error_rate": round(1 - len(latencies) / len(recent), 2) if recent else 0.0,
+        }
+
+    def healthy(self, model, target_ms):
+        stats = self.stats(model)
+        if stats["calls"] < MIN_SAMPLES:
+            return True
+        if stats["error_rate"] > MAX_ERROR_RATE:
+            return False
+        return stats["p90_ms"] is None or stats["p90_ms"] <= target_ms
+
+    def metrics(self):
+        with self._lock:
+            models = sorted(self._samples)
+        return [{"model": model, **self.stats(model)} for model in models]
+
+
+# Module-level singleton, fed by scheduled_complete()
+model_health = ModelHealth()
+
+
+def route_for(call_type, intent=None):
+    return ROUTES.get((call_type, intent)) or ROUTES[(call_type, None)]
+
+
+def route(call_type, intent=None, pinned=None, session_id=None):
+    """
+    Model for a call. ``pinned`` is the model picked in the settings tab: it
+    applies to answers only, and only when it isn't "auto". A session over
+    its token budget (see token_accounting) gets the cheapest candidates
+    first, and a pinned model no longer applies.
+    """
+    over_budget = token_ledger.over_budget(session_id)
+    if call_type == "answer" and pinned and pinned != AUTO_MODEL and not over_budget:
+        return pinned
+    spec = route_for(call_type, intent)
+    candidates = spec["models"]
+    if over_budget:
+        candidates = sorted(candidates, key=lambda m: CREDITS_PER_MILLION_TOKENS.get(m, 0.0))
+    for model in candidates:
+        if model_health.healthy(model, spec["target_ms"]):
+            return model
+    # No candidate is healthy: take the one failing least, then the fastest
+    stats = {model: model_health.stats(model) for model in candidates}
+    return min(candidates, key=lambda m: (stats[m]["error_rate"], stats[m]["p90_ms"] or 0.0))
+
+
+def routing_table():
+    """Route, target and the model each route would use right now, for the settings tab."""
+    return [
+        {
+            "call_type": call_type,
+            "intent": intent or "(default)",
+            "candidates": " → ".join(spec["models"]),
+            "target_ms": spec["target_ms"],
+            "current": route(call_type, intent),
+        }
+        for (call_type, intent), spec in sorted(ROUTES.items(), key=lambda item: (item[0][0], item[0][1] or ""))
+    ]
@@ -0,0 +1,101 @@
+# perf_tracker.py
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+MAX_TIMINGS = 200
+
+
+@contextmanager
+def track_rerun(scope: str):
+    """Record how long a (fragment) rerun took, together with the chat history length."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(scope, started)
+
+
+def record_timing(scope: str, started: float):
+    timings = st.session_state.setdefault("rerun_timings", [])
+    timings.append({
+        "scope": scope,
+        "messages": len(st.session_state.get("messages", [])),
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+    del timings[:-MAX_TIMINGS]
+
+
+def rerun_comparison(timings, baseline="app", isolated="chat"):
+    """
+    Median full-page rerun (``baseline``) next to the median fragment rerun
+    (``isolated``) per chat history length, both from the current build.
+    The full-page time includes the fragment, so the difference is the part
+    of the page a chat message no longer reruns; it is not a measurement of
+    the code before the fragment existed. None until both were recorded.
+    """
+    df = pd.DataFrame(timings)
+    df = df[df["scope"].isin([baseline, isolated])]
+    if df.empty or df["scope"].nunique() < 2:
+        return None
+    medians = df.pivot_table(index="messages", columns="scope", values="ms", aggfunc="median")
+    comparison = pd.DataFrame({
+        "messages": medians.index,
+        "full_page_rerun_ms": medians[baseline].round(1).values,
+        "chat_fragment_rerun_ms": medians[isolated].round(1).values,
+    })
+    comparison["outside_fragment_ms"] = (
+        comparison["full_page_rerun_ms"] - comparison["chat_fragment_rerun_ms"]
+    ).round(1)
+    return comparison
+
+
+def render_rerun_timings():
+    """Dev view: rerun time per scope grouped by chat history length, and full page vs chat fragment."""
+    timings = st.session_state.get("rerun_timings", [])
+    if not timings:
+        st.caption("No reruns recorded yet.")
+        return
+    df = pd.DataFrame(timings)
+    summary = (
+        df.groupby(["scope", "messages"])["ms"]
+        .agg(["count", "median", "max"])
+        .reset_index()
+    )
+    st.dataframe(summary, hide_index=True, use_container_width=True)
+
+    comparison = rerun_comparison(timings)
+    if comparison is None:
+        st.caption("The comparison appears once both a full-page rerun and a chat rerun were recorded.")
+        return
+    st.caption(
+        "Full-page vs chat fragment rerun, both measured in this build. A chat message reruns only the "
+        "fragment; outside_fragment_ms is the rest of the page it skips. This is not a baseline from the "
+        "code before the fragment."
+    )
+    st.dataframe(comparison, hide_index=True, use_container_width=True)
+
+
+def record_latency(metric: str, started: float, **labels):
+    """Record the latency of one operation (e.g. answer generation) with free-form labels."""
+    samples = st.session_state.setdefault("latency_samples", [])
+    samples.append({
+        "metric": metric,
+        **labels,
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+    del samples[:-MAX_TIMINGS]
+
+
+def render_latency_summary(metric: str, by):
+    """Dev view: latency of ``metric`` grouped by the given label(s), e.g. for A/B comparisons."""
+    samples = [s for s in st.session_state.get("latency_samples", []) if s["metric"] == metric]
+    if not samples:
+        st.caption("No samples recorded yet.")
+        return
+    df = pd.DataFrame(samples)
+    by = [b for b in ([by] if isinstance(by, str) else by) if b in df.columns]
+    summary = df.groupby(by)["ms"].agg(["count", "median", "max"]).reset_index()
+    st.dataframe(summary, hide_index=True, use_container_width=True)
@@ -0,0 +1,57 @@
+# prompt_templates.py
+import hashlib
+import re
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def _escape_braces(value: str) -> str:
+    return str(value).replace("{", "{{").replace("}", "}}")
+
+
+class RenderedPrompt(str):
+    """
+    A prompt string that remembers how it was built: the template it came
+    from and the variable parts. Behaves exactly like ``str`` everywhere
+    else, so it can be passed straight to ``complete()``; the chat logger
+    uses the extra attributes to store the template once and only the
+    variables per turn. ``RENDER_PROMPT(template_text, params)`` rebuilds it.
+    """
+
+    template: "PromptTemplate"
+    params: dict
+
+    def __new__(cls, text, template, params):
+        obj = super().__new__(cls, text)
+        obj.template = template
+        obj.params = params
+        return obj
+
+
+class PromptTemplate:
+    """
+    ``str.format`` template with some fields bound once at definition time
+    (large static parts such as the skills summary), so they are part of the
+    template text and its hash rather than of every turn's variables.
+    """
+
+    def __init__(self, name, text, **static):
+        self.name = name
+        # Same template source bound with different static values (e.g. one
+        # response format per intent): variants that are all valid at once
+        self.variant = content_hash("\n".join(f"{k}={static[k]}" for k in sorted(static)))[:12]
+        for key, value in static.items():
+            # Substitute {key} but leave escaped {{...}} literals untouched
+            text = re.sub(
+                r"(?<!\{)\{" + re.escape(key) + r"\}(?!\})",
+                lambda _: _escape_braces(value),
+                text,
+            )
+        self.text = text
+        self.hash = content_hash(text)
+
+    def render(self, **params) -> RenderedPrompt:
+        params = {key: "" if value is None else str(value) for key, value in params.items()}
+        return RenderedPrompt(self.text.format(**params), self, params)
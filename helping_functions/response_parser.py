@@ -0,0 +1,146 @@
+# response_parser.py
+import json
+import re
+
+ENVELOPE_FIELDS = ("text", "tts")
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+# Quoted keys only: a bare "text:" in prose is not an envelope field
+_KEY_RE = re.compile(r"""(["'])(text|tts)\1\s*:\s*(["'])""")
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/", "\\": "\\", '"': '"', "'": "'"}
+
+
+class EnvelopeStreamParser:
+    """
+    Incremental, tolerant reader for the {"text": ..., "tts": ...} envelope.
+
+    Feed it chunks as they arrive from the model; ``feed()`` returns the part
+    of the "text" field decoded so far, so it can be shown before the JSON is
+    complete. It never raises on malformed input: code fences, prose around
+    the object, single quotes, raw newlines and unescaped inner quotes are
+    all tolerated.
+    """
+
+    def __init__(self, fields=ENVELOPE_FIELDS):
+        self.fields = fields
+        self.buffer = ""
+        self.values = {}
+        self.closed = set()
+        self._field = None
+        self._quote = '"'
+        self._pos = 0
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk and return the newly decoded characters of the "text" field."""
+        before = len(self.values.get("text", ""))
+        self.buffer += chunk
+        self._advance(final=False)
+        return self.values.get("text", "")[before:]
+
+    def finish(self) -> dict:
+        """Flush the buffer (treating any open string as closed) and return all fields."""
+        self._advance(final=True)
+        return dict(self.values)
+
+    def _advance(self, final):
+        buf = self.buffer
+        while self._pos < len(buf):
+            if self._field is None:
+                match = _KEY_RE.search(buf, self._pos)
+                while match and match.group(2) in self.closed:
+                    match = _KEY_RE.search(buf, match.end())
+                if not match:
+                    # Keep a small margin in case a key is split across chunks
+                    self._pos = max(self._pos, len(buf) - 12)
+                    return
+                self._field = match.group(2)
+                self._quote = match.group(3)
+                self.values[self._field] = ""
+                self._pos = match.end()
+                continue
+
+            c = buf[self._pos]
+            if c == "\\":
+                if self._pos + 1 >= len(buf):
+                    if final:
+                        self._pos += 1
+                    return
+                esc = buf[self._pos + 1]
+                if esc == "u":
+                    hex_digits = buf[self._pos + 2:self._pos + 6]
+                    if len(hex_digits) < 4 and not final:
+                        return  # wait for the rest of the escape
+                    try:
+                        self.values[self._field] += chr(int(hex_digits, 16))
+                    except ValueError:
+                        self.values[self._field] += hex_digits
+                    self._pos += 2 + len(hex_digits)
+                else:
+                    self.values[self._field] += _ESCAPES.get(esc, esc)
+                    self._pos += 2
+            elif c == self._quote:
+                rest = buf[self._pos + 1:].lstrip()
+                if not rest and not final:
+                    return  # can't tell a closing quote from an inner one yet
+                if not rest or rest[0] in ",}":
+                    self.closed.add(self._field)
+                    self._field = None
+                else:
+                    # Unescaped quote inside the value
+                    self.values[self._field] += c
+                self._pos += 1
+            else:
+                self.values[self._field] += c
+                self._pos += 1
+
+
+def _extract_json_block(raw: str) -> str:
+    text = _FENCE_RE.sub("", raw).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        return text[start:end + 1]
+    return text
+
+
+def _normalize(values: dict) -> dict:
+    text = values.get("text", "")
+    if isinstance(text, (list, tuple)):
+        text = " ".join(str(t) for t in text)
+    text = str(text).strip()
+    tts = values.get("tts")
+    tts = str(tts).strip() if tts else text
+    return {"text": text, "tts": tts}
+
+
+def parse_response_envelope(raw) -> dict:
+    """
+    Parse the model's {"text", "tts"} answer without re-generating on
+    formatting mistakes. Tries strict JSON, then JSON with trailing commas
+    removed, then the tolerant field scanner, and finally uses the output
+    as plain text. Raises ValueError only for an empty response.
+    """
+    if not isinstance(raw, str):
+        raw = "".join(raw)
+
+    candidate = _extract_json_block(raw)
+    for attempt in (candidate, _TRAILING_COMMA_RE.sub(r"\1", candidate)):
+        try:
+            parsed = json.loads(attempt, strict=False)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict) and parsed.get("text"):
+            return _normalize(parsed)
+
+    parser = EnvelopeStreamParser()
+    parser.feed(raw)
+    values = parser.finish()
+    if values.get("text", "").strip():
+        return _normalize(values)
+
+    # No envelope at all: the model answered in prose
+    text = _FENCE_RE.sub("", raw).strip()
+    if not text:
+        raise ValueError("Empty response from the model.")
+    return {"text": text, "tts": text}
+
@@ -0,0 +1,214 @@
+# retrieval.py
+import json
+import os
+import re
+
+import numpy as np
+
+from helping_functions.single_flight import flight_key, single_flight
+
+DOC_TABLE = "app.vector_store"
+
+# Embedding configurations selectable in the settings tab
+EMBEDDING_CONFIGS = {
+    "768": {
+        "column": "chunk_embedding",
+        "function": "SNOWFLAKE.CORTEX.EMBED_TEXT_768",
+        "model": "snowflake-arctic-embed-m-v1.5",
+        "dim": 768,
+    },
+    "1024": {
+        "column": "chunk_embedding_1024",
+        "function": "SNOWFLAKE.CORTEX.EMBED_TEXT_1024",
+        "model": "snowflake-arctic-embed-l-v2.0",
+        "dim": 1024,
+    },
+}
+DEFAULT_K = 3
+# Share of the user's own words missing from the rewrite for the raw text to be searched too
+MIN_NEW_TERMS = 0.5
+_TERM_RE = re.compile(r"[a-z0-9+#.]+")
+_STOP_WORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "with", "is", "are", "was",
+    "were", "do", "does", "did", "you", "your", "i", "me", "my", "what", "which", "how", "can",
+    "have", "has", "about", "tell", "any", "it", "that", "this",
+}
+# Similarity multipliers: damp the language fluency chunk, favour chunks whose source matches the intent
+DEFAULT_BOOSTS = {"language_fluency": 0.3, "intent_source": 1.5}
+
+
+def similarity_query(doc_table, embedding_size, k=DEFAULT_K, boosts=DEFAULT_BOOSTS):
+    """
+    SQL for the top-k chunks by boosted cosine similarity (what find_similar_doc() runs).
+
+    The text is the same for every question, so Snowflake can reuse the
+    compiled plan and cached results. The question is embedded inside the
+    statement, so a retrieval stays one round trip; bind
+    ``similarity_params()``: the question text, then the intent.
+    """
+    config = EMBEDDING_CONFIGS[embedding_size]
+    return f"""
+        SELECT input_text,
+               source_desc,
+               VECTOR_COSINE_SIMILARITY({config['column']}, {config['function']}('{config['model']}', ?))
+                * (
+                    CASE WHEN source_desc = 'Language Fluency' THEN {boosts['language_fluency']}
+                        WHEN source = ? THEN {boosts['intent_source']}
+                    ELSE 1 END
+                )  AS dist
+        FROM {doc_table}
+        ORDER BY dist DESC
+        LIMIT {int(k)}
+    """
+
+
+def similarity_params(text, intent):
+    return [text, intent or ""]
+
+
+def batch_similarity_query(n_queries, doc_table, embedding_size, k=DEFAULT_K, boosts=DEFAULT_BOOSTS):
+    """
+    SQL for the top-k chunks of each of ``n_queries`` query texts in one statement.
+
+    Bind ``[0, text_0, 1, text_1, ...]`` followed by the intent; rows come back
+    as (query_idx, input_text, source_desc, dist), best first per query.
+    """
+    config = EMBEDDING_CONFIGS[embedding_size]
+    values = ", ".join(["(?, ?)"] * n_queries)
+    return f"""
+        WITH queries AS (
+            SELECT column1 AS query_idx, {config['function']}('{config['model']}', column2) AS query_embedding
+            FROM VALUES {values}
+        )
+        SELECT q.query_idx,
+               d.input_text,
+               d.source_desc,
+               VECTOR_COSINE_SIMILARITY(d.{config['column']}, q.query_embedding)
+                * (
+                    CASE WHEN d.source_desc = 'Language Fluency' THEN {boosts['language_fluency']}
+                        WHEN d.source = ? THEN {boosts['intent_source']}
+                    ELSE 1 END
+                )  AS dist
+        FROM queries q
+        CROSS JOIN {doc_table} d
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY q.query_idx ORDER BY dist DESC) <= {int(k)}
+        ORDER BY q.query_idx, dist DESC
+    """
+
+
+def batch_query_params(texts, intent):
+    return [v for i, text in enumerate(texts) for v in (i, text)] + [intent or ""]
+
+
+def apply_boosts(similarities, sources, source_descs, intent, boosts=DEFAULT_BOOSTS):
+    multiplier = np.where(
+        source_descs == "Language Fluency",
+        boosts["language_fluency"],
+        np.where(sources == intent, boosts["intent_source"], 1.0),
+    )
+    return similarities * multiplier
+
+
+def top_k(scores, k=DEFAULT_K):
+    top = np.argsort(-scores, kind="stable")[:k]
+    return top, scores[top]
+
+
+def rank_chunks(chunk_vectors, query_vector, sources, source_descs, intent, k=DEFAULT_K, boosts=DEFAULT_BOOSTS):
+    """
+    In-memory equivalent of ``similarity_query()``: indices of the top-k rows.
+
+    ``chunk_vectors`` is an (n, dim) array and ``sources`` / ``source_descs``
+    are arrays of the matching metadata.
+    """
+    chunk_norms = np.linalg.norm(chunk_vectors, axis=1)
+    similarities = chunk_vectors @ query_vector / (chunk_norms * np.linalg.norm(query_vector) + 1e-12)
+    return top_k(apply_boosts(similarities, sources, source_descs, intent, boosts), k)
+
+
+def _terms(text):
+    return {t.strip(".") for t in _TERM_RE.findall(text.lower()) if len(t.strip(".")) > 1} - _STOP_WORDS
+
+
+def differs_materially(raw_text, rewrite, min_new_terms=MIN_NEW_TERMS):
+    """
+    Whether the user's own wording would add anything to a search for the
+    rewrite: at least ``min_new_terms`` of its content words are missing
+    from the rewrite. Rewrites usually restate the question, so most don't.
+    """
+    raw_terms = _terms(raw_text)
+    if not raw_terms:
+        return False
+    return len(raw_terms - _terms(rewrite)) / len(raw_terms) >= min_new_terms
+
+
+def merge_hits(hits, limit):
+    """
+    Merge per-query ``(text, score)`` hits: each chunk once, at its best score,
+    best first, at most ``limit`` chunks.
+    """
+    best = {}
+    for text, score in hits:
+        if text not in best or score > best[text]:
+            best[text] = score
+    return sorted(best, key=best.get, reverse=True)[:limit]
+
+
+def embed_query(session, text, embedding_size):
+    """Query embedding from Cortex as a float32 vector."""
+    config = EMBEDDING_CONFIGS[embedding_size]
+
+    def call():
+        row = session.sql(
+            f"SELECT {config['function']}('{config['model']}', ?)::ARRAY AS emb", params=[text]
+        ).collect()[0]
+        return np.array(json.loads(row["EMB"]), dtype=np.float32)
+
+    return single_flight.do(flight_key("embed", config["model"], text), call)
+
+
+def embed_batch(session, texts, embedding_size):
+    """Embeddings of ``texts`` from Cortex in one statement, as a (len(texts), dim) float32 array."""
+    config = EMBEDDING_CONFIGS[embedding_size]
+    values = ", ".join(["(?, ?)"] * len(texts))
+    rows = session.sql(
+        f"SELECT column1 AS idx, {config['function']}('{config['model']}', column2)::ARRAY AS emb "
+        f"FROM VALUES {values} ORDER BY idx",
+        params=[v for i, text in enumerate(texts) for v in (i, text)],
+    ).collect()
+    return np.array([json.loads(row["EMB"]) for row in rows], dtype=np.float32)
+
+
+def fetch_vector_store(session, doc_table=DOC_TABLE):
+    """All chunks with their metadata and both embedding columns as float32 arrays."""
+    columns = ", ".join(f"{c['column']}::ARRAY AS emb_{size}" for size, c in EMBEDDING_CONFIGS.items())
+    df = session.sql(f"SELECT input_text, source_desc, source, {columns} FROM {doc_table}").to_pandas()
+    store = {
+        "texts": df["INPUT_TEXT"].to_numpy(dtype=object),
+        "sources": df["SOURCE"].to_numpy(dtype=object),
+        "source_descs": df["SOURCE_DESC"].to_numpy(dtype=object),
+        "vectors": {},
+    }
+    for size in EMBEDDING_CONFIGS:
+        store["vectors"][size] = np.array(
+            [json.loads(v) if isinstance(v, str) else v for v in df[f"EMB_{size}"]], dtype=np.float32
+        )
+    return store
+
+
+def create_cli_session():
+    """Snowpark session from chatbot_secrets.env, for the command-line tools."""
+    from dotenv import load_dotenv
+    from snowflake.snowpark import Session
+
+    load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'chatbot_secrets.env'))
+    connection_parameters = {
+        "account": os.getenv("ACCOUNT"),
+        "user": os.getenv("USER"),
+        "password": os.getenv("PASSWORD"),
+        "role": os.getenv("ROLE"),
+        "warehouse": os.getenv("WAREHOUSE"),
+        "database": os.getenv("DATABASE"),
+        "schema": os.getenv("SCHEMA"),
+    }
+    return Session.builder.configs(connection_parameters).create()
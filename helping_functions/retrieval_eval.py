@@ -0,0 +1,291 @@
+# retrieval_eval.py
+"""
+Offline retrieval evaluation for the 768 vs 1024 embedding settings.
+
+Each golden question (docs/retrieval_golden_set.json) is embedded once per
+embedding configuration. It is then ranked against the whole vector store
+in memory with ``rank_chunks()``, the same boosted cosine ranking that
+find_similar_doc() runs in SQL. This is repeated for every boost setting
+and k. The report has, per configuration:
+
+- recall@k, hit@k and MRR@k
+- live latency of the real retrieval query (p50 / p95, embedding included)
+- memory footprint of the chunk embeddings as float32
+
+Questions are used as written, not rewritten by create_rag_search_query(),
+so the numbers compare the embeddings and not the rewrite prompt. Run with
+the Snowflake settings from chatbot_secrets.env available:
+
+    python -m helping_functions.retrieval_eval [--skip-live] [--out report.csv]
+
+``--jd`` evaluates the job-description cases of the golden set instead,
+old path against new path, per embedding configuration:
+
+- old: the whole JD as one query, top DEFAULT_K chunks (what get_context()
+  did for a pasted JD before jd_matching)
+- new: match_job_description(): one query per split requirement, top
+  CHUNKS_PER_REQUIREMENT each, merged to MAX_CONTEXT_CHUNKS
+
+and reports evidence recall (annotated requirements with a relevant chunk
+in the context), plus, for the new path, how often the "covered" label
+agrees with the annotation at the current STRONG_EVIDENCE threshold and
+at the best threshold found on the cases.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from helping_functions.fact_index import FactIndex
+from helping_functions.jd_matching import (
+    CHUNKS_PER_REQUIREMENT,
+    MAX_CONTEXT_CHUNKS,
+    SOME_EVIDENCE,
+    STRONG_EVIDENCE,
+    _coverage,
+    split_requirements,
+)
+from helping_functions.retrieval import (
+    DOC_TABLE,
+    DEFAULT_BOOSTS,
+    DEFAULT_K,
+    EMBEDDING_CONFIGS,
+    create_cli_session,
+    fetch_vector_store,
+    merge_hits,
+    rank_chunks,
+    similarity_params,
+    similarity_query,
+)
+
+GOLDEN_SET_PATH = "docs/retrieval_golden_set.json"
+EVAL_DIR = "static/eval"
+K_VALUES = (1, 3, 5)
+STRONG_THRESHOLDS = np.round(np.arange(0.40, 0.76, 0.05), 2)
+BOOST_SETTINGS = {
+    "none": {"language_fluency": 1.0, "intent_source": 1.0},
+    "current": DEFAULT_BOOSTS,
+    "strong": {"language_fluency": 0.3, "intent_source": 2.0},
+}
+
+
+def load_golden_set(path=GOLDEN_SET_PATH):
+    with open(path, "r") as f:
+        return json.load(f)["questions"]
+
+
+def load_jd_cases(path=GOLDEN_SET_PATH):
+    with open(path, "r") as f:
+        return json.load(f).get("job_descriptions", [])
+
+
+def load_fact_index():
+    with open("docs/skills.json", "r") as f:
+        skills_data = json.load(f)
+    with open("docs/timeline.json", "r") as f:
+        timeline_data = json.load(f)
+    return FactIndex(skills_data, timeline_data)
+
+
+def is_relevant(item, text, source):
+    if item.get("source") and item["source"] != source:
+        return False
+    text = (text or "").lower()
+    return any(term.lower() in text for term in item["relevant_if_contains"])
+
+
+def embed_questions(session, questions, size):
+    """Embed all questions in one query; returns an (n, dim) float32 array."""
+    config = EMBEDDING_CONFIGS[size]
+    values = ", ".join(["(?, ?)"] * len(questions))
+    rows = session.sql(
+        f"""
+        SELECT column1 AS idx, {config['function']}('{config['model']}', column2)::ARRAY AS emb
+        FROM VALUES {values}
+        ORDER BY idx
+        """,
+        params=[v for i, q in enumerate(questions) for v in (i, q)],
+    ).collect()
+    return np.array([json.loads(row["EMB"]) for row in rows], dtype=np.float32)
+
+
+def measure_live_latency(session, golden, size, doc_table=DOC_TABLE):
+    """Wall time in ms of the real retrieval query per question (embedding + ranking in Snowflake)."""
+    timings = []
+    for item in golden:
+        started = time.perf_counter()
+        session.sql(
+            similarity_query(doc_table, size), params=similarity_params(item["question"], item["intent"])
+        ).collect()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def score_rankings(ranked, relevant, k):
+    """Mean recall@k, hit@k and MRR@k over questions that have at least one relevant chunk."""
+    recalls, hits, reciprocal_ranks = [], [], []
+    for top, rel in zip(ranked, relevant):
+        if not rel:
+            continue
+        top = list(top[:k])
+        found = [i for i in top if i in rel]
+        recalls.append(len(found) / min(len(rel), k))
+        hits.append(1.0 if found else 0.0)
+        reciprocal_ranks.append(1.0 / (top.index(found[0]) + 1) if found else 0.0)
+    return float(np.mean(recalls)), float(np.mean(hits)), float(np.mean(reciprocal_ranks))
+
+
+def evaluate(store, golden, query_vectors, latencies=None):
+    relevant = [
+        {i for i, (text, source) in enumerate(zip(store["texts"], store["sources"])) if is_relevant(item, text, source)}
+        for item in golden
+    ]
+    judged = sum(1 for rel in relevant if rel)
+    rows = []
+    for size, vectors in query_vectors.items():
+        chunk_vectors = store["vectors"][size]
+        timings = (latencies or {}).get(size)
+        for boost_name, boosts in BOOST_SETTINGS.items():
+            ranked = [
+                rank_chunks(chunk_vectors, qv, store["sources"], store["source_descs"], item["intent"],
+                            k=max(K_VALUES), boosts=boosts)[0]
+                for item, qv in zip(golden, vectors)
+            ]
+            for k in K_VALUES:
+                recall, hit, mrr = score_rankings(ranked, relevant, k)
+                rows.append({
+                    "embedding": size,
+                    "boost": boost_name,
+                    "k": k,
+                    "recall@k": round(recall, 3),
+                    "hit@k": round(hit, 3),
+                    "mrr@k": round(mrr, 3),
+                    "p50_ms": round(float(np.percentile(timings, 50)), 1) if timings else None,
+                    "p95_ms": round(float(np.percentile(timings, 95)), 1) if timings else None,
+                    "store_kb": round(chunk_vectors.nbytes / 1024, 1),
+                    "bytes_per_chunk": chunk_vectors.shape[1] * chunk_vectors.itemsize,
+                    "questions": judged,
+                })
+    return pd.DataFrame(rows)
+
+
+def _annotated(case, requirements):
+    """(split requirement, annotation) pairs for the annotated requirements of a JD case."""
+    pairs = []
+    for note in case["requirements"]:
+        found = next((r for r in requirements if note["requirement_contains"].lower() in r.lower()), None)
+        if found is not None:
+            pairs.append((found, note))
+    return pairs
+
+
+def _evidence_found(note, texts):
+    """Whether ``texts`` hold a relevant chunk for an annotated requirement; None when nothing is relevant."""
+    if not note["relevant_if_contains"]:
+        return None
+    return any(is_relevant(note, text, None) for text in texts)
+
+
+def evaluate_jd(store, cases, jd_vectors, requirement_vectors, fact_index):
+    """
+    Old vs new job-description path per embedding configuration.
+
+    ``jd_vectors[size]`` has one row per case (the whole JD);
+    ``requirement_vectors[size][i]`` one row per split requirement of case i.
+    """
+    rows = []
+    for size in jd_vectors:
+        chunk_vectors = store["vectors"][size]
+
+        def rank(vector, k):
+            top, scores = rank_chunks(chunk_vectors, vector, store["sources"], store["source_descs"],
+                                      "job_description", k=k)
+            return [(store["texts"][i], float(score)) for i, score in zip(top, scores)]
+
+        old_found, new_found, judged = [], [], []
+        for case, jd_vector, req_vectors in zip(cases, jd_vectors[size], requirement_vectors[size]):
+            requirements = split_requirements(case["text"])
+            old_context = [text for text, _ in rank(jd_vector, DEFAULT_K)]
+            hits = {r: rank(v, CHUNKS_PER_REQUIREMENT) for r, v in zip(requirements, req_vectors)}
+            new_context = merge_hits([h for r in requirements for h in hits[r]], MAX_CONTEXT_CHUNKS)
+            for requirement, note in _annotated(case, requirements):
+                old = _evidence_found(note, old_context)
+                if old is not None:
+                    old_found.append(old)
+                    new_found.append(_evidence_found(note, new_context))
+                score = max((s for _, s in hits[requirement]), default=0.0)
+                judged.append((fact_index.find_skills(requirement), score, note["covered"]))
+
+        def label_accuracy(strong):
+            return float(np.mean([
+                (_coverage(skills, score, strong, min(SOME_EVIDENCE, strong)) == "covered") == covered
+                for skills, score, covered in judged
+            ]))
+
+        accuracy = {strong: label_accuracy(strong) for strong in STRONG_THRESHOLDS}
+        best_strong = max(accuracy, key=lambda t: (accuracy[t], -abs(t - STRONG_EVIDENCE)))
+        for path, found, chunks in (("old", old_found, DEFAULT_K), ("new", new_found, MAX_CONTEXT_CHUNKS)):
+            rows.append({
+                "embedding": size,
+                "path": path,
+                "evidence_recall": round(float(np.mean(found)), 3) if found else None,
+                "max_chunks": chunks,
+                "label_accuracy": round(label_accuracy(STRONG_EVIDENCE), 3) if path == "new" else None,
+                "best_strong": float(best_strong) if path == "new" else None,
+                "best_label_accuracy": round(accuracy[best_strong], 3) if path == "new" else None,
+                "requirements": len(judged),
+            })
+    return pd.DataFrame(rows)
+
+
+def recommend(report):
+    """Best embedding at the app's k with the current boosts: recall, then MRR, then latency."""
+    current = report[(report["boost"] == "current") & (report["k"] == DEFAULT_K)].copy()
+    current["p50_sort"] = current["p50_ms"].fillna(float("inf"))
+    best = current.sort_values(["recall@k", "mrr@k", "p50_sort"], ascending=[False, False, True]).iloc[0]
+    return best["embedding"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden", default=GOLDEN_SET_PATH)
+    parser.add_argument("--skip-live", action="store_true", help="Don't time the live retrieval queries.")
+    parser.add_argument("--jd", action="store_true", help="Evaluate the job-description cases, old vs new path.")
+    parser.add_argument("--out", default=os.path.join(EVAL_DIR, f"retrieval_eval_{time.strftime('%Y%m%d_%H%M%S')}.csv"))
+    args = parser.parse_args()
+
+    session = create_cli_session()
+    store = fetch_vector_store(session)
+    pd.set_option("display.width", 200)
+
+    if args.jd:
+        cases = load_jd_cases(args.golden)
+        requirements = [split_requirements(case["text"]) for case in cases]
+        bounds = np.cumsum([0] + [len(reqs) for reqs in requirements])
+        jd_vectors, requirement_vectors = {}, {}
+        for size in EMBEDDING_CONFIGS:
+            jd_vectors[size] = embed_questions(session, [case["text"] for case in cases], size)
+            flat = embed_questions(session, [r for reqs in requirements for r in reqs], size)
+            requirement_vectors[size] = [flat[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        report = evaluate_jd(store, cases, jd_vectors, requirement_vectors, load_fact_index())
+        print(f"{len(cases)} job descriptions, {report['requirements'].iloc[0]} annotated requirements\n")
+        print(report.drop(columns=["requirements"]).to_string(index=False))
+        print(f"\nCurrent thresholds: STRONG_EVIDENCE={STRONG_EVIDENCE}, SOME_EVIDENCE={SOME_EVIDENCE}")
+        out = args.out.replace("retrieval_eval_", "retrieval_eval_jd_")
+    else:
+        golden = load_golden_set(args.golden)
+        query_vectors = {size: embed_questions(session, [g["question"] for g in golden], size) for size in EMBEDDING_CONFIGS}
+        latencies = None if args.skip_live else {size: measure_live_latency(session, golden, size) for size in EMBEDDING_CONFIGS}
+
+        report = evaluate(store, golden, query_vectors, latencies)
+        print(f"{len(store['texts'])} chunks, {report['questions'].iloc[0]}/{len(golden)} golden questions with a relevant chunk\n")
+        print(report.drop(columns=["questions"]).to_string(index=False))
+        print(f"\nRecommended default embedding_size (boost=current, k={DEFAULT_K}): {recommend(report)}")
+        out = args.out
+
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    report.to_csv(out, index=False)
+    print(f"Report written to {out}")
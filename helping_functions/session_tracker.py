@@ -4,14 +4,79 @@ import uuid
 import streamlit as st
 import streamlit.components.v1 as components
 import time
+import json
+import threading
+
+from helping_functions.prompt_templates import RenderedPrompt, content_hash
 
 TABLE_NAME = "CHAT_LOGS"
+# Lookup tables for the large, repeated parts of a turn (see migrations/001_chat_logs_prompt_dedup.sql)
+PROMPT_TEMPLATES_TABLE = "CHAT_PROMPT_TEMPLATES"
+CONTEXT_CHUNKS_TABLE = "CHAT_CONTEXT_CHUNKS"
+CONTEXT_CHUNK_SEPARATOR = "\n\n"  # find_similar_doc() joins the retrieved chunks with this
+
+# Hashes already written by this process, so known templates / chunks skip the MERGE
+_stored_hashes = set()
+_stored_hashes_lock = threading.Lock()
+
+
 def reset_chat():
-    keys_to_clear = ["messages", "chatbot_error", "error_shown", "ready_prompt", "session_id", "other_state_vars"]
+    keys_to_clear = ["messages", "chatbot_error", "error_shown", "ready_prompt", "session_id", "chat_memory", "suggestions", "other_state_vars"]
     for key in keys_to_clear:
         if key in st.session_state:
             del st.session_state[key]
 
+def _store_once(session: Session, table: str, hash_column: str, text_column: str, items: dict):
+    """MERGE ``{hash: text}`` into a lookup table, skipping hashes this process already stored."""
+    with _stored_hashes_lock:
+        new_items = {h: t for h, t in items.items() if (table, h) not in _stored_hashes}
+    if not new_items:
+        return
+    values = ", ".join(["(?, ?)"] * len(new_items))
+    session.sql(
+        f"""
+        MERGE INTO {table} t
+        USING (SELECT column1 AS {hash_column}, column2 AS {text_column} FROM VALUES {values}) s
+        ON t.{hash_column} = s.{hash_column}
+        WHEN NOT MATCHED THEN INSERT ({hash_column}, {text_column}) VALUES (s.{hash_column}, s.{text_column})
+        """,
+        params=[v for item in new_items.items() for v in item],
+    ).collect()
+    with _stored_hashes_lock:
+        _stored_hashes.update((table, h) for h in new_items)
+
+
+def compress_turn(context_snippet: str = None, prompt: str = None):
+    """
+    Split a turn's context and prompt into content-addressed parts.
+
+    Returns ``(chunks, templates, chunk_hashes, template_hash, prompt_params)``:
+    the retrieved chunks and the prompt template keyed by hash (stored once in
+    the lookup tables), plus what the turn row itself keeps. The ``context``
+    prompt variable is dropped when it equals the turn's context, since the
+    reconstruction view rebuilds it from the chunks.
+    """
+    chunks, templates = {}, {}
+    chunk_hashes = template_hash = prompt_params = None
+    if context_snippet:
+        parts = context_snippet.split(CONTEXT_CHUNK_SEPARATOR)
+        chunk_hashes = [content_hash(part) for part in parts]
+        chunks = dict(zip(chunk_hashes, parts))
+    if prompt:
+        if isinstance(prompt, RenderedPrompt):
+            template_text = prompt.template.text
+            prompt_params = dict(prompt.params)
+            if context_snippet and prompt_params.get("context") == context_snippet:
+                del prompt_params["context"]
+        else:
+            # Free-form prompt: store it as a template without variables
+            template_text = prompt.replace("{", "{{").replace("}", "}}")
+            prompt_params = {}
+        template_hash = content_hash(template_text)
+        templates[template_hash] = template_text
+    return chunks, templates, chunk_hashes, template_hash, prompt_params
+
+
 def log_message_to_snowflake(
     session: Session,
     session_id: str,
@@ -24,35 +89,35 @@ def log_message_to_snowflake(
     embedding_size: str = None,
     context_snippet: str = None,
     prompt: str = None,
+    token_usage: dict = None,
     message_type: str = None
 ):
     timestamp = datetime.utcnow().isoformat()
-    
-    # Escape strings
-    escape = lambda s: s.replace("'", "''") if s else None
-    session_id = escape(session_id)
-    role = escape(role)
-    message = escape(message)[:5000] if message else None
-    prompt = escape(prompt)[:64000] if prompt else None
-    context_snippet = escape(context_snippet)[:64000] if context_snippet else None
-    user_id = escape(user_id)
-
-    session.sql(f"""
+    turn_id = str(uuid.uuid4())
+
+    # Templates and chunks are stored once; the turn keeps their hashes plus the prompt variables
+    chunks, templates, chunk_hashes, template_hash, prompt_params = compress_turn(context_snippet, prompt)
+    _store_once(session, CONTEXT_CHUNKS_TABLE, "chunk_hash", "chunk_text", chunks)
+    _store_once(session, PROMPT_TEMPLATES_TABLE, "template_hash", "template_text", templates)
+
+    # Constant statement text with bound values: no hand escaping, and Snowflake reuses the compiled plan
+    to_json = lambda v: None if v is None else json.dumps(v)
+    session.sql(
+        f"""
         INSERT INTO {TABLE_NAME} (
-            session_id, user_id, timestamp, role, message,
+            turn_id, session_id, user_id, timestamp, role, message,
             intent, model_used, embedding_size,
-            context_snippet, prompt, message_type
-        )
-        VALUES (
-            '{session_id}', {'NULL' if not user_id else f"'{user_id}'"}, '{timestamp}', '{role}', {f"'{message}'" if message else 'NULL'},
-            {'NULL' if not intent else f"'{escape(intent)}'"},
-            {'NULL' if not model_used else f"'{escape(model_used)}'"},
-            {'NULL' if not embedding_size else f"'{escape(embedding_size)}'"},
-            {'NULL' if not context_snippet else f"'{context_snippet}'"},
-            {'NULL' if not prompt else f"'{prompt}'"},
-            {'NULL' if not message_type else f"'{escape(message_type)}'"}
+            context_chunk_hashes, prompt_template_hash, prompt_params, token_usage, message_type
         )
-    """).collect()
+        SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, PARSE_JSON(?), ?, PARSE_JSON(?), PARSE_JSON(?), ?
+        """,
+        params=[
+            turn_id, session_id, user_id or None, timestamp, role, message[:5000] if message else None,
+            intent or None, model_used or None, embedding_size or None,
+            to_json(chunk_hashes), template_hash or None, to_json(prompt_params), to_json(token_usage),
+            message_type or None,
+        ],
+    ).collect()
 
 
 
@@ -98,14 +163,37 @@ def ensure_user_id():
         </script>
     """, height=0)
 
-def handle_error(e: Exception, user_friendly_message: str = "An unexpected error occurred."):
+def handle_error(
+    e: Exception,
+    user_friendly_message: str = "An unexpected error occurred.",
+    *,
+    session: Session = None,
+    intent: str = None
+):
     """
     General-purpose error handler.
     
     Args:
         e (Exception): The exception to handle.
         user_friendly_message (str): Optional message to show users.
+        session (Session): Snowpark session; when given, an "error" row is logged to CHAT_LOGS.
+        intent (str): Intent of the failed turn, for the logged row.
     """
+    session_id = st.session_state.get("session_id")
+    if session is not None and session_id:
+        # Logged so the analytics rollups can report an error rate
+        try:
+            log_message_to_snowflake(
+                session=session,
+                session_id=session_id,
+                role="assistant",
+                message=f"{type(e).__name__}: {e}",
+                intent=intent,
+                message_type="error"
+            )
+        except Exception:
+            pass  # never hide the original error behind a logging failure
+
     reset_chat()
     # Optionally display a user-facing error
     st.error(f"❌ {user_friendly_message}")
@@ -117,9 +205,6 @@ def handle_error(e: Exception, user_friendly_message: str = "An unexpected error
     # Optional: Set maintenance flag in session state (or even secrets if needed)
     st.session_state["chatbot_error"] = True
 
-    # Optional: You can trigger logging to Snowflake or another service here
-    # log_exception_to_snowflake(e)  # example placeholder
-
     ##### st.rerun() WILL REMOVE THE ERRORS FROM SCREEN.
     st.rerun()
     # time.sleep(1000000)
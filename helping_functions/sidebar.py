@@ -1,32 +1,27 @@
 import streamlit as st
 import os
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from helping_functions.feedback_outbox import create_feedback_outbox
+from helping_functions.perf_tracker import render_rerun_timings, render_latency_summary
+from helping_functions.cortex_scheduler import scheduler as cortex_scheduler
+from helping_functions.completion_backends import backend_routes
+from helping_functions.single_flight import single_flight
+from helping_functions.model_router import AUTO_MODEL, model_health, routing_table
+from helping_functions.token_accounting import token_ledger
+from helping_functions.completion_cache import completion_cache
+from helping_functions.asset_pipeline import icon_src
+
+@st.cache_resource(show_spinner=False)
+def get_feedback_outbox():
+    # One outbox (and one background sender) per process
+    return create_feedback_outbox()
 
-def send_feedback_email(feedback_text, user_email=None):
-    # from_email = st.secrets["sendgrid"]["sender_email"]
-    # api_key = st.secrets["sendgrid"]["api_key"]
-    from_email = os.getenv("SENDGRID_SENDER_EMAIL")
-    api_key = os.getenv("SENDGRID_API_KEY")
-
-    
-
-    formatted_feedback = feedback_text.replace("\n", "<br>")
-    html_content = f'<p>{formatted_feedback}</p><p>From: {user_email or "Anonymous"}</p>'
 
-    message = Mail(
-        from_email=from_email,
-        to_emails=from_email,
-        subject='New Chatbot Feedback',
-        html_content=html_content
-    )
+def send_feedback_email(feedback_text, user_email=None):
+    """Queue feedback in the durable outbox; the email is sent in the background."""
     try:
-        sg = SendGridAPIClient(api_key)
-        response = sg.send(message)
-        print("SendGrid response code:", response.status_code)
-        return True
+        return get_feedback_outbox().enqueue(feedback_text, user_email)
     except Exception as e:
-        print("Error sending feedback email:", e)
+        print("Error queueing feedback email:", e)
         return False
 
 
@@ -53,27 +48,7 @@ def render_sidebar(
 
     # --- FEEDBACK FORM ---
     with st.sidebar:
-        st.markdown("---")  # horizontal separator
-        st.markdown('<div style="margin-top:30px;"></div>', unsafe_allow_html=True)
-        st.markdown("**I’d love to hear your thoughts! 💬**")
-
-
-        comments = st.text_area("Your feedback", placeholder="Share your thoughts or suggestions here...")
-        email = st.text_input("Your name (optional)")
-
-        if st.button("Submit Feedback"):
-            if not comments.strip():
-                st.warning("Please enter your feedback before submitting.")
-            else:
-                user_email = email.strip() or None
-                feedback_text = f"Comments: {comments}"
-                success = send_feedback_email(feedback_text, user_email)
-                if success:
-                    st.success("Thanks for your feedback! 🙌")
-                    st.session_state.comments = ""
-                    st.session_state.email = ""
-                else:
-                    st.error("Oops! Something went wrong sending your feedback. Please try again later.")
+        _render_feedback_form()
 
     # --- FOOTER ---
     st.sidebar.markdown("---")
@@ -83,6 +58,32 @@ def render_sidebar(
     )
 
 
+@st.fragment
+def _render_feedback_form():
+    # Fragment: typing feedback or submitting it only reruns the form
+    st.markdown("---")  # horizontal separator
+    st.markdown('<div style="margin-top:30px;"></div>', unsafe_allow_html=True)
+    st.markdown("**I’d love to hear your thoughts! 💬**")
+
+
+    comments = st.text_area("Your feedback", placeholder="Share your thoughts or suggestions here...")
+    email = st.text_input("Your name (optional)")
+
+    if st.button("Submit Feedback"):
+        if not comments.strip():
+            st.warning("Please enter your feedback before submitting.")
+        else:
+            user_email = email.strip() or None
+            feedback_text = f"Comments: {comments}"
+            success = send_feedback_email(feedback_text, user_email)
+            if success:
+                st.success("Thanks for your feedback! 🙌")
+                st.session_state.comments = ""
+                st.session_state.email = ""
+            else:
+                st.error("Oops! Something went wrong sending your feedback. Please try again later.")
+
+
 def _render_contact():
 
     maps_url = "https://www.google.com/maps/place/Melissia,+Athens,+Greece"
@@ -96,22 +97,22 @@ def _render_contact():
     contact_links = [
         {
             "label": "+30 693 341 9882",
-            "icon": "https://cdn-icons-png.flaticon.com/512/724/724664.png",
+            "icon": icon_src("phone"),
             "url": "tel:+306933419882",
         },
         {
             "label": "alexandroschio@gmail.com",
-            "icon": "https://cdn-icons-png.flaticon.com/512/732/732200.png",
+            "icon": icon_src("email"),
             "url": "mailto:alexandroschio@gmail.com",
         },
         {
             "label": "alexandros-chionidis-51579421b",
-            "icon": "https://cdn-icons-png.flaticon.com/512/174/174857.png",
+            "icon": icon_src("linkedin"),
             "url": "https://www.linkedin.com/in/alexandros-chionidis-51579421b/",
         },
         {
             "label": "alexchio888",
-            "icon": "https://cdn-icons-png.flaticon.com/512/733/733553.png",
+            "icon": icon_src("github"),
             "url": "https://github.com/alexchio888",
         },
     ]
@@ -126,10 +127,10 @@ def _render_contact():
             unsafe_allow_html=True,
         )
     # Download CV link
-    cv_html = """
+    cv_html = f"""
     <a href="https://github.com/alexchio888/alex-cv-chatbot/raw/main/docs/Alexandros_Chionidis_CV.pdf" target="_blank" 
        style="text-decoration:none; display: flex; align-items: center; color: #3399FF;">
-        <img src="https://cdn-icons-png.flaticon.com/512/337/337946.png" width="20" style="margin-right:8px;" /> Download CV
+        <img src="{icon_src("cv")}" width="20" style="margin-right:8px;" /> Download CV
     </a>"""
     st.sidebar.markdown(cv_html, unsafe_allow_html=True)
 
@@ -186,9 +187,14 @@ def _render_prompts(st_session_state):
                     st.session_state.ready_prompt = prompt 
 
 
+@st.fragment
 def _render_download(st_session_state, generate_chat_text, generate_chat_json, generate_chat_markdown):
     st.markdown("### Select download format")
     if "messages" in st_session_state and st_session_state.messages:
+        # New answers only rerun the chat fragment, so the export is built on request
+        if not st.button("📦 Prepare chat export"):
+            st.caption("Bundles the conversation as it is right now.")
+            return
         chat_txt = generate_chat_text()
         chat_json = generate_chat_json()
         chat_md = generate_chat_markdown()
@@ -198,23 +204,27 @@ def _render_download(st_session_state, generate_chat_text, generate_chat_json, g
             data=chat_txt,
             file_name="alexandros_clone_chat.txt",
             mime="text/plain",
+            on_click="ignore",
         )
         st.download_button(
             label="🧾 Download as JSON",
             data=chat_json,
             file_name="alexandros_clone_chat.json",
             mime="application/json",
+            on_click="ignore",
         )
         st.download_button(
             label="📝 Download as Markdown",
             data=chat_md,
             file_name="alexandros_clone_chat.md",
             mime="text/markdown",
+            on_click="ignore",
         )
     else:
         st.info("No chat history to download yet.")
 
 
+@st.fragment
 def _render_settings(st_session_state):
     st.markdown("### ⚙️ Chat Settings")
     st.markdown("_For experimentation and dev purposes_")
@@ -222,6 +232,7 @@ def _render_settings(st_session_state):
     st.session_state.model = st.selectbox(
         "Change chatbot model:",
         [
+            AUTO_MODEL,
             "mistral-large",
             "reka-flash",
             "llama2-70b-chat",
@@ -229,7 +240,9 @@ def _render_settings(st_session_state):
             "mixtral-8x7b",
             "mistral-7b",
         ],
-        index=["mistral-large", "reka-flash", "llama2-70b-chat", "gemma-7b", "mixtral-8x7b", "mistral-7b"].index(st.session_state.get("model", "mistral-large")),
+        index=[AUTO_MODEL, "mistral-large", "reka-flash", "llama2-70b-chat", "gemma-7b", "mixtral-8x7b", "mistral-7b"].index(st.session_state.get("model", AUTO_MODEL)),
+        format_func=lambda x: "Auto (routed by intent and latency)" if x == AUTO_MODEL else x,
+        help="A specific model pins the answers to it; classification, query rewriting and summaries are always routed.",
     )
 
     st.session_state.embedding_size = st.selectbox(
@@ -239,6 +252,21 @@ def _render_settings(st_session_state):
         format_func=lambda x: f"{x}-dim embedding",
     )
 
+    st.session_state.tts_source = st.selectbox(
+        "Spoken version of answers:",
+        ["local", "model"],
+        index=["local", "model"].index(st.session_state.get("tts_source", "local")),
+        format_func=lambda x: "Derived locally from the text" if x == "local" else "Generated by the model",
+        help="Model-generated speech doubles the output tokens; use this to A/B the generation latency.",
+    )
+
+    st.session_state.audio_encoding = st.selectbox(
+        "Speech audio format:",
+        ["MP3", "OGG_OPUS"],
+        index=["MP3", "OGG_OPUS"].index(st.session_state.get("audio_encoding", "MP3")),
+        format_func=lambda x: "MP3" if x == "MP3" else "Ogg Opus (smaller, not for older Safari)",
+    )
+
     st.divider()
 
     st.markdown("### ⚙️ Chat Context Settings")
@@ -258,4 +286,79 @@ def _render_settings(st_session_state):
         help="How many previous messages to include in the prompt context."
     )
 
+    st.session_state.prefetch_answers = st.checkbox(
+        "Prefetch answers to suggested follow-ups",
+        value=st.session_state.get("prefetch_answers", False),
+        help="Retrieval context is always prefetched; this also generates the answers in the background (costs tokens even if unused)."
+    )
+    prefetcher = st.session_state.get("follow_up_prefetcher")
+    if prefetcher is not None:
+        st.caption("Follow-up prefetch • started: {started} • used: {used} • missed: {missed} • discarded: {discarded}".format(**prefetcher.stats))
+
+    st.divider()
 
+    st.markdown("### 📈 Rerun Timings")
+    st.caption("Rerun time per scope (app / chat fragment) by chat history length.")
+    if st.button("Refresh timings"):
+        pass  # clicking reruns this fragment with the latest numbers
+    render_rerun_timings()
+
+    st.markdown("### ⏱️ Generation Latency")
+    st.caption("Answer generation time by spoken-version source (local vs model).")
+    render_latency_summary("generation", ["tts_source", "intent"])
+
+    st.markdown("### 🗓️ Timeline Chart")
+    st.caption("Chart render time and figure size by style (timeline page).")
+    render_latency_summary("timeline_chart", ["style", "source", "figure_kb"])
+
+    st.markdown("### 🚦 Cortex Queue")
+    st.caption("Shared across all sessions of this process.")
+    st.caption("Backends: " + " • ".join(f"{call_type} → {name}" for call_type, name in backend_routes().items()))
+    queue_metrics = cortex_scheduler.metrics()
+    if queue_metrics:
+        st.dataframe(queue_metrics, hide_index=True, use_container_width=True)
+    else:
+        st.caption("No Cortex calls yet.")
+    st.caption("Identical in-flight calls coalesced (\"coalesced\" = upstream calls saved).")
+    flight_metrics = single_flight.metrics()
+    if flight_metrics:
+        st.dataframe(flight_metrics, hide_index=True, use_container_width=True)
+
+    st.markdown("### 🪙 Token Usage")
+    session_id = st.session_state.get("session_id")
+    if session_id:
+        usage = token_ledger.turn(session_id)
+        budget = f" of {token_ledger.token_budget:,}" if token_ledger.token_budget else ""
+        st.caption(
+            f"This session: {usage['session']['total_tokens']:,}{budget} tokens • "
+            f"{usage['session']['credits']:.4f} credits • {usage['session']['calls']} calls"
+            + (" • over budget, using the cheapest models" if token_ledger.over_budget(session_id) else "")
+        )
+        if usage["by_call"]:
+            st.caption(f"Last turn: {usage['total_tokens']:,} tokens, {usage['credits']:.4f} credits")
+            st.dataframe(usage["by_call"], hide_index=True, use_container_width=True)
+
+    st.markdown("### 💾 Completion Cache")
+    if completion_cache is None:
+        st.caption("Disabled (COMPLETION_CACHE=0).")
+    else:
+        try:
+            st.caption(f"Temperature-0 completions kept on disk • entries: {completion_cache.entries():,} • evicted: {completion_cache.evicted:,}")
+        except Exception as e:
+            st.caption(f"Cache unavailable: {e}")
+        cache_metrics = completion_cache.metrics()
+        if cache_metrics:
+            st.dataframe(cache_metrics, hide_index=True, use_container_width=True)
+
+    st.markdown("### 🧭 Model Routing")
+    st.caption("First healthy candidate per route: p90 latency within target and few errors over the last 5 minutes.")
+    st.dataframe(routing_table(), hide_index=True, use_container_width=True)
+    health_metrics = model_health.metrics()
+    if health_metrics:
+        st.dataframe(health_metrics, hide_index=True, use_container_width=True)
+
+    st.markdown("### 📬 Feedback Outbox")
+    try:
+        st.caption("Sent: {sent} • Pending: {pending} • Failed: {failed}".format(**get_feedback_outbox().stats()))
+    except Exception as e:
+        st.caption(f"Outbox unavailable: {e}")
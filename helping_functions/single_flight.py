@@ -0,0 +1,84 @@
+# single_flight.py
+import hashlib
+import json
+import threading
+from collections import defaultdict
+
+
+def flight_key(call_type, model, prompt, options=None):
+    """(call type, model, whitespace-normalized prompt, options) as a compact hashable key."""
+    normalized = " ".join(str(prompt).split())
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return (call_type, model, digest, json.dumps(options or {}, sort_keys=True, default=str))
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Process-wide coalescing of identical in-flight calls.
+
+    The first caller for a key (the leader) runs the call; callers that arrive
+    with the same key while it is running wait for it and get the same result,
+    or the same exception. Nothing is cached: once the call returns, the next
+    caller starts a new one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = defaultdict(lambda: {"requests": 0, "upstream": 0, "coalesced": 0})
+
+    def do(self, key, fn):
+        call_type = key[0]
+        with self._lock:
+            stats = self._stats[call_type]
+            stats["requests"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                stats["upstream"] += 1
+            else:
+                flight.followers += 1
+                stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def metrics(self):
+        """Per call type: requests, upstream calls, calls saved by coalescing, and in flight now."""
+        with self._lock:
+            in_flight = defaultdict(int)
+            for key in self._flights:
+                in_flight[key[0]] += 1
+            return [
+                {"call_type": call_type, **stats, "in_flight": in_flight[call_type]}
+                for call_type, stats in sorted(self._stats.items())
+            ]
+
+
+# Module-level singleton shared by every session of the process
+single_flight = SingleFlight()
@@ -1,6 +1,12 @@
 import streamlit as st
+from helping_functions.static_artifacts import load_static_skills_html
 
+DISPLAY_MODES = ["Text", "Dot Meter", "Stars"]
+
+
+@st.fragment
 def render_skills_dashboard(skills_data):
+    # Fragment: switching category or display mode only reruns the dashboard
     categories = skills_data.get("categories", [])
     if not categories:
         st.info("No skills data available.")
@@ -9,7 +15,7 @@ def render_skills_dashboard(skills_data):
     # Choose display mode
     display_mode = st.radio(
         label="**Display mode:**",
-        options=["Text", "Dot Meter", "Stars"],
+        options=DISPLAY_MODES,
         horizontal=True
     )
     category_names = [cat["name"] for cat in categories]
@@ -28,93 +34,92 @@ def render_skills_dashboard(skills_data):
         st.session_state.selected_category = selected_category
 
     category = next(cat for cat in categories if cat["name"] == st.session_state.selected_category)
-    sorted_skills = sorted(category["skills"], key=lambda s: s.get("level", 0), reverse=True)
 
     st.write(f"### {st.session_state.selected_category}")
-    for skill in sorted_skills:
-        render_skill_row(skill, display_mode)
+    # One payload per (category, display mode): prebuilt by the static build step, else cached
+    html = load_static_skills_html(category["name"], display_mode)
+    if html is None:
+        html = get_category_html(category, display_mode)
+    st.markdown(html, unsafe_allow_html=True)
 
 
-def render_skill_row(skill, display_mode="Stars"):
-    name = skill.get("name", "Unnamed Skill")
-    level = skill.get("level", 0)
-    exp = skill.get("experience_years", "?")
+# Text label mapping
+LEVEL_MAP = [
+    ("Novice", {"max": 1, "color": "#9ca3af"}),         # gray-400
+    ("Beginner", {"max": 3, "color": "#fcd34d"}),       # amber-300
+    ("Intermediate", {"max": 6, "color": "#60a5fa"}),   # blue-400
+    ("Advanced", {"max": 8, "color": "#34d399"}),       # green-400
+    ("Expert", {"max": 10, "color": "#a78bfa"})         # purple-400
+]
 
-    # Text label mapping
-    level_map = [
-        ("Novice", {"max": 1, "color": "#9ca3af"}),         # gray-400
-        ("Beginner", {"max": 3, "color": "#fcd34d"}),       # amber-300
-        ("Intermediate", {"max": 6, "color": "#60a5fa"}),   # blue-400
-        ("Advanced", {"max": 8, "color": "#34d399"}),       # green-400
-        ("Expert", {"max": 10, "color": "#a78bfa"})         # purple-400
-    ]
+# Shared by every row of a payload instead of inlining styles per row
+SKILLS_CSS = (
+    ".skill-row{background-color:rgba(240,240,240,0.05);padding:12px 16px;margin-bottom:10px;"
+    "border-radius:10px;border:1px solid rgba(200,200,200,0.15);box-shadow:0 1px 3px rgba(0,0,0,0.05);"
+    "display:flex;justify-content:space-between;align-items:center}"
+    ".skill-info{text-align:right}"
+    ".skill-name{font-size:0.95em}"
+    ".skill-exp{font-size:0.8em;color:gray}"
+    ".skill-stars{font-size:1.1em}"
+    ".skill-stars .off{color:#999}"
+    ".skill-meter{display:flex;align-items:center;gap:10px}"
+    ".skill-dots{font-size:1.2em;letter-spacing:1px}"
+    ".skill-meter-label{font-size:0.85em;color:#6b7280;font-weight:500}"
+    ".skill-badge{padding:4px 10px;font-size:0.85em;font-weight:600;border-radius:999px}"
+    + "".join(
+        f".skill-badge.lvl-{label.lower()}{{background-color:{meta['color']}33;color:{meta['color']}}}"
+        for label, meta in LEVEL_MAP
+    )
+    + ".skill-badge.lvl-unknown{background-color:#cccccc33;color:#ccc}"
+)
 
 
+def level_label(level):
     # Determine level label
-    for label, meta in level_map:
+    for label, meta in LEVEL_MAP:
         if level <= meta["max"]:
-            level_text = label
-            badge_color = meta["color"]
-            break
-    else:
-        level_text = "Unknown"
-        badge_color = "#ccc"
+            return label
+    return "Unknown"
+
+
+def skill_row_html(skill, display_mode="Stars"):
+    name = skill.get("name", "Unnamed Skill")
+    level = skill.get("level", 0)
+    exp = skill.get("experience_years", "?")
+    level_text = level_label(level)
 
     if display_mode == "Stars":
-        stars_html = ''.join([
-            f'<span style="font-size: 1.1em; color: gold;">⭐</span>' if i < level
-            else f'<span style="font-size: 1.1em; color: #999;">☆</span>'
-            for i in range(10)
-        ])
-        detail_html = f"{stars_html}"
+        detail_html = (
+            f'<span class="skill-stars">{"⭐" * level}<span class="off">{"☆" * (10 - level)}</span></span>'
+        )
     elif display_mode == "Dot Meter":
-        filled = "🟢"
-        empty = "⚪"
-        gauge = filled * level + empty * (10 - level)
-
-        detail_html = f"""
-            <div style="display: flex; align-items: center; gap: 10px;">
-                <div style="font-size: 1.2em; letter-spacing: 1px;">{gauge}</div>
-                <div style="font-size: 0.85em; color: #6b7280; font-weight: 500;">{level_text}</div>
-            </div>
-        """
+        gauge = "🟢" * level + "⚪" * (10 - level)
+        detail_html = (
+            f'<div class="skill-meter"><div class="skill-dots">{gauge}</div>'
+            f'<div class="skill-meter-label">{level_text}</div></div>'
+        )
     else:
-        detail_html = f"""
-            <span style="
-                background-color: {badge_color}33; 
-                color: {badge_color}; 
-                padding: 4px 10px; 
-                font-size: 0.85em; 
-                font-weight: 600; 
-                border-radius: 999px;
-            ">
-                {level_text}
-            </span>
-        """
-
-    st.markdown(
-        f"""
-        <div style="
-            background-color: rgba(240, 240, 240, 0.05); 
-            padding: 12px 16px; 
-            margin-bottom: 10px; 
-            border-radius: 10px; 
-            border: 1px solid rgba(200, 200, 200, 0.15); 
-            box-shadow: 0 1px 3px rgba(0,0,0,0.05);
-            display: flex; 
-            justify-content: space-between; 
-            align-items: center;
-        ">
-            <div>{detail_html}</div>
-            <div style="text-align: right;">
-                <strong style="font-size: 0.95em;">{name}</strong><br>
-                <span style="font-size: 0.8em; color: gray;">{exp} years</span>
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True
+        detail_html = f'<span class="skill-badge lvl-{level_text.lower()}">{level_text}</span>'
+
+    return (
+        f'<div class="skill-row"><div>{detail_html}</div>'
+        f'<div class="skill-info"><strong class="skill-name">{name}</strong><br>'
+        f'<span class="skill-exp">{exp} years</span></div></div>'
     )
 
+
+def category_html(category, display_mode):
+    """The whole category as one HTML payload: the CSS once, then every row."""
+    sorted_skills = sorted(category["skills"], key=lambda s: s.get("level", 0), reverse=True)
+    rows = "".join(skill_row_html(skill, display_mode) for skill in sorted_skills)
+    return f"<style>{SKILLS_CSS}</style><div class=\"skills-list\">{rows}</div>"
+
+
+@st.cache_data(show_spinner=False)
+def get_category_html(category, display_mode):
+    return category_html(category, display_mode)
+
+
 def get_compact_skill_summary(skills_data):
     lines = []
     for category in skills_data.get("categories", []):
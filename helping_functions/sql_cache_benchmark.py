@@ -0,0 +1,146 @@
+# sql_cache_benchmark.py
+"""
+Compile time and result-cache reuse of the retrieval SQL, before and after
+parameterization.
+
+Every golden question (docs/retrieval_golden_set.json) is retrieved
+``--repeats`` times with each variant:
+
+    literal  the previous find_similar_doc() statement: question and intent
+             pasted into the SQL text, embedding computed inside it
+    bound    the current one: constant text with the question and intent
+             bound, embedding still computed inside the statement
+
+Each variant runs under its own query tag. Afterwards the statements are
+read back from INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION. A statement
+counts as served from the result cache when it scanned no bytes and had
+no execution time; Snowflake doesn't expose a flag for this.
+
+    python -m helping_functions.sql_cache_benchmark [--repeats 3] [--embedding 1024]
+"""
+import argparse
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from helping_functions.retrieval import (
+    DEFAULT_BOOSTS,
+    DEFAULT_K,
+    DOC_TABLE,
+    EMBEDDING_CONFIGS,
+    create_cli_session,
+    similarity_params,
+    similarity_query,
+)
+from helping_functions.retrieval_eval import EVAL_DIR, GOLDEN_SET_PATH, load_golden_set
+
+HISTORY_WAIT_SECONDS = 30  # query history lags the statements by a few seconds
+
+
+def literal_similarity_query(text, doc_table, intent, embedding_size, k=DEFAULT_K, boosts=DEFAULT_BOOSTS):
+    """The statement find_similar_doc() used to build, kept as the benchmark baseline."""
+    config = EMBEDDING_CONFIGS[embedding_size]
+    safe_text = text.replace("'", "''")
+    safe_intent = (intent or "").replace("'", "''")
+    return f"""
+        SELECT input_text,
+               source_desc,
+               VECTOR_COSINE_SIMILARITY({config['column']}, {config['function']}('{config['model']}', '{safe_text}'))
+                * (
+                    CASE WHEN source_desc = 'Language Fluency' THEN {boosts['language_fluency']}
+                        WHEN source = '{safe_intent}' THEN {boosts['intent_source']}
+                    ELSE 1 END
+                )  AS dist
+        FROM {doc_table}
+        ORDER BY dist DESC
+        LIMIT {int(k)}
+    """
+
+
+def run_literal(session, item, size):
+    session.sql(literal_similarity_query(item["question"], DOC_TABLE, item["intent"], size)).collect()
+
+
+def run_bound(session, item, size):
+    # Same statement as find_similar_doc(), without the in-process coalescing
+    session.sql(similarity_query(DOC_TABLE, size), params=similarity_params(item["question"], item["intent"])).collect()
+
+
+VARIANTS = {"literal": run_literal, "bound": run_bound}
+
+
+def run_variant(session, name, golden, size, repeats, tag):
+    session.query_tag = tag
+    timings = []
+    try:
+        for _ in range(repeats):
+            for item in golden:
+                started = time.perf_counter()
+                VARIANTS[name](session, item, size)
+                timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        session.query_tag = None
+    return timings
+
+
+def read_history(session, tag, expected):
+    """This session's statements under ``tag``, waiting for the history to catch up."""
+    deadline = time.monotonic() + HISTORY_WAIT_SECONDS
+    while True:
+        history = session.sql(
+            """
+            SELECT query_text, compilation_time, execution_time, total_elapsed_time, bytes_scanned
+            FROM TABLE(INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION(RESULT_LIMIT => 10000))
+            WHERE query_tag = ? AND execution_status = 'SUCCESS'
+            """,
+            params=[tag],
+        ).to_pandas()
+        if len(history) >= expected or time.monotonic() > deadline:
+            return history
+        time.sleep(2)
+
+
+def summarize(name, history, timings):
+    reused = (history["BYTES_SCANNED"] == 0) & (history["EXECUTION_TIME"] == 0)
+    return {
+        "variant": name,
+        "statements": len(history),
+        "distinct_texts": history["QUERY_TEXT"].nunique(),
+        "avg_compile_ms": round(float(history["COMPILATION_TIME"].mean()), 1),
+        "p95_compile_ms": round(float(history["COMPILATION_TIME"].quantile(0.95)), 1),
+        "avg_execution_ms": round(float(history["EXECUTION_TIME"].mean()), 1),
+        "result_reuse_rate": round(float(reused.mean()), 3),
+        "p50_retrieval_ms": round(float(np.percentile(timings, 50)), 1),
+        "p95_retrieval_ms": round(float(np.percentile(timings, 95)), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden", default=GOLDEN_SET_PATH)
+    parser.add_argument("--embedding", choices=list(EMBEDDING_CONFIGS), default="1024")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--out", default=os.path.join(EVAL_DIR, f"sql_cache_benchmark_{time.strftime('%Y%m%d_%H%M%S')}.csv"))
+    args = parser.parse_args()
+
+    golden = load_golden_set(args.golden)
+    session = create_cli_session()
+    run_id = uuid.uuid4().hex[:8]
+    rows = []
+    for name in VARIANTS:
+        tag = f"sql_cache_benchmark:{run_id}:{name}"
+        timings = run_variant(session, name, golden, args.embedding, args.repeats, tag)
+        history = read_history(session, tag, len(timings))
+        rows.append(summarize(name, history, timings))
+
+    report = pd.DataFrame(rows)
+    pd.set_option("display.width", 200)
+    print(f"{len(golden)} questions x {args.repeats} repeats, {args.embedding}-dim embedding\n")
+    print(report.to_string(index=False))
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    report.to_csv(args.out, index=False)
+    print(f"Report written to {args.out}")
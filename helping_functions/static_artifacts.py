@@ -0,0 +1,184 @@
+# static_artifacts.py
+"""
+Build step for the timeline & skills page.
+
+The page content depends only on docs/timeline.json and docs/skills.json, so
+the common Gantt figures (each single tag and all tags, both styles) and the
+skills payloads (every category and display mode) are compiled once into
+static/artifacts/<content hash>/ and served from there. Other tag
+combinations are built on demand. If the artifacts are missing or were built
+from different source files, the loaders return None and the pages fall back
+to building everything at request time. A rebuild
+is picked up by the running app on the next page load, no restart needed.
+
+Run after editing either JSON file:
+
+    python -m helping_functions.static_artifacts
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import streamlit as st
+
+from helping_functions.timeline_builder import (
+    TIMELINE_PATH,
+    build_event_records,
+    build_gantt_from_records,
+    build_tag_index,
+    end_of_next_month,
+    select_records,
+)
+
+ARTIFACT_DIR = "static/artifacts"
+SKILLS_PATH = "docs/skills.json"
+SOURCE_FILES = (TIMELINE_PATH, SKILLS_PATH)
+# Bump when the builders' output format changes so old artifacts are ignored
+ARTIFACT_FORMAT_VERSION = "3"
+GANTT_STYLES = ("lean", "classic")
+
+
+def sources_hash(paths=SOURCE_FILES):
+    digest = hashlib.sha256(ARTIFACT_FORMAT_VERSION.encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def tag_set_key(selected_tags):
+    return "|".join(sorted(selected_tags))
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def prebuilt_tag_selections(tags):
+    """Tag selections worth prebuilding: each tag alone and all tags (2^n subsets would not scale)."""
+    selections = [(tag,) for tag in tags]
+    if len(tags) > 1:
+        selections.append(tuple(tags))
+    return selections
+
+
+def build_artifacts(out_dir=ARTIFACT_DIR):
+    """Compile all static artifacts for the current source files; returns the version."""
+    from helping_functions.skills_builder import DISPLAY_MODES, category_html
+
+    version = sources_hash()
+    target = os.path.join(out_dir, version)
+
+    with open(TIMELINE_PATH, "r") as f:
+        timeline_json = json.load(f)
+    with open(SKILLS_PATH, "r") as f:
+        skills_json = json.load(f)
+
+    os.makedirs(target, exist_ok=True)
+    records = build_event_records(timeline_json)
+    tag_index = build_tag_index(records)
+    tags = sorted(tag_index)
+    for style in GANTT_STYLES:
+        figures = {}
+        for selected in prebuilt_tag_selections(tags):
+            fig = build_gantt_from_records(select_records(records, tag_index, selected), style)
+            if fig is not None:
+                figures[tag_set_key(selected)] = json.loads(fig.to_json())
+        _write_json(os.path.join(target, f"gantt_{style}.json"), figures)
+
+    skills_html = {
+        category["name"]: {mode: category_html(category, mode) for mode in DISPLAY_MODES}
+        for category in skills_json.get("categories", [])
+    }
+    _write_json(os.path.join(target, "skills_html.json"), skills_html)
+
+    # Manifest last, so a half-written build is never picked up
+    _write_json(os.path.join(out_dir, "manifest.json"), {
+        "version": version,
+        "sources": list(SOURCE_FILES),
+        "built_at": datetime.utcnow().isoformat(),
+    })
+    return version
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def current_artifact_dir(out_dir=ARTIFACT_DIR):
+    """Directory of artifacts matching the current sources, or None if missing/stale."""
+    # Keyed on the file times, so a rebuild or an edited source is seen without a restart
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    return _artifact_dir_for(out_dir, _mtime(manifest_path), tuple(_mtime(p) for p in SOURCE_FILES))
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _artifact_dir_for(out_dir, manifest_mtime, source_mtimes):
+    try:
+        with open(os.path.join(out_dir, "manifest.json"), "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != sources_hash():
+            return None
+    except (OSError, ValueError):
+        return None
+    target = os.path.join(out_dir, manifest["version"])
+    return target if os.path.isdir(target) else None
+
+
+def _load_artifact_json(name):
+    target = current_artifact_dir()
+    if target is None:
+        return None
+    return _read_artifact_json(target, name)
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _read_artifact_json(target, name):
+    # target is a content-hash directory, so its files never change under the same key
+    try:
+        with open(os.path.join(target, name), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_static_gantt_figure(selected_tags, style="lean"):
+    """
+    Prebuilt figure dict for this tag selection, with the x-axis end moved to
+    today's horizon. None for selections that are not prebuilt.
+    """
+    figures = _load_artifact_json(f"gantt_{style}.json")
+    if figures is None:
+        return None
+    fig = figures.get(tag_set_key(selected_tags))
+    if fig is None:
+        return None
+    fig = dict(fig, layout=dict(fig.get("layout", {})))
+    xaxis = dict(fig["layout"].get("xaxis", {}))
+    if len(xaxis.get("range", [])) == 2:
+        xaxis["range"] = [xaxis["range"][0], end_of_next_month().isoformat()]
+    fig["layout"]["xaxis"] = xaxis
+    return fig
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def static_gantt_figure_size_kb(selected_tags, style="lean"):
+    fig = load_static_gantt_figure(selected_tags, style)
+    return round(len(json.dumps(fig)) / 1024, 1) if fig else 0.0
+
+
+def load_static_skills_html(category_name, display_mode):
+    payloads = _load_artifact_json("skills_html.json")
+    if payloads is None:
+        return None
+    return payloads.get(category_name, {}).get(display_mode)
+
+
+if __name__ == "__main__":
+    print(f"Built static artifacts {build_artifacts()} in {ARTIFACT_DIR}/")
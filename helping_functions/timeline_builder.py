@@ -1,47 +1,48 @@
 from datetime import datetime
+import json
 import pandas as pd
+import plotly.express as px
 import plotly.figure_factory as ff
+import streamlit as st
 import calendar
 
+TIMELINE_PATH = "docs/timeline.json"
+
 def parse_date(date_dict):
     year = int(date_dict.get("year", 1900))
     month = int(date_dict.get("month", 1))
     day = int(date_dict.get("day", 1))
     return datetime(year, month, day)
 
-def build_gantt_from_json(timeline_json, selected_tag="All"):
-    tasks = []
-
+def build_event_records(timeline_json):
+    """Parse the timeline events once into plain records (dates already converted)."""
+    records = []
     for event in timeline_json.get("events", []):
-        tags = event.get("tags", [])
-        if selected_tag != "All" and selected_tag not in tags:
-            continue  # Skip events that don't match tag
-
-        start_date = parse_date(event.get("start_date", {}))
-        end_date = parse_date(event.get("end_date", event.get("start_date", {})))
-
-        tasks.append(dict(
+        records.append(dict(
             Task=event["text"]["headline"],
-            Start=start_date,
-            Finish=end_date,
-            Description=event["text"].get("text", "")
+            Start=parse_date(event.get("start_date", {})),
+            Finish=parse_date(event.get("end_date", event.get("start_date", {}))),
+            Description=event["text"].get("text", ""),
+            Tags=tuple(event.get("tags", [])),
         ))
+    return records
 
-    if not tasks:
-        return None  # No events to show
 
-    df = pd.DataFrame(tasks)
+def build_tag_index(records):
+    """Map each tag to the positions of the records carrying it."""
+    index = {}
+    for i, record in enumerate(records):
+        for tag in record["Tags"]:
+            index.setdefault(tag, []).append(i)
+    return index
 
-    fig = ff.create_gantt(
-        df,
-        index_col='Task',
-        show_colorbar=False,
-        group_tasks=True,
-        title="",
-        showgrid_x=True,
-        showgrid_y=True
-    )
 
+def select_records(records, tag_index, selected_tags):
+    ids = sorted({i for tag in selected_tags for i in tag_index.get(tag, [])})
+    return [records[i] for i in ids]
+
+
+def end_of_next_month():
     today = datetime.today()
 
     # Calculate last day of next month
@@ -51,11 +52,45 @@ def build_gantt_from_json(timeline_json, selected_tag="All"):
         month = 1
         year += 1
     last_day_next_month = calendar.monthrange(year, month)[1]
-    end_of_next_month = datetime(year, month, last_day_next_month)
+    return datetime(year, month, last_day_next_month)
+
+
+def build_gantt_from_records(records, style="classic"):
+    """
+    Build the timeline figure from pre-parsed records.
+
+    "classic" is the figure_factory Gantt (one scatter trace per task);
+    "lean" is a single-trace px.timeline bar chart with a much smaller payload.
+    """
+    if not records:
+        return None  # No events to show
+
+    df = pd.DataFrame([{k: v for k, v in r.items() if k != "Tags"} for r in records])
+
+    if style == "lean":
+        fig = px.timeline(
+            df,
+            x_start="Start",
+            x_end="Finish",
+            y="Task",
+            hover_data={"Description": True, "Task": False},
+        )
+        fig.update_yaxes(autorange="reversed", title=None)
+        fig.update_layout(showlegend=False, margin=dict(l=10, r=10, t=10, b=10))
+    else:
+        fig = ff.create_gantt(
+            df,
+            index_col='Task',
+            show_colorbar=False,
+            group_tasks=True,
+            title="",
+            showgrid_x=True,
+            showgrid_y=True
+        )
 
     fig.update_layout(
         xaxis=dict(
-            range=[df['Start'].min(), end_of_next_month],  # limit max to next month end
+            range=[df['Start'].min(), end_of_next_month()],  # limit max to next month end
             title="Date",
             rangeselector=dict(buttons=[]),  # Disable range selector buttons
             rangeslider=dict(visible=False),  # Disable range slider
@@ -66,6 +101,44 @@ def build_gantt_from_json(timeline_json, selected_tag="All"):
     return fig
 
 
+def build_gantt_from_json(timeline_json, selected_tag="All"):
+    records = build_event_records(timeline_json)
+    if selected_tag != "All":
+        records = [r for r in records if selected_tag in r["Tags"]]  # Skip events that don't match tag
+    return build_gantt_from_records(records)
+
+
+@st.cache_resource(show_spinner=False)
+def load_timeline_index(path=TIMELINE_PATH):
+    """Timeline JSON, its parsed records and the tag index, built once per process."""
+    with open(path, "r") as f:
+        timeline_json = json.load(f)
+    records = build_event_records(timeline_json)
+    return timeline_json, records, build_tag_index(records)
+
+
+def get_gantt_figure(selected_tags, style="classic", path=TIMELINE_PATH):
+    """Figure per (selected tag set, style); pass ``selected_tags`` as a sorted tuple."""
+    # Keyed on the month too, so the x-axis end (end_of_next_month) moves on
+    return _gantt_figure(selected_tags, style, path, datetime.today().strftime("%Y-%m"))
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _gantt_figure(selected_tags, style, path, month):
+    _, records, tag_index = load_timeline_index(path)
+    return build_gantt_from_records(select_records(records, tag_index, selected_tags), style)
+
+
+def gantt_figure_size_kb(selected_tags, style="classic", path=TIMELINE_PATH):
+    return _gantt_figure_size_kb(selected_tags, style, path, datetime.today().strftime("%Y-%m"))
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _gantt_figure_size_kb(selected_tags, style, path, month):
+    fig = get_gantt_figure(selected_tags, style, path)
+    return round(len(fig.to_json()) / 1024, 1) if fig else 0.0
+
+
 def timeline_builder(timeline_json):
     title = timeline_json["title"]["text"]["headline"]
     subtitle = timeline_json["title"]["text"]["text"]
@@ -0,0 +1,181 @@
+# token_accounting.py
+"""
+Token and cost accounting for every completion call.
+
+scheduled_complete() records one entry per upstream call: prompt and
+completion tokens as reported by the backend (the local backend returns
+llama.cpp's usage), otherwise estimated from the text, plus the Cortex
+credits they cost. Entries are aggregated per turn and per ``session_id``;
+the turn summary, plus any background usage not logged yet, is stored with
+the assistant's CHAT_LOGS row (see migrations/002_chat_logs_token_usage.sql).
+
+A session over its budget is routed to the cheapest candidate models:
+
+    SESSION_TOKEN_BUDGET=150000     # prompt + completion tokens, 0 = no limit
+    SESSION_CREDIT_BUDGET=0.05      # Cortex credits, 0 = no limit
+"""
+import os
+import threading
+from collections import OrderedDict, deque
+
+# Cortex COMPLETE credits per million tokens (prompt and completion are billed alike)
+CREDITS_PER_MILLION_TOKENS = {
+    "mistral-large": 5.10,
+    "reka-flash": 0.45,
+    "llama2-70b-chat": 0.45,
+    "mixtral-8x7b": 0.22,
+    "gemma-7b": 0.12,
+    "mistral-7b": 0.12,
+}
+CHARS_PER_TOKEN = 4  # rough average for English text with these tokenizers
+
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "150000"))
+SESSION_CREDIT_BUDGET = float(os.getenv("SESSION_CREDIT_BUDGET", "0"))
+MAX_TRACKED_SESSIONS = 5000
+MAX_CALLS_PER_SESSION = 50  # recent entries kept for the per-turn breakdown
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    return max(1, round(len(text) / CHARS_PER_TOKEN))
+
+
+def credits_for(model, tokens):
+    return tokens * CREDITS_PER_MILLION_TOKENS.get(model, 0.0) / 1_000_000
+
+
+def call_usage(model, call_type, prompt, response):
+    """Usage entry for one call; backend-reported counts when ``response.usage`` has them."""
+    reported = getattr(response, "usage", None) or {}
+    prompt_tokens = reported.get("prompt_tokens")
+    completion_tokens = reported.get("completion_tokens")
+    source = "backend" if prompt_tokens is not None and completion_tokens is not None else "estimate"
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(str(prompt))
+    if completion_tokens is None:
+        completion_tokens = estimate_tokens(response if isinstance(response, str) else "")
+    return {
+        "call_type": call_type,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "credits": credits_for(model, prompt_tokens + completion_tokens),
+        "source": source,
+    }
+
+
+def _totals(entries):
+    prompt_tokens = sum(e["prompt_tokens"] for e in entries)
+    completion_tokens = sum(e["completion_tokens"] for e in entries)
+    return {
+        "calls": len(entries),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "credits": round(sum(e["credits"] for e in entries), 6),
+    }
+
+
+class TokenLedger:
+    """
+    Per-session usage, shared by every session of the process (prefetch and
+    summary threads record into it too). Each entry is tagged with the turn
+    that was current when its call was submitted, so a call that finishes
+    after the next ``begin_turn()`` still counts towards the turn it came
+    from. Background calls (summaries, prefetches) are reported apart from
+    the turn's own calls, once each. The least recently used sessions are
+    dropped.
+    """
+
+    def __init__(self, token_budget=SESSION_TOKEN_BUDGET, credit_budget=SESSION_CREDIT_BUDGET,
+                 max_sessions=MAX_TRACKED_SESSIONS, max_calls=MAX_CALLS_PER_SESSION):
+        self.token_budget = token_budget
+        self.credit_budget = credit_budget
+        self.max_sessions = max_sessions
+        self.max_calls = max_calls
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, session_id):
+        if session_id not in self._sessions:
+            self._sessions[session_id] = {
+                "turn_id": 0,
+                "calls": deque(maxlen=self.max_calls),
+                "unreported": [],
+                "total": _totals([]),
+            }
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return self._sessions[session_id]
+
+    def begin_turn(self, session_id):
+        with self._lock:
+            entry = self._entry(session_id)
+            entry["turn_id"] += 1
+            return entry["turn_id"]
+
+    def current_turn(self, session_id):
+        with self._lock:
+            return self._entry(session_id)["turn_id"]
+
+    def record(self, session_id, usage, turn_id=None, background=False):
+        """Adds one call; ``turn_id`` is the turn captured when the call was submitted."""
+        with self._lock:
+            entry = self._entry(session_id)
+            usage = dict(usage, turn_id=entry["turn_id"] if turn_id is None else turn_id, background=background)
+            if background:
+                entry["unreported"].append(usage)
+                del entry["unreported"][:-self.max_calls]
+            else:
+                entry["calls"].append(usage)
+            total = entry["total"]
+            for key in ("prompt_tokens", "completion_tokens"):
+                total[key] += usage[key]
+            total["calls"] += 1
+            total["total_tokens"] = total["prompt_tokens"] + total["completion_tokens"]
+            total["credits"] = round(total["credits"] + usage["credits"], 6)
+
+    @staticmethod
+    def _rounded(calls):
+        return [dict(call, credits=round(call["credits"], 6)) for call in calls]
+
+    def turn(self, session_id):
+        """The current turn's totals and per-call breakdown, and the session totals so far."""
+        with self._lock:
+            entry = self._entry(session_id)
+            calls = self._rounded(c for c in entry["calls"] if c["turn_id"] == entry["turn_id"])
+            session_total = dict(entry["total"])
+        return {**_totals(calls), "by_call": calls, "session": session_total}
+
+    def report(self, session_id):
+        """
+        What CHAT_LOGS stores with an assistant row: ``turn()`` plus the
+        background calls that finished since the previous report, under
+        ``background`` with their own totals. Each background call is
+        reported once.
+        """
+        usage = self.turn(session_id)
+        with self._lock:
+            entry = self._entry(session_id)
+            background, entry["unreported"] = self._rounded(entry["unreported"]), []
+        usage["background"] = {**_totals(background), "by_call": background}
+        return usage
+
+    def session(self, session_id):
+        with self._lock:
+            return dict(self._entry(session_id)["total"])
+
+    def over_budget(self, session_id):
+        if session_id is None:
+            return False
+        total = self.session(session_id)
+        return bool(
+            (self.token_budget and total["total_tokens"] >= self.token_budget)
+            or (self.credit_budget and total["credits"] >= self.credit_budget)
+        )
+
+
+# Module-level singleton, fed by scheduled_complete()
+token_ledger = TokenLedger()
@@ -1,7 +1,7 @@
 # tts_utils.py
 from google.cloud import texttospeech
-import base64
 import streamlit as st
+import streamlit.components.v1 as components
 import xml.etree.ElementTree as ET
 import re
 
@@ -28,7 +28,13 @@ def get_voices():
             filtered_voices.append(voice.name)
     return filtered_voices
 
-def generate_google_tts_audio(text, voice_name='en-US-Neural2-D', speaking_rate=1):
+# Google TTS encoding -> browser mime type. OGG_OPUS is much smaller than MP3 at
+# speech quality, but older Safari versions can't play it.
+AUDIO_ENCODINGS = {"MP3": "audio/mpeg", "OGG_OPUS": "audio/ogg"}
+OPUS_SAMPLE_RATE_HERTZ = 16000  # wideband speech; keeps the Opus bitrate low
+
+
+def generate_google_tts_audio(text, voice_name='en-US-Neural2-D', speaking_rate=1, audio_encoding="MP3"):
     if not is_valid_ssml(text):
         # Fallback: strip tags or log the issue
         text = strip_ssml_tags(text)
@@ -47,10 +53,13 @@ def generate_google_tts_audio(text, voice_name='en-US-Neural2-D', speaking_rate=
         ssml_gender=texttospeech.SsmlVoiceGender.MALE
     )
 
-    audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3,
+    audio_config_kwargs = dict(
+        audio_encoding=getattr(texttospeech.AudioEncoding, audio_encoding),
         speaking_rate=speaking_rate
     )
+    if audio_encoding == "OGG_OPUS":
+        audio_config_kwargs["sample_rate_hertz"] = OPUS_SAMPLE_RATE_HERTZ
+    audio_config = texttospeech.AudioConfig(**audio_config_kwargs)
 
     response = client.synthesize_speech(
         input=synthesis_input,
@@ -61,19 +70,116 @@ def generate_google_tts_audio(text, voice_name='en-US-Neural2-D', speaking_rate=
     return response.audio_content
 
 
-def autoplay_audio(audio_bytes: bytes, volume: float = 1.0):
-    volume_js = f"{volume:.2f}"
-    b64 = base64.b64encode(audio_bytes).decode()
-    md = f"""
-    <audio id="tts_audio" autoplay>
-        <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
-    </audio>
-    <script>
-      const audio = document.getElementById('tts_audio');
-      audio.addEventListener('loadedmetadata', () => {{
-        audio.volume = {volume_js};
-      }});
-    </script>
+def play_audio(audio_bytes: bytes, audio_encoding: str = "MP3", volume: float = 1.0):
+    """
+    Autoplaying audio player that sends the audio once: st.audio registers the
+    bytes with Streamlit's media file manager and the page loads them by URL.
+    """
+    st.audio(audio_bytes, format=AUDIO_ENCODINGS[audio_encoding], autoplay=True)
+    # Scripts inside st.markdown never run, so set the volume from a zero-height component
+    components.html(
+        f"""
+        <script>
+          const players = window.parent.document.querySelectorAll('audio');
+          if (players.length) {{ players[players.length - 1].volume = {volume:.2f}; }}
+        </script>
+        """,
+        height=0,
+    )
+
+
+# --- Local spoken-version normalizer ---
+# Written out the way they should be pronounced; keys are matched as whole words
+SPOKEN_TERMS = {
+    "e.g.": "for example",
+    "i.e.": "that is",
+    "etc.": "and so on",
+    "vs.": "versus",
+    "approx.": "approximately",
+    "w/": "with",
+    "&": "and",
+    "SQL": "sequel",
+    "MySQL": "my sequel",
+    "PostgreSQL": "postgres",
+    "ETL": "E T L",
+    "ELT": "E L T",
+    "GCP": "G C P",
+    "AWS": "A W S",
+    "HDFS": "H D F S",
+    "CI/CD": "C I C D",
+    "CV": "C V",
+    "BSc": "bachelor's degree",
+    "MSc": "master's degree",
+    "ML": "machine learning",
+    "AI": "A I",
+    "API": "A P I",
+    "APIs": "A P Is",
+    "JSON": "jason",
+    "PySpark": "pie spark",
+    "dbt": "D B T",
+    "k8s": "kubernetes",
+    "Lv": "level",
+}
+_TERM_RE = re.compile(
+    r"(?<![\w/])(" + "|".join(re.escape(k) for k in sorted(SPOKEN_TERMS, key=len, reverse=True)) + r")(?![\w/])"
+)
+MAX_SPOKEN_SENTENCE_WORDS = 25
+
+
+def strip_markdown(text: str) -> str:
+    text = re.sub(r"```.*?```", " ", text, flags=re.S)          # code blocks
+    text = re.sub(r"`([^`]*)`", r"\1", text)                     # inline code
+    text = re.sub(r"!\[[^\]]*\]\([^)]*\)", "", text)             # images
+    text = re.sub(r"\[([^\]]+)\]\([^)]*\)", r"\1", text)         # links -> label
+    text = re.sub(r"(\*\*|\*|~~)(\S.*?\S|\S)\1", r"\2", text)     # bold / italic / strike
+    text = re.sub(r"(?<!\w)(__|_)(\S.*?\S|\S)\1(?!\w)", r"\2", text)  # underscore emphasis, not snake_case
+    text = re.sub(r"^\s{0,3}#{1,6}\s*", "", text, flags=re.M)    # headings
+    text = re.sub(r"^\s*>\s?", "", text, flags=re.M)             # quotes
+    text = re.sub(r"^\s*(?:[-*+•]|\d+[.)])\s+", "", text, flags=re.M)  # list markers
+    return text
+
+
+def split_sentences(text: str):
+    parts = re.split(r"(?<=[.!?…])\s+|\n+", text)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _add_pauses(sentence: str) -> str:
+    # Break long sentences at the first natural joint so the voice can breathe
+    words = sentence.split()
+    if len(words) <= MAX_SPOKEN_SENTENCE_WORDS:
+        return sentence
+    # Semicolons are already sentence breaks by now (see to_spoken_text)
+    for joint in (", and ", ", but ", ", which ", ", where "):
+        idx = sentence.find(joint)
+        if idx > 0:
+            head, tail = sentence[:idx], sentence[idx + len(joint):]
+            return f"{head}... {joint.strip(' ,')} {_add_pauses(tail)}"
+    return sentence
+
+
+def to_spoken_text(text: str) -> str:
+    """
+    Derive the spoken (TTS) version of an answer locally instead of asking
+    the model to write it a second time: strips markdown and SSML, expands
+    abbreviations and tool names, and turns layout into pause punctuation.
     """
-    st.markdown(md, unsafe_allow_html=True)
+    text = strip_ssml_tags(strip_markdown(text))
+    text = re.sub(r"https?://\S+", "", text)
+    text = re.sub(r"(\d{4})\s*[–-]\s*(\d{4}|present|now)", r"\1 to \2", text, flags=re.I)
+    text = re.sub(r"\s+[–—]\s+|\s*—\s*", ", ", text)
+    text = re.sub(r"\s*\(([^)]*)\)", r", \1,", text)
+    text = text.replace(";", ".")
+    text = re.sub(r"[ \t]*:[ \t]*(?=\n|$)", ".", text)  # a colon introducing a list ends the sentence
+    text = _TERM_RE.sub(lambda m: SPOKEN_TERMS[m.group(1)], text)
 
+    sentences = []
+    for sentence in split_sentences(text):
+        sentence = re.sub(r",\s*([,.!?])", r"\1", sentence).strip(" ,")
+        if not sentence:
+            continue
+        sentence = sentence[0].upper() + sentence[1:].rstrip(":")
+        if sentence[-1] not in ".!?…":
+            sentence += "."
+        sentences.append(_add_pauses(sentence))
+    return " ".join(sentences)
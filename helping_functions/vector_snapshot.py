@@ -0,0 +1,230 @@
+# vector_snapshot.py
+"""
+Quantized, memory-mapped snapshot of app.vector_store.
+
+The exporter writes the chunk texts, their metadata and both embedding
+columns to static/vector_store/<content hash>/. Embeddings are stored as
+int8 with one float32 scale per row, or as float16, in .npy files. The
+loader opens them with ``mmap_mode="r"``: the rows stay in the OS page
+cache and are shared read-only by every process that maps the same
+snapshot, and each process keeps a single mapping. find_similar_doc() then
+ranks chunks locally. Only the query embedding still goes to Cortex.
+
+Re-export whenever the vector store changes:
+
+    python -m helping_functions.vector_snapshot [--dtype int8|float16]
+
+Layout of a snapshot:
+
+    chunks.json              texts, sources, source descriptions
+    emb_<size>.npy           (n, dim) int8 or float16
+    emb_<size>.scale.npy     (n,) float32 row scales (int8 only)
+    emb_<size>.norm.npy      (n,) float32 norms of the dequantized rows
+    manifest.json            written last
+    ../CURRENT               version in use, replaced atomically
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from helping_functions.retrieval import (
+    DEFAULT_BOOSTS,
+    DEFAULT_K,
+    DOC_TABLE,
+    apply_boosts,
+    create_cli_session,
+    fetch_vector_store,
+    top_k,
+)
+
+SNAPSHOT_DIR = os.getenv("VECTOR_SNAPSHOT_DIR", "static/vector_store")
+# Bump when the file layout changes so old snapshots are ignored
+SNAPSHOT_FORMAT_VERSION = "1"
+DTYPES = ("int8", "float16")
+BLOCK_ROWS = 4096  # rows dequantized at a time while scoring
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantization; returns (int8 rows, float32 scales)."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _snapshot_version(store, dtype):
+    digest = hashlib.sha256(f"{SNAPSHOT_FORMAT_VERSION}:{dtype}".encode())
+    digest.update(json.dumps([list(store[k]) for k in ("texts", "sources", "source_descs")]).encode())
+    for size in sorted(store["vectors"]):
+        digest.update(np.ascontiguousarray(store["vectors"][size]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def export_snapshot(store, out_dir=SNAPSHOT_DIR, dtype="int8", source_table=DOC_TABLE):
+    """Write ``store`` (see fetch_vector_store) as a new snapshot and make it current; returns the version."""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+    version = _snapshot_version(store, dtype)
+    target = os.path.join(out_dir, version)
+    os.makedirs(target, exist_ok=True)
+
+    with open(os.path.join(target, "chunks.json"), "w") as f:
+        json.dump(
+            {k: [None if v is None else str(v) for v in store[k]] for k in ("texts", "sources", "source_descs")},
+            f,
+            ensure_ascii=False,
+        )
+
+    embeddings = {}
+    for size, vectors in store["vectors"].items():
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dtype == "int8":
+            stored, scales = quantize_int8(vectors)
+            np.save(os.path.join(target, f"emb_{size}.scale.npy"), scales)
+            dequantized = stored.astype(np.float32) * scales[:, None]
+        else:
+            stored = vectors.astype(np.float16)
+            dequantized = stored.astype(np.float32)
+        np.save(os.path.join(target, f"emb_{size}.npy"), stored)
+        np.save(os.path.join(target, f"emb_{size}.norm.npy"), np.linalg.norm(dequantized, axis=1).astype(np.float32))
+        embeddings[size] = {
+            "dim": int(vectors.shape[1]),
+            "float32_bytes": int(vectors.nbytes),
+            "stored_bytes": int(stored.nbytes),
+        }
+
+    # Manifest last: a snapshot without one is incomplete and never loaded
+    with open(os.path.join(target, "manifest.json"), "w") as f:
+        json.dump({
+            "version": version,
+            "format": SNAPSHOT_FORMAT_VERSION,
+            "dtype": dtype,
+            "rows": len(store["texts"]),
+            "source_table": source_table,
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "embeddings": embeddings,
+        }, f, indent=2)
+
+    current_tmp = os.path.join(out_dir, "CURRENT.tmp")
+    with open(current_tmp, "w") as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(out_dir, "CURRENT"))
+    return version
+
+
+class VectorSnapshot:
+    """Read-only view of one snapshot; embeddings are memory-mapped, never copied whole."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(path, "chunks.json"), "r") as f:
+            chunks = json.load(f)
+        self.texts = chunks["texts"]
+        self.sources = np.array(chunks["sources"], dtype=object)
+        self.source_descs = np.array(chunks["source_descs"], dtype=object)
+        self._embeddings = {}
+        for size in self.manifest["embeddings"]:
+            scale_path = os.path.join(path, f"emb_{size}.scale.npy")
+            self._embeddings[size] = (
+                np.load(os.path.join(path, f"emb_{size}.npy"), mmap_mode="r"),
+                np.load(scale_path, mmap_mode="r") if os.path.exists(scale_path) else None,
+                np.load(os.path.join(path, f"emb_{size}.norm.npy"), mmap_mode="r"),
+            )
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    def has(self, embedding_size):
+        return embedding_size in self._embeddings
+
+    def similarities(self, query_vector, embedding_size):
+        """Cosine similarity of every row with ``query_vector``, dequantizing block by block."""
+        rows, scales, norms = self._embeddings[embedding_size]
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        dots = np.empty(rows.shape[0], dtype=np.float32)
+        for start in range(0, rows.shape[0], BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS].astype(np.float32) @ query_vector
+            if scales is not None:
+                block *= scales[start:start + BLOCK_ROWS]
+            dots[start:start + BLOCK_ROWS] = block
+        return dots / (norms * np.linalg.norm(query_vector) + 1e-12)
+
+    def similarity_matrix(self, query_vectors, embedding_size):
+        """(queries, rows) cosine similarities for a batch of queries, in one pass over the rows."""
+        rows, scales, norms = self._embeddings[embedding_size]
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        dots = np.empty((rows.shape[0], query_vectors.shape[0]), dtype=np.float32)
+        for start in range(0, rows.shape[0], BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS].astype(np.float32) @ query_vectors.T
+            if scales is not None:
+                block *= scales[start:start + BLOCK_ROWS, None]
+            dots[start:start + BLOCK_ROWS] = block
+        query_norms = np.linalg.norm(query_vectors, axis=1)
+        return (dots / (norms[:, None] * query_norms[None, :] + 1e-12)).T
+
+    def search_batch(self, query_vectors, embedding_size, intent, k=DEFAULT_K, boosts=DEFAULT_BOOSTS):
+        """Per-query top-k (indices, scores) for a batch of queries, from one similarity matrix."""
+        scores = apply_boosts(
+            self.similarity_matrix(query_vectors, embedding_size), self.sources, self.source_descs, intent, boosts
+        )
+        return [top_k(row, k) for row in scores]
+
+
+def top_k_agreement(snapshot, vectors, embedding_size, samples=20):
+    """Share of sample rows (used as queries) whose top-k matches the float32 ranking exactly."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    agree = [
+        top_k(snapshot.similarities(q, embedding_size))[0].tolist()
+        == top_k(vectors @ q / (norms * np.linalg.norm(q) + 1e-12))[0].tolist()
+        for q in vectors[:samples]
+    ]
+    return float(np.mean(agree)) if agree else 1.0
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def load_current_snapshot(out_dir=SNAPSHOT_DIR):
+    """The snapshot named in CURRENT, mapped once per process; None if there is no usable snapshot."""
+    try:
+        with open(os.path.join(out_dir, "CURRENT"), "r") as f:
+            path = os.path.join(out_dir, f.read().strip())
+    except OSError:
+        return None
+    with _snapshots_lock:
+        if path not in _snapshots:
+            try:
+                snapshot = VectorSnapshot(path)
+            except (OSError, ValueError, KeyError):
+                return None
+            if snapshot.manifest.get("format") != SNAPSHOT_FORMAT_VERSION:
+                return None
+            _snapshots.clear()  # drop the mapping of a replaced snapshot
+            _snapshots[path] = snapshot
+        return _snapshots[path]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export app.vector_store to a local quantized snapshot.")
+    parser.add_argument("--dtype", choices=DTYPES, default="int8")
+    parser.add_argument("--out", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    store = fetch_vector_store(create_cli_session())
+    version = export_snapshot(store, args.out, args.dtype)
+    snapshot = load_current_snapshot(args.out)
+    print(f"Snapshot {version}: {snapshot.manifest['rows']} chunks, {args.dtype}")
+    for size, info in snapshot.manifest["embeddings"].items():
+        print(f"  {size}: {info['float32_bytes'] / 1024:.1f} KB float32 -> {info['stored_bytes'] / 1024:.1f} KB "
+              f"({info['stored_bytes'] / info['float32_bytes']:.0%}), "
+              f"top-{DEFAULT_K} agreement {top_k_agreement(snapshot, store['vectors'][size], size):.0%}")
@@ -0,0 +1,104 @@
+-- 001_chat_logs_prompt_dedup.sql
+-- Store prompt templates and retrieved context chunks once, keyed by content hash.
+-- CHAT_LOGS rows keep only the hashes plus the variable parts of the prompt;
+-- CHAT_LOGS_EXPANDED rebuilds the full prompt and context exactly.
+--
+-- Run once, in order, in the schema that holds CHAT_LOGS.
+
+-- 1. Lookup tables -------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS CHAT_PROMPT_TEMPLATES (
+    template_hash STRING NOT NULL PRIMARY KEY,   -- first 32 hex chars of SHA-256(template_text)
+    template_text STRING NOT NULL,               -- str.format template, static parts already bound
+    created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+);
+
+CREATE TABLE IF NOT EXISTS CHAT_CONTEXT_CHUNKS (
+    chunk_hash STRING NOT NULL PRIMARY KEY,      -- first 32 hex chars of SHA-256(chunk_text)
+    chunk_text STRING NOT NULL,
+    created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+);
+
+-- 2. New CHAT_LOGS columns -----------------------------------------------------
+ALTER TABLE CHAT_LOGS ADD COLUMN IF NOT EXISTS turn_id STRING;
+ALTER TABLE CHAT_LOGS ADD COLUMN IF NOT EXISTS context_chunk_hashes ARRAY;   -- ordered chunk hashes
+ALTER TABLE CHAT_LOGS ADD COLUMN IF NOT EXISTS prompt_template_hash STRING;
+ALTER TABLE CHAT_LOGS ADD COLUMN IF NOT EXISTS prompt_params VARIANT;        -- template variables
+
+UPDATE CHAT_LOGS SET turn_id = UUID_STRING() WHERE turn_id IS NULL;
+
+-- 3. Prompt renderer -----------------------------------------------------------
+-- Same str.format rendering as helping_functions/prompt_templates.py. The
+-- "context" variable is not stored in prompt_params when it equals the
+-- turn's context; it is passed in from the rebuilt chunks instead.
+CREATE OR REPLACE FUNCTION RENDER_PROMPT(template_text STRING, params VARIANT, context STRING)
+RETURNS STRING
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.10'
+HANDLER = 'render'
+AS $$
+def render(template_text, params, context):
+    if template_text is None:
+        return None
+    values = dict(params or {})
+    if context is not None:
+        values.setdefault("context", context)
+    return template_text.format(**values)
+$$;
+
+-- 4. Reconstruction view -------------------------------------------------------
+-- Legacy rows still have prompt / context_snippet filled in and are passed through.
+CREATE OR REPLACE VIEW CHAT_LOGS_EXPANDED AS
+WITH contexts AS (
+    SELECT l.turn_id,
+           LISTAGG(c.chunk_text, '\n\n') WITHIN GROUP (ORDER BY f.index) AS context_snippet
+    FROM CHAT_LOGS l,
+         LATERAL FLATTEN(input => l.context_chunk_hashes) f
+    JOIN CHAT_CONTEXT_CHUNKS c ON c.chunk_hash = f.value::STRING
+    GROUP BY l.turn_id
+)
+SELECT l.* EXCLUDE (context_snippet, prompt),
+       COALESCE(l.context_snippet, ctx.context_snippet) AS context_snippet,
+       COALESCE(l.prompt, RENDER_PROMPT(t.template_text, l.prompt_params, ctx.context_snippet)) AS prompt
+FROM CHAT_LOGS l
+LEFT JOIN contexts ctx ON ctx.turn_id = l.turn_id
+LEFT JOIN CHAT_PROMPT_TEMPLATES t ON t.template_hash = l.prompt_template_hash;
+
+-- 5. Optional: compress the existing rows ---------------------------------------
+-- Legacy prompts become variable-free templates (braces escaped for str.format),
+-- legacy contexts are split into chunks the same way the logger splits them.
+-- Check CHAT_LOGS_EXPANDED against the original columns before nulling them.
+--
+-- MERGE INTO CHAT_PROMPT_TEMPLATES t
+-- USING (
+--     SELECT DISTINCT LEFT(SHA2(tpl, 256), 32) AS template_hash, tpl AS template_text
+--     FROM (SELECT REPLACE(REPLACE(prompt, '{', '{{'), '}', '}}') AS tpl FROM CHAT_LOGS WHERE prompt IS NOT NULL)
+-- ) s
+-- ON t.template_hash = s.template_hash
+-- WHEN NOT MATCHED THEN INSERT (template_hash, template_text) VALUES (s.template_hash, s.template_text);
+--
+-- MERGE INTO CHAT_CONTEXT_CHUNKS t
+-- USING (
+--     SELECT DISTINCT LEFT(SHA2(s.value, 256), 32) AS chunk_hash, s.value AS chunk_text
+--     FROM CHAT_LOGS l, LATERAL SPLIT_TO_TABLE(l.context_snippet, '\n\n') s
+--     WHERE l.context_snippet IS NOT NULL
+-- ) s
+-- ON t.chunk_hash = s.chunk_hash
+-- WHEN NOT MATCHED THEN INSERT (chunk_hash, chunk_text) VALUES (s.chunk_hash, s.chunk_text);
+--
+-- UPDATE CHAT_LOGS l
+-- SET prompt_template_hash = LEFT(SHA2(REPLACE(REPLACE(l.prompt, '{', '{{'), '}', '}}'), 256), 32),
+--     prompt_params = OBJECT_CONSTRUCT()
+-- WHERE l.prompt IS NOT NULL AND l.prompt_template_hash IS NULL;
+--
+-- UPDATE CHAT_LOGS l
+-- SET context_chunk_hashes = s.hashes
+-- FROM (
+--     SELECT l2.turn_id, ARRAY_AGG(LEFT(SHA2(s.value, 256), 32)) WITHIN GROUP (ORDER BY s.index) AS hashes
+--     FROM CHAT_LOGS l2, LATERAL SPLIT_TO_TABLE(l2.context_snippet, '\n\n') s
+--     WHERE l2.context_snippet IS NOT NULL
+--     GROUP BY l2.turn_id
+-- ) s
+-- WHERE l.turn_id = s.turn_id AND l.context_chunk_hashes IS NULL;
+--
+-- UPDATE CHAT_LOGS SET prompt = NULL, context_snippet = NULL
+-- WHERE prompt_template_hash IS NOT NULL OR context_chunk_hashes IS NOT NULL;
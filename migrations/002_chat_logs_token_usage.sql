@@ -0,0 +1,54 @@
+-- 002_chat_logs_token_usage.sql
+-- Token and credit usage per turn (helping_functions/token_accounting.py).
+-- Assistant rows carry the turn's usage: totals, one entry per completion
+-- call, the background calls (summaries, prefetches) that finished since the
+-- previous row, and the session's running totals at that point.
+--
+-- Run once, after 001, in the schema that holds CHAT_LOGS.
+
+-- 1. New CHAT_LOGS column ------------------------------------------------------
+-- {"calls", "prompt_tokens", "completion_tokens", "total_tokens", "credits",
+--  "by_call": [{"call_type", "model", "prompt_tokens", "completion_tokens", "credits", "source",
+--               "turn_id", "background"}],
+--  "background": {...same totals..., "by_call": [...]},
+--  "session": {...same totals for the whole session...}}
+-- turn_id in a call entry is the session's turn counter when the call was
+-- submitted; a background call can be logged with a later turn's row.
+ALTER TABLE CHAT_LOGS ADD COLUMN IF NOT EXISTS token_usage VARIANT;
+
+-- 2. Usage per call type, intent and model ---------------------------------------
+CREATE OR REPLACE VIEW CHAT_TOKEN_USAGE_BY_CALL AS
+SELECT l.session_id,
+       l.turn_id,
+       l.timestamp::TIMESTAMP_NTZ AS ts,
+       l.intent,
+       c.value:call_type::STRING AS call_type,
+       c.value:model::STRING AS model,
+       c.value:prompt_tokens::NUMBER AS prompt_tokens,
+       c.value:completion_tokens::NUMBER AS completion_tokens,
+       c.value:credits::FLOAT AS credits,
+       c.value:source::STRING AS token_source,
+       c.value:turn_id::NUMBER AS submitted_in_turn,
+       COALESCE(c.value:background::BOOLEAN, FALSE) AS background
+FROM CHAT_LOGS l,
+     LATERAL FLATTEN(input => ARRAY_CAT(
+         COALESCE(l.token_usage:by_call, ARRAY_CONSTRUCT()),
+         COALESCE(l.token_usage:background:by_call, ARRAY_CONSTRUCT())
+     )) c
+WHERE l.token_usage IS NOT NULL;
+
+-- 3. Usage per session -----------------------------------------------------------
+-- From the running session totals rather than a sum of turns, so background
+-- calls are counted even when they finished after the last logged row's turn.
+CREATE OR REPLACE VIEW CHAT_TOKEN_USAGE_BY_SESSION AS
+SELECT session_id,
+       MIN(timestamp::TIMESTAMP_NTZ) AS first_ts,
+       MAX(timestamp::TIMESTAMP_NTZ) AS last_ts,
+       COUNT(*) AS turns,
+       MAX(token_usage:session:prompt_tokens::NUMBER) AS prompt_tokens,
+       MAX(token_usage:session:completion_tokens::NUMBER) AS completion_tokens,
+       MAX(token_usage:session:total_tokens::NUMBER) AS total_tokens,
+       MAX(token_usage:session:credits::FLOAT) AS credits
+FROM CHAT_LOGS
+WHERE token_usage IS NOT NULL
+GROUP BY session_id;
@@ -0,0 +1,12 @@
+-- 003_chat_rollups_errors.sql
+-- Error and busy rates on the chat analytics page (helping_functions/chat_rollups.py).
+-- CHAT_LOGS now also gets an assistant row with message_type 'error' when a
+-- turn fails (handle_error), and one with message_type 'busy' when a
+-- classified question gets no Cortex slot for its answer. Busy rows logged
+-- before classification stay user rows.
+--
+-- Run once, after 002, in the schema that holds the rollup tables. Existing
+-- rollup rows start at 0: no such rows were logged before this change.
+
+ALTER TABLE CHAT_ROLLUP_HOURLY_INTENTS ADD COLUMN IF NOT EXISTS answer_busy NUMBER DEFAULT 0;
+ALTER TABLE CHAT_ROLLUP_HOURLY_INTENTS ADD COLUMN IF NOT EXISTS errors NUMBER DEFAULT 0;
@@ -2,11 +2,15 @@
 
 import streamlit as st
 import json
+import time
 from helping_functions.timeline_builder import *
 from helping_functions.sidebar import *
 from helping_functions.skills_builder import *
+from helping_functions.perf_tracker import *
+from helping_functions.static_artifacts import *
 
 
+page_started = time.perf_counter()
 st.set_page_config(
     page_title="Career Timeline & Skills",
     page_icon="📊",
@@ -44,28 +48,39 @@ render_skills_dashboard(skills_json)
 st.markdown("---")
 st.subheader("📅 Professional Timeline")
 
-with open("docs/timeline.json", "r") as f:
-    timeline_json = json.load(f)
+_, _, timeline_tag_index = load_timeline_index()
 
 # Collect unique tags
-all_tags = sorted({tag for e in timeline_json["events"] for tag in e.get("tags", [])})
+all_tags = sorted(timeline_tag_index)
 
 selected_tags = st.multiselect("Filter categories:", all_tags, default=all_tags)
 
-filtered_events = [
-    e for e in timeline_json["events"]
-    if any(tag in e.get("tags", []) for tag in selected_tags)
-]
-
-filtered_json = {
-    "title": timeline_json["title"],
-    "events": filtered_events
-}
-
 if st.checkbox("Show timeline chart", value=True):
-    fig = build_gantt_from_json(filtered_json)
-    if fig and not fig.data == []:
+    lean_chart = st.toggle(
+        "Lightweight chart",
+        value=True,
+        help="Single-trace timeline with a much smaller payload than the classic Gantt chart.",
+    )
+    chart_style = "lean" if lean_chart else "classic"
+    chart_started = time.perf_counter()
+    tag_key = tuple(sorted(selected_tags))
+    # Prebuilt figure from the static build step, built on the fly if missing or stale
+    fig = load_static_gantt_figure(tag_key, chart_style)
+    if fig is not None:
+        chart_source, figure_kb = "static", static_gantt_figure_size_kb(tag_key, chart_style)
+    else:
+        fig = get_gantt_figure(tag_key, chart_style)
+        chart_source, figure_kb = "built", gantt_figure_size_kb(tag_key, chart_style)
+    if fig is not None:
         st.plotly_chart(fig, use_container_width=True)
+        record_latency(
+            "timeline_chart",
+            chart_started,
+            style=chart_style,
+            source=chart_source,
+            figure_kb=figure_kb,
+        )
     else:
         st.info("No events match the selected categories.")
 
+record_timing("timeline_page", page_started)
@@ -0,0 +1,134 @@
+# Chat_Analytics.py
+
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+from dotenv import load_dotenv
+from snowflake.snowpark import Session
+
+from helping_functions.sidebar import *
+from helping_functions.chat_rollups import *
+
+env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'chatbot_secrets.env')
+load_dotenv(dotenv_path=env_path)
+
+st.set_page_config(
+    page_title="Chat Analytics",
+    page_icon="📈",
+    layout="wide"
+)
+st.title("Chat Analytics")
+st.caption("Traffic, models and hot questions, read from the CHAT_LOGS rollup tables.")
+render_sidebar(st.session_state, show_tabs=False)
+
+# Logged questions are visitor content, so the page is only open with the access key
+access_key = os.getenv("ANALYTICS_ACCESS_KEY")
+if not access_key:
+    st.info("Analytics are disabled. Set ANALYTICS_ACCESS_KEY to enable this page.")
+    st.stop()
+if st.text_input("Access key", type="password") != access_key:
+    st.stop()
+
+
+@st.cache_resource(show_spinner=False)
+def get_rollup_backend():
+    connection_parameters = {
+        "account": os.getenv("ACCOUNT"),
+        "user": os.getenv("USER"),
+        "password": os.getenv("PASSWORD"),
+        "role": os.getenv("ROLE"),
+        "warehouse": os.getenv("WAREHOUSE"),
+        "database": os.getenv("DATABASE"),
+        "schema": os.getenv("SCHEMA"),
+    }
+    return SnowparkBackend(Session.builder.configs(connection_parameters).create())
+
+
+# Pull in new CHAT_LOGS rows at most every 5 minutes (only the slice since the watermark)
+@st.cache_data(ttl=300, show_spinner=False)
+def refresh_chat_rollups():
+    return refresh_rollups(get_rollup_backend())
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_rollups(days):
+    since = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(days=days)
+    data = load_rollups(get_rollup_backend(), since)
+    return {key: pd.DataFrame(rows) if isinstance(rows, list) else rows for key, rows in data.items()}
+
+
+try:
+    with st.spinner("Updating rollups…"):
+        refresh_chat_rollups()
+    days = st.selectbox("Period", [1, 7, 30, 90], index=1, format_func=lambda d: f"Last {d} days")
+    rollups = get_rollups(days)
+except Exception as e:
+    st.error("❌ Could not load the analytics rollups.")
+    with st.expander("🔍 See technical details"):
+        st.exception(e)
+    st.stop()
+
+st.caption(f"Data up to {rollups['watermark']:%Y-%m-%d %H:%M} UTC")
+intents, models, sessions, questions = (rollups[k] for k in ("intents", "models", "sessions", "questions"))
+if intents.empty:
+    st.info("No chat traffic in this period yet.")
+    st.stop()
+
+# --- Headline numbers ---
+counts = ["inputs", "responses", "busy", "answer_busy", "errors"]
+intents[counts] = intents[counts].fillna(0)
+# Questions turned away or failing before classification were never logged as inputs (intent "none")
+intents["asked"] = intents["inputs"] + intents["busy"] + intents["errors"].where(intents["intent"] == "none", 0)
+inputs, responses, busy, answer_busy, errors, asked = (int(intents[c].sum()) for c in counts + ["asked"])
+col1, col2, col3, col4, col5 = st.columns(5)
+col1.metric("Questions", inputs)
+col2.metric("Sessions", len(sessions))
+col3.metric("Error rate", f"{errors / asked:.1%}" if asked else "–",
+            help="Questions whose turn failed with an error.")
+col4.metric("Busy rate", f"{(busy + answer_busy) / asked:.1%}" if asked else "–",
+            help="Questions the Cortex queue had no room for, before classification or before the answer.")
+col5.metric("Unanswered", f"{max(inputs - responses, 0) / inputs:.1%}" if inputs else "–",
+            help="Questions without a logged response, for any reason.")
+
+# --- Traffic ---
+st.subheader("🕒 Questions per hour")
+hourly = intents.pivot_table(index="hour", columns="intent", values="inputs", aggfunc="sum", fill_value=0)
+hourly.index = pd.to_datetime(hourly.index)
+st.bar_chart(hourly)
+st.caption(f"Peak: {int(hourly.sum(axis=1).max())} questions in one hour")
+
+col_left, col_right = st.columns(2)
+with col_left:
+    st.subheader("🧭 Intents")
+    by_intent = intents.groupby("intent")[counts + ["asked"]].sum().sort_values("inputs", ascending=False)
+    by_intent["error_rate"] = (by_intent["errors"] / by_intent["asked"]).fillna(0)
+    by_intent["busy_rate"] = ((by_intent["busy"] + by_intent["answer_busy"]) / by_intent["asked"]).fillna(0)
+    by_intent["unanswered"] = ((by_intent["inputs"] - by_intent["responses"]).clip(lower=0) / by_intent["inputs"]).fillna(0)
+    st.dataframe(
+        by_intent.style.format({"error_rate": "{:.1%}", "busy_rate": "{:.1%}", "unanswered": "{:.1%}"}),
+        use_container_width=True,
+    )
+with col_right:
+    st.subheader("🤖 Model usage")
+    if models.empty:
+        st.caption("No responses logged yet.")
+    else:
+        st.dataframe(
+            models.groupby("model_used")["responses"].sum().sort_values(ascending=False),
+            use_container_width=True,
+        )
+
+# --- Sessions ---
+st.subheader("💬 Session length")
+duration = (pd.to_datetime(sessions["last_seen"]) - pd.to_datetime(sessions["first_seen"])).dt.total_seconds() / 60
+col1, col2, col3 = st.columns(3)
+col1.metric("Median questions / session", f"{sessions['inputs'].median():.0f}")
+col2.metric("P90 questions / session", f"{sessions['inputs'].quantile(0.9):.0f}")
+col3.metric("Median duration", f"{duration.median():.1f} min")
+
+# --- Hot questions ---
+st.subheader("🔥 Most asked questions")
+st.caption("Grouped by normalized text; good candidates for precomputed answers.")
+st.dataframe(questions, use_container_width=True, hide_index=True)
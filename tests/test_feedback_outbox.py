@@ -0,0 +1,93 @@
+# test_feedback_outbox.py
+import pytest
+
+from helping_functions import feedback_outbox
+from helping_functions.feedback_outbox import FeedbackOutbox, LocalTransport
+
+
+class FlakyTransport(LocalTransport):
+    """LocalTransport that fails its first ``failures`` sends."""
+
+    def __init__(self, path, failures):
+        super().__init__(path)
+        self.failures = failures
+        self.calls = 0
+
+    def send(self, items):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("provider unavailable")
+        super().send(items)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(feedback_outbox.time, "time", lambda: now[0])
+    monkeypatch.setattr(feedback_outbox.random, "uniform", lambda a, b: 1.0)  # no jitter
+    return now
+
+
+def make_outbox(tmp_path, transport, **kwargs):
+    return FeedbackOutbox(
+        transport, db_path=str(tmp_path / "outbox.sqlite3"), base_backoff=5, start_worker=False, **kwargs
+    )
+
+
+def test_sends_due_items_in_one_batch(tmp_path, clock):
+    transport = LocalTransport(str(tmp_path / "sent.jsonl"))
+    outbox = make_outbox(tmp_path, transport)
+    outbox.enqueue("Great bot", "a@example.com")
+    outbox.enqueue("Typo on the timeline")
+
+    assert outbox.flush() == 2
+    assert [item["feedback_text"] for item in transport.sent[0]] == ["Great bot", "Typo on the timeline"]
+    assert outbox.flush() == 0
+    assert outbox.stats() == {"sent": 2, "pending": 0, "failed": 0}
+
+
+def test_retries_with_exponential_backoff(tmp_path, clock):
+    transport = FlakyTransport(str(tmp_path / "sent.jsonl"), failures=2)
+    outbox = make_outbox(tmp_path, transport)
+    outbox.enqueue("Hello")
+
+    assert outbox.flush() == 0  # attempt 1 fails, next try in 5 s
+    clock[0] += 4
+    assert outbox.flush() == 0 and transport.calls == 1  # not due yet
+    clock[0] += 1
+    assert outbox.flush() == 0 and transport.calls == 2  # attempt 2 fails, next try in 10 s
+    clock[0] += 9
+    assert outbox.flush() == 0 and transport.calls == 2
+    clock[0] += 1
+    assert outbox.flush() == 1 and transport.calls == 3
+    assert outbox.stats() == {"sent": 1, "pending": 0, "failed": 0}
+
+
+def test_gives_up_after_max_attempts(tmp_path, clock):
+    transport = FlakyTransport(str(tmp_path / "sent.jsonl"), failures=100)
+    outbox = make_outbox(tmp_path, transport, max_attempts=3)
+    outbox.enqueue("Hello")
+
+    for _ in range(3):
+        outbox.flush()
+        clock[0] += feedback_outbox.MAX_BACKOFF_SECONDS
+    assert transport.calls == 3
+    assert outbox.flush() == 0 and transport.calls == 3
+    assert outbox.stats() == {"sent": 0, "pending": 0, "failed": 1}
+    assert outbox._next_due_in() is None
+
+
+def test_claimed_items_are_sent_by_one_worker_only(tmp_path, clock):
+    first = make_outbox(tmp_path, LocalTransport(str(tmp_path / "first.jsonl")))
+    second = make_outbox(tmp_path, LocalTransport(str(tmp_path / "second.jsonl")))
+    first.enqueue("Hello")
+
+    claimed = first._claim()  # first worker is mid-send
+    assert [item["feedback_text"] for item in claimed] == ["Hello"]
+    assert second.flush() == 0
+    assert second._next_due_in() == pytest.approx(feedback_outbox.CLAIM_SECONDS)
+
+    # A worker that died mid-send releases its rows when the claim expires
+    clock[0] += feedback_outbox.CLAIM_SECONDS + 1
+    assert second.flush() == 1
+    assert first.flush() == 0
@@ -0,0 +1,42 @@
+# test_response_parser.py
+import pytest
+
+from helping_functions.response_parser import EnvelopeStreamParser, parse_response_envelope
+
+# Malformed outputs seen from the models, with the "text" the parser must recover
+CORPUS = [
+    ('{"text": "Hi there!", "tts": "Hi there!"}', "Hi there!"),
+    ('```json\n{"text": "I use Spark daily.", "tts": "I use Spark daily."}\n```', "I use Spark daily."),
+    ('Sure! Here is my answer:\n{"text": "Airflow for 4 years.", "tts": "Airflow, for four years."}', "Airflow for 4 years."),
+    ('{"text": "Trino and Hive.", "tts": "Trino, and Hive.",}', "Trino and Hive."),
+    ('{\n"text": "Line one\nLine two",\n"tts": "Line one. Line two."\n}', "Line one\nLine two"),
+    ('{"text": "They called it "the lakehouse" project.", "tts": "The lakehouse project."}', 'They called it "the lakehouse" project.'),
+    ("{'text': 'Single quoted answer.', 'tts': 'Single quoted answer.'}", "Single quoted answer."),
+    ('{"text": "Cut off mid-sente', "Cut off mid-sente"),
+    ('{"text": "Caf\\u00e9 talk.", "tts": "Cafe talk."} Hope this helps!', "Café talk."),
+    ("I joined Waymore in 2023.", "I joined Waymore in 2023."),
+    # Prose that merely contains "text:" is not an envelope
+    ("I work with text: 'logs' and more data.", "I work with text: 'logs' and more data."),
+]
+
+
+@pytest.mark.parametrize("raw, expected", CORPUS)
+def test_parse_response_envelope(raw, expected):
+    assert parse_response_envelope(raw)["text"] == expected
+
+
+def test_tts_defaults_to_text():
+    assert parse_response_envelope('{"text": "Only text."}') == {"text": "Only text.", "tts": "Only text."}
+
+
+def test_empty_response_raises():
+    with pytest.raises(ValueError):
+        parse_response_envelope("```json\n```")
+
+
+def test_streaming_decodes_text_as_it_arrives():
+    stream = EnvelopeStreamParser()
+    streamed = "".join(stream.feed(c) for c in '{"text": "Strea\\u00e9ming \\"works\\"", "tts": "x"}')
+    values = stream.finish()
+    assert streamed == values["text"] == 'Streaéming "works"'
+    assert values["tts"] == "x"